@@ -66,7 +66,7 @@ CREATE TABLE calendar (
     timestamp BIGINT,
     account_label VARCHAR(10),
     date DATE,
-    time VARCHAR(20),
+    time TIME,
     uid VARCHAR(10) REFERENCES participants(uid)
 );
 
@@ -80,14 +80,14 @@ CREATE TABLE call_log (
     id VARCHAR(100),
     device VARCHAR(100),
     timestamp TIMESTAMP,
-    calls_id FLOAT,
+    calls_id BIGINT,
     calls_date TIMESTAMP,
-    calls_duration FLOAT,
+    calls_duration INT,
     calls_name TEXT,
     calls_number TEXT,
     calls_numberlabel TEXT,
     calls_numbertype TEXT,
-    calls_type FLOAT,
+    calls_type SMALLINT,
     uid VARCHAR(10) REFERENCES participants(uid)
 );
 
@@ -145,17 +145,17 @@ CREATE TABLE sms (
     timestamp TIMESTAMP,
     messages_address TEXT,
     messages_body TEXT,
-    messages_date FLOAT,
+    messages_date BIGINT,
     messages_locked BOOLEAN,
     messages_person TEXT,
-    messages_protocol FLOAT,
+    messages_protocol SMALLINT,
     messages_read BOOLEAN,
     messages_reply_path_present BOOLEAN,
     messages_service_center TEXT,
-    messages_status FLOAT,
+    messages_status SMALLINT,
     messages_subject TEXT,
-    messages_thread_id FLOAT,
-    messages_type FLOAT,
+    messages_thread_id INT,
+    messages_type SMALLINT,
     uid VARCHAR(10) REFERENCES participants(uid)
 );
 
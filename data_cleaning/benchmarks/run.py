@@ -0,0 +1,401 @@
+# benchmarks/run.py
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pandas as pd
+from benchmarks.synthetic import generate
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DEFAULT_SCALES = ["10x7", "25x35", "50x70"]
+DEFAULT_WORKDIR = "./benchmark_data"
+DEFAULT_RESULTS_PATH = "./benchmark_results"
+
+# a table slower than REGRESSION_THRESHOLD x its previous time is reported,
+# unless both runs are under NOISE_FLOOR_SECONDS
+REGRESSION_THRESHOLD = 1.25
+NOISE_FLOOR_SECONDS = 0.1
+
+# provenance stat holding the rows a table actually parsed (after the uid
+# filter); the event tables report it as row_count_parsed, and tables built
+# from curated tables (features_daily, dimensions) count their upstream
+# tables' output rows
+PARSED_ROW_STATS = {
+    "grades": "row_count_before",
+    "piazza": "row_count_before",
+    "class": "row_count_before_filter",
+    "deadlines": "row_count_wide",
+    "survey": "row_count",
+    "activity_summary": "row_count",
+}
+
+RESULT_PREFIX = "BENCHMARK_RESULT "
+
+
+def parse_scale(scale):
+    # "48x70" -> (48 students, 70 days)
+    students, days = scale.lower().split("x")
+    return int(students), int(days)
+
+
+def _peak_rss_mb(who):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 2)
+
+
+# --- child process: one process_* call ---
+
+def run_child(name, base_path, processed_path, provenance_path, workers,
+              output_format):
+    # paths must be set before any curate module reads the config
+    import configs.config as config
+
+    config.BASE_PATH = base_path
+    config.PROCESSED_DATA_PATH = processed_path
+    config.PROVENANCE_PATH = provenance_path
+    if output_format is not None:
+        config.OUTPUT_FORMAT = output_format
+
+    from curate.context import build_context
+    from curate.pipeline import TABLES
+
+    module_name, func_name, _, options = TABLES[name]
+    func = getattr(importlib.import_module(module_name), func_name)
+    kwargs = {}
+    if name != "grades":
+        kwargs["ctx"] = build_context()
+    if "workers" in options and workers is not None:
+        kwargs["workers"] = workers
+    # every run measures the full work, never a cache hit
+    if "incremental" in options:
+        kwargs["incremental"] = False
+    if "full_rebuild" in options:
+        kwargs["full_rebuild"] = True
+
+    baseline_rss_mb = _peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    start = time.perf_counter()
+    func(**kwargs)
+    seconds = time.perf_counter() - start
+
+    result = {
+        "seconds": round(seconds, 4),
+        "baseline_rss_mb": baseline_rss_mb,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        # ingestion worker processes (largest one), once they have exited
+        "worker_peak_rss_mb": (
+            _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+        ),
+    }
+    print(RESULT_PREFIX + json.dumps(result))
+
+
+def _run_in_child(name, scale_dir, workers, output_format):
+    # a fresh interpreter per call, so peak memory belongs to this call only
+    cmd = [
+        sys.executable, "-m", "benchmarks.run",
+        "--child", name,
+        "--base-path", f"{scale_dir}/source/",
+        "--processed-path", f"{scale_dir}/processed_data",
+        "--provenance-path", f"{scale_dir}/provenance",
+    ]
+    if workers is not None:
+        cmd += ["--workers", str(workers)]
+    if output_format is not None:
+        cmd += ["--output-format", output_format]
+
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return {"status": "ok", **json.loads(line[len(RESULT_PREFIX):])}
+    error = proc.stderr.strip().splitlines()
+    return {"status": "failed", "error": error[-1] if error else ""}
+
+
+# --- parent process ---
+
+def benchmark_tables(only=None):
+    # selected tables plus everything they depend on, in pipeline order
+    from curate.pipeline import TABLES, resolve_tables
+
+    selected = set(resolve_tables(only))
+    pending = list(selected)
+    while pending:
+        for dep in TABLES[pending.pop()][2]:
+            if dep not in selected:
+                selected.add(dep)
+                pending.append(dep)
+    return [name for name in TABLES if name in selected]
+
+
+def table_stats(scale_dir, name):
+    path = f"{scale_dir}/provenance/{name}_provenance.json"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("stats", {})
+
+
+def parsed_rows(name, scale_dir):
+    # rows the table's curator parsed; files skipped by the uid filter are
+    # only line-counted and do not count as input
+    from curate.pipeline import TABLES
+
+    stats = table_stats(scale_dir, name)
+    key = PARSED_ROW_STATS.get(name, "row_count_parsed")
+    if key in stats:
+        return stats[key]
+    return sum(
+        table_stats(scale_dir, dep).get("row_count_after_filter", 0)
+        for dep in TABLES[name][2]
+    )
+
+
+def prepare_source(scale_dir, students, days, seed):
+    # generated trees are reused across runs, so every run sees the same data
+    source = f"{scale_dir}/source"
+    manifest_path = f"{source}/synthetic_manifest.json"
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        settings = manifest["settings"]
+        if (settings["students"], settings["days"], settings["seed"]) == (
+            students, days, seed
+        ):
+            return manifest, False
+    return generate(source, students, days, seed), True
+
+
+def run_scale(scale, tables, workdir, workers, repeat, seed, output_format):
+    students, days = parse_scale(scale)
+    scale_dir = f"{workdir}/{students}x{days}"
+    manifest, generated = prepare_source(scale_dir, students, days, seed)
+    print(
+        f"=== Scale {scale}: {sum(manifest['rows'].values())} source rows "
+        f"({'generated' if generated else 'reused'}) ==="
+    )
+
+    results = {}
+    for name in tables:
+        runs = [
+            _run_in_child(name, scale_dir, workers, output_format)
+            for _ in range(repeat)
+        ]
+        ok = [r for r in runs if r["status"] == "ok"]
+        if len(ok) < len(runs):
+            results[name] = {"status": "failed", "error": runs[-1].get("error")}
+            print(f"{name:<18}failed    {results[name]['error']}")
+            continue
+
+        if name == "grades":
+            curated = table_stats(scale_dir, "grades").get("uid_nunique_after")
+            if not curated:
+                # every other table would skip all its files
+                raise RuntimeError(
+                    f"scale {scale}: no student survived the grades curator, "
+                    "so nothing downstream would be parsed"
+                )
+
+        # best of the repeats for time, worst for memory
+        seconds = min(r["seconds"] for r in ok)
+        rows = parsed_rows(name, scale_dir)
+        stats = table_stats(scale_dir, name)
+        peaks = [r["peak_rss_mb"] for r in ok if r["peak_rss_mb"] is not None]
+        results[name] = {
+            "status": "ok",
+            "seconds": seconds,
+            "runs_seconds": [r["seconds"] for r in ok],
+            "parsed_rows": rows,
+            "rows_per_second": round(rows / seconds) if seconds else None,
+            # files of ungraded students, line-counted but never parsed
+            "skipped_files": stats.get("skipped_files"),
+            "skipped_rows": (
+                stats["row_count_before_filter"] - stats["row_count_parsed"]
+                if "row_count_parsed" in stats else None
+            ),
+            "peak_rss_mb": max(peaks) if peaks else None,
+            "peak_rss_increase_mb": (
+                round(max(r["peak_rss_mb"] - r["baseline_rss_mb"] for r in ok), 2)
+                if peaks else None
+            ),
+            # 0 when the table ran without worker processes
+            "worker_peak_rss_mb": max(
+                (r["worker_peak_rss_mb"] or 0 for r in ok), default=0
+            ) or None,
+        }
+        r = results[name]
+        print(
+            f"{name:<18}{r['seconds']:>9.3f}s{r['rows_per_second'] or 0:>12} rows/s"
+            f"{r['peak_rss_mb'] or 0:>10.1f} MB"
+            + (f"   ({r['skipped_files']} files skipped)" if r["skipped_files"] else "")
+        )
+
+    return {
+        "scale": scale,
+        "students": students,
+        "days": days,
+        "source_rows": manifest["rows"],
+        "generation_seconds": manifest["seconds"] if generated else None,
+        "results": results,
+    }
+
+
+def compare_runs(previous, current, threshold=REGRESSION_THRESHOLD):
+    # per (scale, table): current / previous seconds
+    old = {
+        (s["scale"], name): r
+        for s in previous["scales"]
+        for name, r in s["results"].items()
+        if r["status"] == "ok"
+    }
+    comparison = []
+    for s in current["scales"]:
+        for name, r in s["results"].items():
+            before = old.get((s["scale"], name))
+            if r["status"] != "ok" or before is None:
+                continue
+            ratio = r["seconds"] / before["seconds"] if before["seconds"] else None
+            regression = (
+                ratio is not None
+                and ratio > threshold
+                and max(r["seconds"], before["seconds"]) >= NOISE_FLOOR_SECONDS
+            )
+            comparison.append(
+                {
+                    "scale": s["scale"],
+                    "table": name,
+                    "previous_seconds": before["seconds"],
+                    "seconds": r["seconds"],
+                    "ratio": round(ratio, 3) if ratio is not None else None,
+                    "regression": regression,
+                }
+            )
+    return comparison
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def run_benchmarks(scales=None, only=None, workdir=None, workers=None,
+                   repeat=1, seed=0, output_format=None, output=None,
+                   compare=None):
+    scales = DEFAULT_SCALES if scales is None else scales
+    workdir = DEFAULT_WORKDIR if workdir is None else workdir
+    tables = benchmark_tables(only)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment_info(),
+        "settings": {
+            "tables": tables,
+            "workers": workers,
+            "repeat": repeat,
+            "seed": seed,
+            "output_format": output_format,
+        },
+        "scales": [
+            run_scale(scale, tables, workdir, workers, repeat, seed, output_format)
+            for scale in scales
+        ],
+    }
+
+    if compare is not None:
+        with open(compare) as f:
+            previous = json.load(f)
+        report["compared_to"] = compare
+        report["comparison"] = compare_runs(previous, report)
+        regressions = [c for c in report["comparison"] if c["regression"]]
+        print(f"=== {len(regressions)} regression(s) against {compare} ===")
+        for c in regressions:
+            print(
+                f"{c['scale']:<8}{c['table']:<18}{c['previous_seconds']:>9.3f}s"
+                f" -> {c['seconds']:.3f}s ({c['ratio']:.2f}x)"
+            )
+
+    if output is None:
+        os.makedirs(DEFAULT_RESULTS_PATH, exist_ok=True)
+        output = f"{DEFAULT_RESULTS_PATH}/benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time every process_* function on synthetic data"
+    )
+    parser.add_argument(
+        "--scales",
+        help=f"comma-separated <students>x<days> (default: {','.join(DEFAULT_SCALES)})",
+    )
+    parser.add_argument("--only", help="comma-separated tables to benchmark")
+    parser.add_argument(
+        "--workdir", help=f"where synthetic trees are kept (default: {DEFAULT_WORKDIR})"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-format", choices=["csv", "parquet"])
+    parser.add_argument("--output", help="results JSON path")
+    parser.add_argument("--compare", help="previous results JSON to compare against")
+    # internal: run one table in this process and print its measurements
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base-path", help=argparse.SUPPRESS)
+    parser.add_argument("--processed-path", help=argparse.SUPPRESS)
+    parser.add_argument("--provenance-path", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(
+            args.child,
+            args.base_path,
+            args.processed_path,
+            args.provenance_path,
+            args.workers,
+            args.output_format,
+        )
+        return
+
+    run_benchmarks(
+        scales=args.scales.split(",") if args.scales else None,
+        only=args.only.split(",") if args.only else None,
+        workdir=args.workdir,
+        workers=args.workers,
+        repeat=args.repeat,
+        seed=args.seed,
+        output_format=args.output_format,
+        output=args.output,
+        compare=args.compare,
+    )
+
+
+if __name__ == "__main__":
+    main()
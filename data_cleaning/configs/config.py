@@ -1,3 +1,126 @@
-BASE_PATH= "/Users/hashamulhaq/Downloads/dataset/dataset/"
-PROCESSED_DATA_PATH = "./processed_data"
-PROVENANCE_PATH = "./provenance"
+import os
+
+# the CURATE_* environment variables override the paths, so the uid shard
+# workers of curate/shards.py (one process per shard, possibly on other
+# machines) can point a pipeline run at their own output directories
+BASE_PATH = os.environ.get(
+    "CURATE_BASE_PATH", "/Users/hashamulhaq/Downloads/dataset/dataset/"
+)
+PROCESSED_DATA_PATH = os.environ.get("CURATE_PROCESSED_DATA_PATH", "./processed_data")
+PROVENANCE_PATH = os.environ.get("CURATE_PROVENANCE_PATH", "./provenance")
+
+# number of worker processes used to read per-uid source files in parallel
+# (1 = read sequentially in the current process)
+INGEST_WORKERS = os.cpu_count() or 1
+
+# read engine of the event curators for whole-file reads: "pandas" (one
+# read_csv per file), "blocks" (files larger than READ_BLOCK_BYTES are
+# split on line boundaries and the blocks parsed by READ_THREADS threads)
+# or "arrow" (pyarrow's multithreaded CSV reader on the memory-mapped file,
+# needs pyarrow). Every engine returns the same frame as pandas; files an
+# engine cannot reproduce are read by pandas
+READ_ENGINE = "pandas"
+READ_BLOCK_BYTES = 64 * 1024**2
+READ_THREADS = os.cpu_count() or 1
+
+# uid-sharded runs (python -m curate.shards): a pipeline run restricted to
+# the uids in "lo:hi" (lo <= uid < hi as strings, either side open when
+# empty). Every curator keeps only the source files and rows of those uids,
+# so the shard outputs of a plan partition the full tables. Set per worker
+# process through CURATE_SHARD_UID_RANGE; None curates every uid
+SHARD_UID_RANGE = os.environ.get("CURATE_SHARD_UID_RANGE") or None
+
+# number of tables curate.pipeline runs concurrently
+PIPELINE_JOBS = os.cpu_count() or 1
+
+# source discovery: BASE_PATH is listed once with os.scandir over
+# DISCOVERY_WORKERS threads into an inventory of (source, uid, path, size,
+# mtime) that every curator takes its file list from. It is saved to
+# INVENTORY_PATH (PROVENANCE_PATH/source_inventory.json when None); later
+# runs only stat its directories and re-list the changed ones.
+# INVENTORY_VALIDATE = "files" also re-stats every listed file
+DISCOVERY_WORKERS = 16
+INVENTORY_PATH = os.environ.get("CURATE_INVENTORY_PATH")
+INVENTORY_VALIDATE = "directories"
+
+# declarative specs of the event tables (sms, call_log, sensing streams,
+# ...) curated by curate/events.py; a new per-uid source only needs an entry
+EVENT_SPECS_PATH = os.path.join(os.path.dirname(__file__), "event_sources.yaml")
+
+# data-quality rules (value ranges, codes, missing values, study term) of
+# the curated tables, evaluated by curate/validation.py in one pass per
+# table, file or chunk. Each rule warns, drops the offending rows or fails
+# the curator; QUALITY_ACTIONS overrides the action of single rules, e.g.
+# {"activity.activity_code": "drop"}. Violation counts and the first
+# QUALITY_SAMPLE_ROWS offending rows of every rule go to provenance
+QUALITY_RULES_PATH = os.path.join(os.path.dirname(__file__), "quality_rules.yaml")
+QUALITY_ACTIONS = {}
+QUALITY_SAMPLE_ROWS = 5
+# [start, end) of the study_term check: the spring 2013 term the
+# StudentLife data was collected in, with a few days of margin
+STUDY_TERM = ("2013-03-24", "2013-06-10")
+
+# sensing/activity can be curated in streaming mode: files are read in chunks
+# of STREAM_CHUNK_SIZE rows and appended to the output as they are processed
+ACTIVITY_STREAMING = False
+STREAM_CHUNK_SIZE = 100_000
+
+# sms and call_log drop repeated snapshots of the same message or call
+# (dedup keys in configs/event_sources.yaml). This changes their row counts
+# compared with the original curators (on the same input, sms went from 1124
+# to 1022 rows and call_log from 313 to 281); DEDUP = False keeps every row
+# as before. The key hashes seen per uid file are held in memory up to
+# DEDUP_MEMORY_BYTES and spill to sorted runs under DEDUP_SPILL_PATH (the
+# system temp directory when None) beyond that
+DEDUP = True
+DEDUP_MEMORY_BYTES = 64 * 1024**2
+DEDUP_SPILL_PATH = None
+
+# event tables can be written sorted by (uid, time column of their spec),
+# ties kept in discovery order. Streaming runs use an external merge sort:
+# rows are buffered up to SORT_MEMORY_BYTES, spilled as sorted runs to
+# SORT_SPILL_PATH (the system temp directory when None) and merged
+SORT_OUTPUT = False
+SORT_MEMORY_BYTES = 256 * 1024**2
+SORT_SPILL_PATH = None
+
+# normalized output (python -m curate.dimensions, or the 'dimensions'
+# pipeline step): repeated strings of the event tables (device ids,
+# restaurants, meal types, app packages and classes; 'dimensions' in
+# configs/event_sources.yaml) move to dim_<name> tables with small integer
+# keys, <table>_normalized holds the events with <column>_id foreign keys,
+# and a matching PostgreSQL setup script is written next to them
+NORMALIZED_OUTPUT = False
+
+# format of the curated tables in PROCESSED_DATA_PATH: "csv" (default) or
+# "parquet" (hive-partitioned by uid, needs pyarrow)
+OUTPUT_FORMAT = "csv"
+
+# incremental mode: keep a manifest of every source file next to the
+# provenance JSON and only re-process uids whose files were added, changed
+# or removed since the last run (pass full_rebuild=True to start over)
+INCREMENTAL = False
+
+# activity_summary also writes per-uid hourly and daily counts per activity
+# inference code (activity_hourly / activity_daily)
+ACTIVITY_ROLLUPS = False
+
+# every provenance file gets a 'performance' section (stage timings, peak
+# RSS, bytes read/written); PROFILE additionally dumps a profile of each
+# table to PROVENANCE_PATH/<table>_profile.prof ("cprofile", view with
+# python -m pstats or snakeviz) or <table>_profile.html ("pyinstrument")
+PROFILE = False
+PROFILER = "cprofile"
+
+# survey scale totals: missing items are prorated from the answered ones
+# when at least this fraction of a scale's items was answered, otherwise
+# the total is left empty
+SURVEY_MIN_ANSWERED = 0.8
+
+# step cache (python -m curate.pipeline --step-cache): a table whose code,
+# config, source files and upstream outputs are unchanged is not re-run;
+# its output and provenance are restored from STEP_CACHE_PATH instead.
+# Least recently used entries are evicted beyond STEP_CACHE_MAX_BYTES
+STEP_CACHE = False
+STEP_CACHE_PATH = "./step_cache"
+STEP_CACHE_MAX_BYTES = 4 * 1024**3
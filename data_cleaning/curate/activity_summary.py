@@ -0,0 +1,261 @@
+# curate/activity_summary.py
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import pandas as pd
+from configs.config import ACTIVITY_ROLLUPS, INGEST_WORKERS, STREAM_CHUNK_SIZE
+from curate.context import build_context
+from curate.ingest import uid_from_filename
+from curate.output import write_table
+from curate.performance import (
+    StageTimer,
+    merge_stage_seconds,
+    peak_rss_mb,
+    worker_peak_rss_mb,
+)
+from curate.schema import get_schema, merge_schema_reports, read_csv_typed_chunks
+
+# activity inference codes (metadata/data_dictionary.csv); the summary
+# leaves stationary out, the time rollups keep every code
+ACTIVITY_LABELS = {0: "stationary", 1: "walking", 2: "running", 3: "unknown"}
+ACTIVITY_CODES = list(ACTIVITY_LABELS)
+SUMMARY_IGNORED_CODES = [0]
+
+# rollup table -> (period column, pandas frequency)
+ROLLUPS = {
+    "activity_hourly": ("hour", "h"),
+    "activity_daily": ("date", "D"),
+}
+
+
+def _sum_counts(parts, levels):
+    # partial counts from chunks, files or uids merge by plain addition
+    if not parts:
+        return None
+    return pd.concat(parts).groupby(level=levels).sum()
+
+
+def _summarize_file(fpath, chunksize, rollups):
+    start = time.perf_counter()
+    uid = uid_from_filename(fpath, ".csv")
+    result = {
+        "file": str(fpath),
+        "uid": uid,
+        "rows_read": 0,
+        "invalid_timestamps": 0,
+        "invalid_codes": 0,
+        "chunk_count": 0,
+        "counts": None,
+        "rollups": {},
+        "schema": None,
+        "bytes_read": os.path.getsize(fpath),
+        "stages": {"read_csv": 0.0, "count": 0.0},
+    }
+
+    chunks, result["schema"] = read_csv_typed_chunks(
+        fpath, get_schema("activity"), chunksize
+    )
+    counts = []
+    rollup_parts = {name: [] for name in ROLLUPS} if rollups else {}
+    # chunks are parsed lazily: reading is the wait for the next chunk
+    t = time.perf_counter()
+    for chunk in chunks:
+        t_read = time.perf_counter()
+        result["stages"]["read_csv"] += t_read - t
+        chunk.columns = chunk.columns.str.strip()
+        result["chunk_count"] += 1
+        result["rows_read"] += len(chunk)
+
+        # a mismatched column stays text (and is reported in the schema
+        # section); it is only coerced here to count what can be counted
+        codes = pd.to_numeric(chunk["activity inference"], errors="coerce")
+        valid = codes.isin(ACTIVITY_CODES)
+        result["invalid_codes"] += int((~valid).sum())
+        counts.append(codes[valid].astype("int64").value_counts())
+
+        if rollups:
+            ts = pd.to_datetime(chunk["timestamp"], unit="s", errors="coerce")
+            result["invalid_timestamps"] += int(ts.isna().sum())
+            keep = valid & ts.notna()
+            for name, (_, freq) in ROLLUPS.items():
+                frame = pd.DataFrame(
+                    {
+                        "period": ts[keep].dt.floor(freq),
+                        "code": codes[keep].astype("int64"),
+                    }
+                )
+                rollup_parts[name].append(
+                    frame.groupby(["period", "code"]).size()
+                )
+        t = time.perf_counter()
+        result["stages"]["count"] += t - t_read
+    result["stages"]["read_csv"] += time.perf_counter() - t
+
+    # only the merged counts of the file leave the worker
+    result["counts"] = _sum_counts(counts, 0)
+    for name, parts in rollup_parts.items():
+        result["rollups"][name] = _sum_counts(parts, [0, 1])
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    # of the process that read the file (a pool worker when workers > 1)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def process_activity_summary(ctx=None, workers=None, rollups=None,
+                             chunksize=None):
+    # shared run state (config paths, source inventory); built here when the
+    # curator runs standalone. The summary covers every participant, as the
+    # participants table of postgreSQL_setup.sql does, so it is not filtered
+    # on the graded uids
+    if ctx is None:
+        ctx = build_context()
+
+    table_name = "activity_summary"
+    source_folder = ctx.source_path("sensing/activity/")
+    # file name expected by Setup_inspection/postgreSQL_setup.sql
+    processed_path = ctx.table_path("activity_summary_all")
+    provenance_path = ctx.provenance_file(table_name)
+
+    # stage timings, peak memory and bytes moved, for the provenance record
+    perf = StageTimer(table_name, ctx.provenance_path)
+
+    rollups = ACTIVITY_ROLLUPS if rollups is None else rollups
+    chunksize = STREAM_CHUNK_SIZE if chunksize is None else chunksize
+    activity_files = ctx.discover_files("sensing/activity/", "*.csv")
+    workers = INGEST_WORKERS if workers is None else workers
+    workers = max(1, min(int(workers), len(activity_files) or 1))
+    perf.checkpoint("discover")
+
+    # --- single streaming pass: every file is read in chunks, and only
+    # per-chunk counts are kept, merged per file (in parallel) ---
+    start = time.perf_counter()
+    args = (
+        activity_files,
+        repeat(chunksize),
+        repeat(rollups),
+    )
+    if workers == 1:
+        results = list(map(_summarize_file, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_summarize_file, *args))
+    perf.checkpoint("count")
+
+    # --- merge file counts per uid ---
+    counted = [r for r in results if r["counts"] is not None]
+    summary = _sum_counts(
+        [
+            pd.concat({r["uid"]: r["counts"]}, names=["uid", "activity_id"])
+            for r in counted
+        ],
+        [0, 1],
+    )
+    if summary is None:
+        summary_df = pd.DataFrame(columns=["uid", "activity_id", "activity_count"])
+    else:
+        summary_df = summary.rename("activity_count").reset_index()
+        summary_df = summary_df[
+            ~summary_df["activity_id"].isin(SUMMARY_IGNORED_CODES)
+        ]
+        summary_df = summary_df.sort_values(["uid", "activity_id"])
+
+    perf.checkpoint("merge")
+    output_info = write_table(summary_df, processed_path, ctx.output_format)
+    outputs = {"activity_summary_all": processed_path}
+    perf.checkpoint("write")
+
+    # --- optional hourly / daily rollups ---
+    for name, (period_col, _) in ROLLUPS.items():
+        if not rollups:
+            break
+        rollup = _sum_counts(
+            [
+                pd.concat({r["uid"]: r["rollups"][name]}, names=["uid"])
+                for r in counted
+                if r["rollups"][name] is not None
+            ],
+            [0, 1, 2],
+        )
+        columns = ["uid", period_col, "activity_inference", "activity_count"]
+        if rollup is None:
+            rollup_df = pd.DataFrame(columns=columns)
+        else:
+            rollup_df = rollup.reset_index()
+            rollup_df.columns = columns
+            rollup_df = rollup_df.sort_values(columns[:3])
+        outputs[name] = ctx.table_path(name)
+        write_table(rollup_df, outputs[name], ctx.output_format)
+        perf.checkpoint("rollups")
+
+    perf.wrote(*outputs.values())
+    perf.add_ingest_report(
+        {
+            "bytes_read": sum(r["bytes_read"] for r in results),
+            "stages": merge_stage_seconds(r["stages"] for r in results),
+            "worker_peak_rss_mb": worker_peak_rss_mb(
+                (r["peak_rss_mb"] for r in results), workers
+            ),
+        }
+    )
+
+    stats = {
+        "file_count": len(results),
+        "row_count": sum(r["rows_read"] for r in results),
+        "unique_uids": len({r["uid"] for r in results if r["rows_read"] > 0}),
+        "invalid_activity_codes": sum(r["invalid_codes"] for r in results),
+        "summary_row_count": len(summary_df),
+        "summary_ignored_codes": SUMMARY_IGNORED_CODES,
+    }
+    if rollups:
+        stats["invalid_timestamps"] = sum(r["invalid_timestamps"] for r in results)
+
+    # provenance record for activity summary table
+    provenance_record = {
+        "table": table_name,
+        "source_folder": source_folder,
+        "source_inventory": ctx.inventory and ctx.inventory.summary(),
+        "processed_file": processed_path,
+        "outputs": outputs,
+        **output_info,
+        "operations": [
+            "discover all activity CSV files under BASE_PATH/sensing/activity/ from the source inventory (sorted by path)",
+            "for each file: infer uid from filename suffix; every participant is kept (no filter on the processed grades table)",
+            f"for each file: read CSV with explicit dtypes from the table schema (curate/schema.py) in chunks of {chunksize} rows",
+            "for each chunk: count rows per activity inference code (codes outside 0-3 are counted as invalid)",
+            (
+                "for each chunk: count rows per (hour, code) and (day, code) from the Unix-seconds timestamp"
+                if rollups
+                else "hourly/daily rollups disabled"
+            ),
+            "merge chunk counts per file, then per uid; no raw events are kept",
+            f"write (uid, activity_id, activity_count), leaving out codes {SUMMARY_IGNORED_CODES} (stationary)",
+        ],
+        "stats": stats,
+        "schema": merge_schema_reports(r["schema"] for r in results),
+        "ingestion": {
+            "mode": "streaming aggregation",
+            "workers": workers,
+            "chunksize": int(chunksize),
+            "chunk_count": sum(r["chunk_count"] for r in results),
+            "wall_seconds": round(time.perf_counter() - start, 4),
+            "file_timings": [
+                {k: r[k] for k in ("file", "rows_read", "seconds")}
+                for r in results
+            ],
+        },
+    }
+
+    provenance_record["performance"] = perf.report()
+
+    with open(provenance_path, "w") as f:
+        json.dump(provenance_record, f, indent=2)
+
+    return summary_df
+
+
+if __name__ == "__main__":
+    process_activity_summary()
@@ -1,26 +1,29 @@
 # curate/classes.py
 
-import os
 import json
 import pandas as pd
-from configs.config import BASE_PATH, PROCESSED_DATA_PATH, PROVENANCE_PATH
+from curate.context import build_context
+from curate.output import write_table
+from curate.performance import StageTimer
+from curate.schema import apply_schema, get_schema, new_schema_report
 
 
-def process_classes():
-    # ensure output dirs exist
-    os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
-    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+def process_classes(ctx=None):
+    # shared run state (config paths, valid uids); built here when the
+    # curator runs standalone
+    if ctx is None:
+        ctx = build_context()
 
     table_name = "class"
-    source_path = f"{BASE_PATH}/education/{table_name}.csv"
-    processed_path = f"{PROCESSED_DATA_PATH}/{table_name}.csv"
-    provenance_path = f"{PROVENANCE_PATH}/{table_name}_provenance.json"
+    source_path = ctx.source_path(f"education/{table_name}.csv")
+    processed_path = ctx.table_path(table_name)
+    provenance_path = ctx.provenance_file(table_name)
 
-    # --- load grades to filter valid uids ---
-    grades_path = f"{PROCESSED_DATA_PATH}/grades.csv"
-    grades_df = pd.read_csv(grades_path)
-    grades_df["uid"] = grades_df["uid"].astype(str).str.strip()
-    valid_uids = set(grades_df["uid"])
+    # valid uids come from the processed grades table (read once into ctx)
+    grades_path = ctx.grades_path
+    valid_uids = ctx.valid_uids
+
+    perf = StageTimer(table_name, ctx.provenance_path)
 
     # --- parse non-standard class.csv ---
     rows = []
@@ -59,6 +62,13 @@ def process_classes():
     if not class_df.empty:
         class_df["uid"] = class_df["uid"].astype(str).str.strip()
         class_df["course_raw"] = class_df["course_raw"].astype(str).str.strip()
+    class_df = ctx.shard_rows(class_df)
+
+    # typed columns: small integer index, course codes as categories
+    schema_report = new_schema_report()
+    class_df = apply_schema(class_df, get_schema(table_name), schema_report)
+    perf.read(source_path)
+    perf.checkpoint("parse")
 
     row_count_before_filter = len(class_df)
     unique_uids_before_filter = (
@@ -74,14 +84,19 @@ def process_classes():
         class_df["uid"].nunique() if row_count_after_filter > 0 else 0
     )
 
+    perf.checkpoint("uid_filter")
+
     # save processed table
-    class_df.to_csv(processed_path, index=False)
+    output_info = write_table(class_df, processed_path, ctx.output_format)
+    perf.checkpoint("write")
+    perf.wrote(processed_path)
 
     # provenance record
     provenance_record = {
         "table": table_name,
         "source_file": source_path,
         "processed_file": processed_path,
+        **output_info,
         "depends_on": {
             "grades_table": grades_path,
         },
@@ -90,6 +105,7 @@ def process_classes():
             "for each line: split on commas, first token is uid, remaining tokens are course codes",
             "create one row per (uid, course) pair with course_index",
             "strip whitespace from uid and course_raw",
+            "cast columns to the dtypes of the table schema (curate/schema.py)",
             "filter rows to keep only uids present in processed grades table",
         ],
         "stats": {
@@ -98,8 +114,11 @@ def process_classes():
             "unique_uids_before_filter": int(unique_uids_before_filter),
             "unique_uids_after_filter": int(unique_uids_after_filter),
         },
+        "schema": schema_report,
     }
 
+    provenance_record["performance"] = perf.report()
+
     with open(provenance_path, "w") as f:
         json.dump(provenance_record, f, indent=2)
 
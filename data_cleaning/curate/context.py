@@ -0,0 +1,136 @@
+# curate/context.py
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from configs.config import (
+    BASE_PATH,
+    PROCESSED_DATA_PATH,
+    PROVENANCE_PATH,
+    SHARD_UID_RANGE,
+)
+from curate.ingest import uid_from_filename
+from curate.inventory import load_inventory
+from curate.output import read_table, resolve_format, table_path
+
+
+@dataclass(frozen=True)
+class CurationContext:
+    # run-wide state shared by every process_* function: built once (after
+    # grades) and passed along, so the grades table is only read once
+    base_path: str
+    processed_data_path: str
+    provenance_path: str
+    output_format: str
+    grades_path: str
+    valid_uids: frozenset
+    # global uid -> small int code (sorted uids), stable for the whole run;
+    # the event curators use it as the uid categorical's codes
+    uid_codes: dict = field(default_factory=dict)
+    # every file under base_path (curate/inventory.py), listed once per run
+    inventory: object = None
+    # (lo, hi) of a uid-sharded run (SHARD_UID_RANGE), None for all uids
+    uid_range: tuple = None
+
+    def source_path(self, relative_path):
+        return f"{self.base_path}/{relative_path}"
+
+    def discover_files(self, relative_path, pattern):
+        # sorted source files matching pattern anywhere under relative_path
+        # (sorted so that sequential and parallel runs see the same order)
+        if self.inventory is None:
+            files = sorted(Path(self.source_path(relative_path)).rglob(pattern))
+        else:
+            files = self.inventory.discover(relative_path, pattern, self.base_path)
+        if self.uid_range is None:
+            return files
+        # a sharded run only reads the files of its uids, named as the
+        # curators name them (sms_u00.csv -> u00)
+        return [
+            f for f in files
+            if uid_in_range(uid_from_filename(f, f.suffix), self.uid_range)
+        ]
+
+    def source_exists(self, relative_path):
+        if self.inventory is None:
+            return os.path.exists(self.source_path(relative_path))
+        return self.inventory.exists(relative_path)
+
+    def shard_rows(self, df, column="uid"):
+        return shard_rows(df, self.uid_range, column)
+
+    def table_path(self, table_name):
+        return table_path(table_name, self.output_format)
+
+    def provenance_file(self, table_name):
+        return f"{self.provenance_path}/{table_name}_provenance.json"
+
+    def uid_code(self, uid):
+        return self.uid_codes[uid]
+
+
+def parse_uid_range(value=None):
+    # "lo:hi" -> (lo, hi), an empty side being None (open); None when the
+    # run is not sharded
+    value = SHARD_UID_RANGE if value is None else value
+    if not value:
+        return None
+    lo, sep, hi = value.partition(":")
+    if not sep:
+        raise ValueError(f"uid range must be 'lo:hi', got {value!r}")
+    return (lo or None, hi or None)
+
+
+def uid_in_range(uid, uid_range):
+    # lo <= uid < hi as strings; a file or row without a uid counts as "",
+    # which puts it in the first shard of a plan, so it is curated once
+    lo, hi = uid_range
+    uid = uid or ""
+    return (lo is None or uid >= lo) and (hi is None or uid < hi)
+
+
+def shard_rows(df, uid_range, column="uid"):
+    # the rows of a source table whose uid falls in uid_range
+    if uid_range is None:
+        return df
+    lo, hi = uid_range
+    uids = df[column].astype("string").fillna("")
+    keep = np.ones(len(df), dtype=bool)
+    if lo is not None:
+        keep &= (uids >= lo).to_numpy(dtype=bool)
+    if hi is not None:
+        keep &= (uids < hi).to_numpy(dtype=bool)
+    return df[keep].reset_index(drop=True)
+
+
+def build_context(grades_df=None, output_format=None, inventory=None):
+    output_format = resolve_format(output_format)
+
+    # ensure output dirs exist
+    os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
+    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+
+    # load processed grades to get the valid uids
+    if grades_df is None:
+        grades_df = read_table("grades", output_format=output_format)
+    uids = sorted(set(grades_df["uid"].astype(str).str.strip()))
+
+    # the source tree is listed (or its saved inventory validated) here,
+    # so a pipeline run walks it once for all curators
+    if inventory is None:
+        inventory = load_inventory()
+
+    return CurationContext(
+        base_path=BASE_PATH,
+        processed_data_path=PROCESSED_DATA_PATH,
+        provenance_path=PROVENANCE_PATH,
+        output_format=output_format,
+        grades_path=table_path("grades", output_format),
+        valid_uids=frozenset(uids),
+        uid_codes={uid: code for code, uid in enumerate(uids)},
+        inventory=inventory,
+        uid_range=parse_uid_range(),
+    )
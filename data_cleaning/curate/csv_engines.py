@@ -0,0 +1,310 @@
+# curate/csv_engines.py
+
+import io
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from configs.config import READ_BLOCK_BYTES, READ_ENGINE, READ_THREADS
+from curate.schema import (
+    apply_schema,
+    check_columns,
+    concat_frames,
+    header_columns,
+    new_schema_report,
+    parse_dtypes,
+    read_csv_typed,
+)
+
+READ_ENGINES = ("pandas", "blocks", "arrow")
+
+# read options the block and arrow engines reproduce; any other option
+# (skiprows, usecols, comment, ...) reads the file with pandas
+ENGINE_READ_OPTIONS = {"names", "sep"}
+
+TYPE_ERRORS = (ValueError, TypeError, OverflowError)
+
+
+def resolve_engine(engine):
+    engine = READ_ENGINE if engine is None else engine
+    if engine not in READ_ENGINES:
+        raise ValueError(f"read engine must be one of {READ_ENGINES}, got {engine!r}")
+    if engine == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "The arrow read engine requires pyarrow (pip install pyarrow)"
+            ) from e
+    return engine
+
+
+def _unsupported(read_kwargs, schema, columns):
+    # why a file has to be read by pandas itself, or None
+    options = set(read_kwargs) - ENGINE_READ_OPTIONS
+    if options:
+        return f"read options {sorted(options)}"
+    if len(read_kwargs.get("sep", ",")) != 1:
+        return "multi-character separator"
+    # columns outside the schema would have their dtype inferred, and the
+    # inference of a block (or of arrow) can differ from the whole file's
+    if "*" not in schema and any(c.strip() not in schema for c in columns):
+        return "columns without a schema dtype"
+    return None
+
+
+# --- blocks: line-aligned byte ranges parsed by pandas in a thread pool ---
+
+def _line_end(buf, start, pos):
+    # first line break at or after pos that is outside a quoted field,
+    # i.e. preceded by an even number of quote characters since start
+    # (start itself is outside quotes); -1 when there is none
+    end = buf.find(b"\n", pos)
+    if end == -1:
+        return -1
+    quotes = buf[start:end].count(b'"')
+    while quotes % 2:
+        nxt = buf.find(b"\n", end + 1)
+        if nxt == -1:
+            return -1
+        quotes += buf[end:nxt].count(b'"')
+        end = nxt
+    return end
+
+
+def block_bounds(buf, start, block_bytes):
+    # offsets of consecutive blocks of about block_bytes from start to the
+    # end of buf, each ending on a line break, so no row is split
+    bounds = [start]
+    while len(buf) - bounds[-1] > block_bytes:
+        end = _line_end(buf, bounds[-1], bounds[-1] + block_bytes)
+        if end == -1 or end + 1 >= len(buf):
+            break
+        bounds.append(end + 1)
+    bounds.append(len(buf))
+    return bounds
+
+
+def _parse_blocks(buf, bounds, columns, dtypes, read_kwargs, threads):
+    options = {k: v for k, v in read_kwargs.items() if k != "names"}
+
+    def parse(i):
+        return pd.read_csv(
+            io.BytesIO(buf[bounds[i]:bounds[i + 1]]),
+            header=None,
+            names=columns,
+            dtype=dtypes,
+            **options,
+        )
+
+    # the C parser releases the GIL while it tokenizes and converts, so
+    # threads parse blocks concurrently; map keeps them in file order
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(parse, range(len(bounds) - 1)))
+
+
+def _sort_categories(df, dtypes):
+    # the parser sorts the categories it infers; the union of the blocks'
+    # categories is in order of appearance
+    for col, dtype in dtypes.items():
+        if dtype == "category":
+            df[col] = df[col].cat.reorder_categories(
+                df[col].cat.categories.sort_values()
+            )
+    return df
+
+
+def read_csv_blocks(fpath, schema, read_kwargs, block_bytes, threads):
+    # -> (df, schema report, block count), or None when the file fits in
+    # one block and is read by pandas directly
+    report = new_schema_report()
+    columns = header_columns(fpath, read_kwargs)
+    check_columns(columns, schema, report)
+    dtypes = parse_dtypes(columns, schema)
+
+    with open(fpath, "rb") as f:
+        if f.seek(0, 2) <= block_bytes:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            # data starts after the header row
+            start = 0
+            if "names" not in read_kwargs:
+                start = _line_end(buf, 0, 0) + 1
+                if start == 0:
+                    return None
+            bounds = block_bounds(buf, start, block_bytes)
+            if len(bounds) <= 2:
+                return None
+            # as read_csv_typed: parse with the schema dtypes, and if any
+            # block does not fit, parse them all as strings and cast
+            try:
+                frames = _parse_blocks(buf, bounds, columns, dtypes, read_kwargs, threads)
+                typed = True
+            except pd.errors.ParserError:
+                # malformed rows are not a dtype problem (ParserError is a
+                # ValueError); the caller reads the file with pandas
+                raise
+            except TYPE_ERRORS:
+                string_dtypes = {col: "string" for col in dtypes}
+                frames = _parse_blocks(
+                    buf, bounds, columns, string_dtypes, read_kwargs, threads
+                )
+                typed = False
+
+    df = concat_frames(frames)
+    if typed:
+        df = _sort_categories(df, dtypes)
+    return apply_schema(df, schema, report), report, len(bounds) - 1
+
+
+# --- arrow: pyarrow's multithreaded CSV reader on a memory-mapped file ---
+
+NUMERIC_DTYPES = {"Int64", "Float64", "float64"}
+
+# read_csv's default NA strings (pandas keeps the list private), treated as
+# missing in every column
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+]
+
+# decimals arrow and read_csv convert to the same float: plain notation with
+# at most 15 digits, where both divide an exact integer by an exact power of
+# ten. Arrow rounds every value correctly, read_csv does not always for
+# longer mantissas or with an exponent, so those values go to pandas
+PLAIN_DECIMAL = r"^[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)$"
+PLAIN_DIGITS = 15
+
+
+def _arrow_numbers(column, dtype):
+    # numeric column converted by arrow, falling back to pandas for the
+    # values arrow would convert differently: a whole integer column when
+    # arrow rejects one of its values (1.0, +5, padded with spaces; read_csv
+    # accepts them), and the float values that are not PLAIN_DECIMAL
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if dtype == "Int64":
+        try:
+            values = pc.cast(column, pa.int64())
+        except pa.ArrowInvalid:
+            return pd.to_numeric(column.to_pandas().astype("string")).astype(dtype)
+        return values.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+    plain = pc.and_(
+        pc.match_substring_regex(column, PLAIN_DECIMAL),
+        pc.less_equal(pc.count_substring_regex(column, "[0-9]"), PLAIN_DIGITS),
+    )
+    series = pc.cast(pc.if_else(plain, column, None), pa.float64()).to_pandas()
+    rest = pc.fill_null(pc.invert(plain), False).to_numpy()
+    if rest.any():
+        text = column.to_pandas()[rest].astype("string")
+        series[rest] = pd.to_numeric(text).astype("float64")
+    return series.astype(dtype)
+
+
+def _arrow_frame(table, dtypes, typed):
+    # columns as read_csv returns them for the same dtypes: arrow reads
+    # every column as strings, numbers are converted by _arrow_numbers.
+    # Raises ValueError when a column does not fit, like the typed
+    # read_csv; untyped, every column is "string" for apply_schema to cast
+    data = {}
+    for name, column in zip(table.column_names, table.columns):
+        dtype = dtypes.get(name) if typed else None
+        if dtype in NUMERIC_DTYPES:
+            data[name] = _arrow_numbers(column, dtype)
+            continue
+        series = column.to_pandas()
+        if dtype == "category":
+            # read_csv leaves the (empty) categories of an all-missing
+            # column untyped
+            if series.isna().all():
+                series = series.astype(object)
+            series = series.astype("category")
+        else:
+            series = series.astype("string")
+        data[name] = series
+    return pd.DataFrame(data)
+
+
+def read_csv_arrow(fpath, schema, read_kwargs, threads):
+    # -> (df, schema report), or None when the reader cannot reproduce
+    # read_csv on this file (ragged rows, duplicate columns, ...)
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+
+    report = new_schema_report()
+    columns = header_columns(fpath, read_kwargs)
+    check_columns(columns, schema, report)
+    dtypes = parse_dtypes(columns, schema)
+
+    read_options = pacsv.ReadOptions(
+        use_threads=threads > 1,
+        column_names=list(read_kwargs["names"]) if "names" in read_kwargs else None,
+    )
+    parse_options = pacsv.ParseOptions(delimiter=read_kwargs.get("sep", ","))
+    convert_options = pacsv.ConvertOptions(
+        column_types={col: pa.string() for col in columns},
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+    try:
+        with pa.memory_map(str(fpath)) as source:
+            table = pacsv.read_csv(
+                source,
+                read_options=read_options,
+                parse_options=parse_options,
+                convert_options=convert_options,
+            )
+    except pa.ArrowInvalid:
+        return None
+    if table.column_names != columns:
+        return None
+
+    try:
+        df = _arrow_frame(table, dtypes, True)
+    except TYPE_ERRORS:
+        # a column did not fit its dtype: as read_csv_typed, every column
+        # stays a string and apply_schema casts what it can
+        df = _arrow_frame(table, dtypes, False)
+    return apply_schema(df, schema, report), report
+
+
+def read_csv_engine(fpath, schema, read_kwargs=None, engine=None,
+                    block_bytes=None, threads=None):
+    # typed read of one file with the chosen engine; every engine returns
+    # the frame read_csv_typed would. -> (df, schema report, read info)
+    read_kwargs = read_kwargs or {}
+    engine = resolve_engine(engine)
+    block_bytes = READ_BLOCK_BYTES if block_bytes is None else block_bytes
+    threads = max(1, int(READ_THREADS if threads is None else threads))
+
+    info = {"engine": engine}
+    reason = None
+    if engine != "pandas":
+        reason = _unsupported(read_kwargs, schema, header_columns(fpath, read_kwargs))
+
+    result = None
+    if engine == "blocks" and reason is None:
+        try:
+            result = read_csv_blocks(fpath, schema, read_kwargs, block_bytes, threads)
+        except pd.errors.ParserError:
+            reason = "rows the block parser rejects"
+        if result is not None:
+            df, report, info["blocks"] = result
+        elif reason is None:
+            reason = "single block"
+    elif engine == "arrow" and reason is None:
+        result = read_csv_arrow(fpath, schema, read_kwargs, threads)
+        if result is not None:
+            df, report = result
+        else:
+            reason = "rows or columns arrow reads differently"
+
+    if result is None:
+        df, report = read_csv_typed(fpath, schema, read_kwargs)
+        if engine != "pandas":
+            info = {"engine": "pandas", "requested": engine, "reason": reason}
+    return df, report, info
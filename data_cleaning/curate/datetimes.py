@@ -0,0 +1,162 @@
+# curate/datetimes.py
+
+import re
+
+import pandas as pd
+
+# candidate formats per kind of column, tried in order. Formats in one list
+# must never give different results for the same string, so the order in
+# which they are tried (see _detected_formats) cannot change the output
+DATE_FORMATS = ["%m/%d/%Y", "%Y/%m/%d", "%Y-%m-%d"]
+TIME_FORMATS = ["%I:%M %p", "%I:%M%p", "%I %p", "%I%p", "%H:%M", "%H:%M:%S"]
+DATETIME_FORMATS = [
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+]
+
+# datetime values none of DATETIME_FORMATS matches are parsed with pandas'
+# format inference (as pd.to_datetime did before the formats were listed),
+# and counted under this bucket of the parse report
+INFERRED_FORMAT = "inferred"
+
+# normalized text form of parsed times of day
+TIME_OUTPUT_FORMAT = "%H:%M:%S"
+
+# source (e.g. "calendar.DATE") -> formats that matched in earlier calls,
+# most frequent first; per process, so every worker learns on its own
+_detected_formats = {}
+
+
+def value_shape(value):
+    # failure bucket of an unparsed string, e.g. "13/24/2013" -> "99/99/9999"
+    return re.sub(r"[A-Za-z]", "a", re.sub(r"\d", "9", value))
+
+
+def _candidate_formats(formats, source):
+    detected = [f for f in _detected_formats.get(source, []) if f in formats]
+    return detected + [f for f in formats if f not in detected]
+
+
+def _parse_unique(values, formats, source, infer=False):
+    # parse each distinct string once: every format only sees the values
+    # that no earlier format could parse, and with infer the values left
+    # over are parsed one by one with an inferred format
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[us]")
+    matched = pd.Series(None, index=values.index, dtype="object")
+
+    for fmt in _candidate_formats(formats, source):
+        todo = parsed.isna() & values.notna()
+        if not todo.any():
+            break
+        attempt = pd.to_datetime(values[todo], format=fmt, errors="coerce")
+        hit = attempt[attempt.notna()]
+        parsed[hit.index] = hit
+        matched[hit.index] = fmt
+
+    todo = parsed.isna() & values.notna()
+    if infer and todo.any():
+        attempt = values[todo].map(_infer_datetime).astype("datetime64[us]")
+        hit = attempt[attempt.notna()]
+        parsed[hit.index] = hit
+        matched[hit.index] = INFERRED_FORMAT
+
+    return parsed, matched
+
+
+def _infer_datetime(value):
+    # one value in whatever format pandas recognizes; values with a UTC
+    # offset do not fit the naive column and stay failed
+    ts = pd.to_datetime(value, errors="coerce")
+    if pd.isna(ts) or ts.tzinfo is not None:
+        return pd.NaT
+    return ts
+
+
+def _parse_report(codes, values, matched):
+    # row counts per bucket: the format that parsed a value, or the shape
+    # of the values nothing could parse
+    rows_per_value = pd.Series(codes[codes >= 0]).value_counts()
+    rows_per_value = rows_per_value.reindex(values.index, fill_value=0)
+
+    # null and blank strings are missing, not failed
+    missing = (codes < 0).sum() + rows_per_value[values.isna()].sum()
+    report = {"parsed": {}, "failed": {}, "missing": int(missing)}
+    ok = matched.notna()
+    for fmt, rows in rows_per_value[ok].groupby(matched[ok]).sum().items():
+        report["parsed"][fmt] = int(rows)
+    failed = ~ok & values.notna()
+    shapes = values[failed].map(value_shape)
+    for shape, rows in rows_per_value[failed].groupby(shapes).sum().items():
+        report["failed"][shape] = int(rows)
+    return report
+
+
+def parse_datetimes(series, formats=None, source=None, infer=True):
+    # vectorized mixed-format parsing: factorize the column, parse the
+    # distinct strings, then broadcast the results back to every row
+    formats = DATETIME_FORMATS if formats is None else formats
+    codes, uniques = pd.factorize(series)
+    values = pd.Series(uniques, dtype="string").str.strip()
+    values = values.mask(values == "")
+
+    parsed, matched = _parse_unique(values, formats, source, infer)
+
+    # formats seen in this call go to the front for the next one
+    if source is not None:
+        counts = matched.value_counts()
+        _detected_formats[source] = list(counts.index) + [
+            f for f in _detected_formats.get(source, []) if f not in counts
+        ]
+
+    result = pd.Series(
+        parsed.array.take(codes, allow_fill=True),
+        index=series.index,
+        name=series.name,
+    )
+    return result, _parse_report(codes, values, matched)
+
+
+def parse_dates(series, formats=None, source=None):
+    return parse_datetimes(
+        series, DATE_FORMATS if formats is None else formats, source, infer=False
+    )
+
+
+def parse_times(series, formats=None, source=None):
+    # times of day ("8:00 PM", "1AM", "2:00 AM") as "HH:MM:SS" strings
+    parsed, report = parse_datetimes(
+        series, TIME_FORMATS if formats is None else formats, source, infer=False
+    )
+    codes, uniques = pd.factorize(parsed)
+    text = pd.array(pd.DatetimeIndex(uniques).strftime(TIME_OUTPUT_FORMAT),
+                    dtype="string")
+    result = pd.Series(
+        text.take(codes, allow_fill=True), index=series.index, name=series.name
+    )
+    return result, report
+
+
+def record_parse_report(df, column, report):
+    # the ingest engine collects these from each normalized frame
+    df.attrs.setdefault("datetime_parsing", {})[column] = report
+
+
+def pop_parse_reports(df):
+    return df.attrs.pop("datetime_parsing", None)
+
+
+def merge_parse_reports(reports):
+    # sum per-file (or per-chunk) reports into one per column
+    merged = {}
+    for report in reports:
+        for column, col_report in (report or {}).items():
+            target = merged.setdefault(
+                column, {"parsed": {}, "failed": {}, "missing": 0}
+            )
+            for key in ("parsed", "failed"):
+                for bucket, rows in col_report[key].items():
+                    target[key][bucket] = target[key].get(bucket, 0) + rows
+            target["missing"] += col_report["missing"]
+    return merged
@@ -1,29 +1,38 @@
 # curate/deadlines.py
 
-import os
 import json
+import numpy as np
 import pandas as pd
-from configs.config import BASE_PATH, PROCESSED_DATA_PATH, PROVENANCE_PATH
+from curate.context import build_context
+from curate.output import write_table
+from curate.performance import StageTimer
+from curate.schema import get_schema, read_csv_typed
 
 
-def process_deadlines():
-    # ensure output dirs exist
-    os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
-    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+def process_deadlines(ctx=None):
+    # shared run state (config paths, valid uids); built here when the
+    # curator runs standalone
+    if ctx is None:
+        ctx = build_context()
 
     table_name = "deadlines"
-    source_path = f"{BASE_PATH}/education/{table_name}.csv"
-    processed_path = f"{PROCESSED_DATA_PATH}/{table_name}.csv"
-    provenance_path = f"{PROVENANCE_PATH}/{table_name}_provenance.json"
+    source_path = ctx.source_path(f"education/{table_name}.csv")
+    processed_path = ctx.table_path(table_name)
+    provenance_path = ctx.provenance_file(table_name)
 
     # --- load source deadlines table (wide format) ---
-    wide_df = pd.read_csv(source_path)
+    # date columns are read as small nullable integers instead of float64
+    perf = StageTimer(table_name, ctx.provenance_path)
+    wide_df, schema_report = read_csv_typed(source_path, get_schema(table_name))
+    perf.read(source_path)
+    perf.checkpoint("read_csv")
     wide_df.columns = wide_df.columns.str.strip()
 
     if "uid" not in wide_df.columns:
         raise ValueError("Expected 'uid' column in deadlines table")
 
     wide_df["uid"] = wide_df["uid"].astype(str).str.strip()
+    wide_df = ctx.shard_rows(wide_df)
 
     # identify date columns (everything except uid)
     date_cols = [c for c in wide_df.columns if c != "uid"]
@@ -31,41 +40,48 @@ def process_deadlines():
     row_count_wide = len(wide_df)
     num_date_cols = len(date_cols)
 
-    # --- melt to long format: one row per (uid, date) ---
-    long_df = wide_df.melt(
-        id_vars=["uid"],
-        value_vars=date_cols,
-        var_name="date_str",
-        value_name="num_deadlines",
+    # --- sparse extraction: one row per non-zero (uid, date) cell ---
+    # almost every cell is zero, so the cells are picked straight from the
+    # wide columns instead of melting uid x date rows and dropping them;
+    # each date header is parsed once
+    dates = pd.to_datetime(
+        pd.Series(date_cols, dtype=object), format="%Y-%m-%d", errors="coerce"
     )
-
-    row_count_long_before_clean = len(long_df)
-
-    # coerce counts to numeric
-    long_df["num_deadlines"] = pd.to_numeric(
-        long_df["num_deadlines"], errors="coerce"
-    )
-
-    # parse dates
-    long_df["date"] = pd.to_datetime(
-        long_df["date_str"], format="%Y-%m-%d", errors="coerce"
+    uids = wide_df["uid"].to_numpy()
+
+    rows, cols, counts = [], [], []
+    for j, col in enumerate(date_cols):
+        # invalid date headers are dropped with all their cells
+        if pd.isna(dates.iloc[j]):
+            continue
+        # coerce counts to numeric; missing and non-numeric cells drop out
+        values = pd.to_numeric(wide_df[col], errors="coerce")
+        keep = np.flatnonzero((values > 0).to_numpy(dtype=bool, na_value=False))
+        rows.append(keep)
+        cols.append(np.full(len(keep), j))
+        counts.append(values.to_numpy(dtype=float, na_value=np.nan)[keep])
+
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=int)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=int)
+    counts = np.concatenate(counts) if counts else np.zeros(0)
+
+    # same rows, order and index as melting and filtering would give
+    long_df = pd.DataFrame(
+        {
+            "uid": uids[rows],
+            "date": dates.to_numpy()[cols],
+            "num_deadlines": counts.astype(int),
+        },
+        index=cols * row_count_wide + rows,
     )
 
-    # basic cleaning: drop rows with invalid date or missing count
-    long_df = long_df.dropna(subset=["date", "num_deadlines"])
-
-    # keep only rows with at least one deadline
-    long_df = long_df[long_df["num_deadlines"] > 0].copy()
-
-    # standardize columns
-    long_df["uid"] = long_df["uid"].astype(str).str.strip()
-    long_df["num_deadlines"] = long_df["num_deadlines"].astype(int)
+    # cells the melted long table would have had
+    row_count_long_before_clean = row_count_wide * num_date_cols
+    perf.checkpoint("extract_nonzero")
 
     # --- filter to uids present in grades ---
-    grades_path = f"{PROCESSED_DATA_PATH}/grades.csv"
-    grades_df = pd.read_csv(grades_path)
-    grades_df["uid"] = grades_df["uid"].astype(str).str.strip()
-    valid_uids = set(grades_df["uid"])
+    grades_path = ctx.grades_path
+    valid_uids = ctx.valid_uids
 
     unique_uids_before_filter = long_df["uid"].nunique()
 
@@ -81,27 +97,30 @@ def process_deadlines():
         ["uid", "date"]
     )
 
+    perf.checkpoint("uid_filter")
+
     # save processed deadlines table
-    long_df.to_csv(processed_path, index=False)
+    output_info = write_table(long_df, processed_path, ctx.output_format)
+    perf.checkpoint("write")
+    perf.wrote(processed_path)
 
     # provenance record
     provenance_record = {
         "table": table_name,
         "source_file": source_path,
         "processed_file": processed_path,
+        **output_info,
         "depends_on": {
             "grades_table": grades_path,
         },
         "operations": [
-            "read wide-format deadlines CSV",
+            "read wide-format deadlines CSV with explicit dtypes from the table schema (curate/schema.py)",
             "strip whitespace from column names and 'uid'",
             "identify all date columns (all columns except 'uid')",
-            "melt wide table into long format with columns [uid, date_str, num_deadlines]",
-            "coerce num_deadlines to numeric (errors='coerce')",
-            "parse date_str into datetime 'date' (format '%Y-%m-%d')",
-            "drop rows with invalid date or missing num_deadlines",
-            "keep only rows with num_deadlines > 0 (days that actually have deadlines)",
-            "standardize 'uid' formatting and num_deadlines as int",
+            "parse each date column header once into datetime 'date' (format '%Y-%m-%d'); columns with an invalid date are dropped",
+            "per date column: coerce counts to numeric (errors='coerce') and keep only cells with num_deadlines > 0 (missing counts are dropped)",
+            "build the long table [uid, date, num_deadlines] from the kept cells only, without melting the full uid x date matrix",
+            "num_deadlines as int",
             "filter rows to keep only uids present in processed grades table",
         ],
         "stats": {
@@ -112,8 +131,11 @@ def process_deadlines():
             "unique_uids_before_filter": int(unique_uids_before_filter),
             "unique_uids_after_filter": int(unique_uids_after_filter),
         },
+        "schema": schema_report,
     }
 
+    provenance_record["performance"] = perf.report()
+
     with open(provenance_path, "w") as f:
         json.dump(provenance_record, f, indent=2)
 
@@ -0,0 +1,100 @@
+# curate/dedup.py
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from configs.config import DEDUP_MEMORY_BYTES, DEDUP_SPILL_PATH
+
+
+def key_hashes(df, keys):
+    # one 64-bit hash per row over the natural key columns (chunks of one
+    # file are read with the same dtypes, so their hashes agree)
+    return pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+
+
+class SeenKeys:
+    # set of key hashes with a memory budget: the in-memory part is a
+    # sorted array, and once it exceeds memory_bytes it is written as a
+    # sorted run to spill_path and looked up there with a binary search
+    # on the memory-mapped file
+
+    def __init__(self, memory_bytes=None, spill_path=None):
+        self.memory_bytes = DEDUP_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.spill_path = DEDUP_SPILL_PATH if spill_path is None else spill_path
+        self._memory = np.empty(0, dtype=np.uint64)
+        self._runs = []
+        self._spill_dir = None
+        self.spilled_keys = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._runs = []
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def __len__(self):
+        return len(self._memory) + self.spilled_keys
+
+    def _contains(self, sorted_keys, hashes):
+        if len(sorted_keys) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.searchsorted(sorted_keys, hashes)
+        pos[pos == len(sorted_keys)] = len(sorted_keys) - 1
+        return np.asarray(sorted_keys[pos]) == hashes
+
+    def add_new(self, hashes):
+        # -> mask of the hashes not seen before (first occurrence within
+        # hashes included); those are remembered from now on
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = ~pd.Series(hashes).duplicated().to_numpy()
+        new &= ~self._contains(self._memory, hashes)
+        for run in self._runs:
+            if not new.any():
+                break
+            new[new] = ~self._contains(run, hashes[new])
+
+        self._memory = np.union1d(self._memory, hashes[new])
+        if self._memory.nbytes > self.memory_bytes:
+            self._spill()
+        return new
+
+    def _spill(self):
+        if self._spill_dir is None:
+            if self.spill_path is not None:
+                os.makedirs(self.spill_path, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(
+                prefix="dedup-", dir=self.spill_path
+            )
+        path = os.path.join(self._spill_dir, f"run-{len(self._runs):04d}.npy")
+        np.save(path, self._memory)
+        self._runs.append(np.load(path, mmap_mode="r"))
+        self.spilled_keys += len(self._memory)
+        self._memory = np.empty(0, dtype=np.uint64)
+
+    @property
+    def spill_runs(self):
+        return len(self._runs)
+
+
+def drop_duplicate_events(df, keys, seen):
+    # -> (df without rows whose keys were already seen, duplicates removed);
+    # rows with a missing key column value are always kept, since they
+    # cannot be told apart from a different event
+    if not keys or df.empty or any(k not in df.columns for k in keys):
+        return df, 0
+    complete = df[keys].notna().all(axis=1).to_numpy()
+    keep = np.ones(len(df), dtype=bool)
+    keep[complete] = seen.add_new(key_hashes(df[complete], keys))
+    duplicates = int(len(df) - keep.sum())
+    if duplicates:
+        df = df[keep]
+    return df, duplicates
@@ -0,0 +1,210 @@
+# curate/dimensions.py
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from configs.config import EVENT_SPECS_PATH, STREAM_CHUNK_SIZE
+from curate.context import build_context
+from curate.events import load_specs
+from curate.output import (
+    TableWriter,
+    format_info,
+    iter_table_chunks,
+    table_path,
+    write_table,
+)
+from curate.performance import StageTimer, path_size
+from curate.sql_setup import sql_setup_path, write_sql_setup
+
+
+def dimension_columns():
+    # event table -> {column: dimension}, from configs/event_sources.yaml
+    return {
+        name: dict(spec.dimensions)
+        for name, spec in load_specs().items()
+        if spec.dimensions
+    }
+
+
+def dimension_names():
+    names = []
+    for columns in dimension_columns().values():
+        names.extend(d for d in columns.values() if d not in names)
+    return names
+
+
+def dimension_table(dimension):
+    return f"dim_{dimension}"
+
+
+def normalized_table(table_name):
+    return f"{table_name}_normalized"
+
+
+def key_column(column):
+    return f"{column}_id"
+
+
+def dimension_path(dimension):
+    # dimension tables have no uid to partition by, so they are plain CSV
+    # in every output format
+    return table_path(dimension_table(dimension), "csv")
+
+
+def _text(series):
+    # values as written to the curated table; empty means missing
+    return series.astype("string").fillna("")
+
+
+def collect_values(tables, ctx, chunksize):
+    # pass 1: distinct values of every dimension, reading only the
+    # dimension columns of each table
+    values = {}
+    for table_name, columns in tables.items():
+        for chunk in iter_table_chunks(
+            table_name, chunksize, list(columns), ctx.output_format
+        ):
+            for column, dimension in columns.items():
+                if column not in chunk.columns:
+                    continue
+                seen = values.setdefault(dimension, set())
+                seen.update(_text(chunk[column]).unique())
+    # keys follow the sorted values, so the same data always gets the
+    # same keys; 0 is never used, missing values have no key
+    return {
+        dimension: sorted(v for v in seen if v != "")
+        for dimension, seen in values.items()
+    }
+
+
+def encode(series, dictionary):
+    # value -> surrogate key (1..n), missing or unknown -> <NA>
+    codes = pd.Categorical(_text(series), categories=dictionary).codes
+    keys = pd.array(codes.astype(np.int32) + 1, dtype="Int32")
+    keys[codes < 0] = pd.NA
+    return keys
+
+
+def write_normalized(table_name, columns, dictionaries, ctx, chunksize):
+    # pass 2: the event table with every dimension column replaced by its
+    # integer key, chunk by chunk
+    processed_path = ctx.table_path(normalized_table(table_name))
+    rows = 0
+    with TableWriter(processed_path, ctx.output_format) as writer:
+        for chunk in iter_table_chunks(table_name, chunksize, None, ctx.output_format):
+            for column, dimension in columns.items():
+                if column in chunk.columns:
+                    chunk[column] = encode(chunk[column], dictionaries[dimension])
+            chunk = chunk.rename(
+                columns={c: key_column(c) for c in columns if c in chunk.columns}
+            )
+            writer.write(chunk)
+            rows += len(chunk)
+    if rows == 0 and ctx.output_format == "csv":
+        # TableWriter only writes a header with the first chunk
+        write_table(pd.DataFrame(), processed_path, ctx.output_format)
+    return processed_path, rows
+
+
+def process_dimensions(ctx=None, chunksize=None):
+    # normalized output: dimension tables with integer surrogate keys and
+    # the event tables rewritten with foreign keys, plus the SQL setup
+    # script that loads them
+    if ctx is None:
+        ctx = build_context()
+
+    table_name = "dimensions"
+    provenance_path = ctx.provenance_file(table_name)
+    chunksize = STREAM_CHUNK_SIZE if chunksize is None else chunksize
+    perf = StageTimer(table_name, ctx.provenance_path)
+
+    # only curated tables can be normalized
+    tables = {}
+    missing_tables = []
+    for name, columns in dimension_columns().items():
+        if os.path.exists(ctx.table_path(name)):
+            tables[name] = columns
+        else:
+            missing_tables.append(name)
+    perf.read(*(ctx.table_path(name) for name in tables))
+
+    dictionaries = collect_values(tables, ctx, chunksize)
+    perf.checkpoint("collect_values")
+
+    dimension_files = {}
+    for dimension in dimension_names():
+        values = dictionaries.setdefault(dimension, [])
+        dim_df = pd.DataFrame(
+            {
+                key_column(dimension): pd.array(range(1, len(values) + 1), dtype="Int32"),
+                dimension: pd.array(values, dtype="string"),
+            }
+        )
+        path = dimension_path(dimension)
+        dim_df.to_csv(path, index=False)
+        perf.wrote(path)
+        dimension_files[dimension] = path
+    perf.checkpoint("write_dimensions")
+
+    table_stats = {}
+    for name, columns in tables.items():
+        path, rows = write_normalized(name, columns, dictionaries, ctx, chunksize)
+        table_stats[name] = {
+            "normalized_table": normalized_table(name),
+            "processed_file": path,
+            "row_count": int(rows),
+            "columns": {
+                c: {"key": key_column(c), "dimension": d} for c, d in columns.items()
+            },
+            "bytes_before": path_size(ctx.table_path(name)),
+            "bytes_after": path_size(path),
+        }
+        perf.wrote(path)
+    perf.checkpoint("write_normalized")
+
+    # \COPY only reads CSV
+    sql_path = sql_setup_path(ctx, True) if ctx.output_format == "csv" else None
+
+    provenance_record = {
+        "table": table_name,
+        **format_info(ctx.output_format),
+        "depends_on": {name: ctx.table_path(name) for name in tables},
+        "spec": {"path": EVENT_SPECS_PATH, "key": "dimensions"},
+        "operations": [
+            "collect the distinct values of every dimension column of the curated event tables (configs/event_sources.yaml 'dimensions'), reading only those columns in chunks",
+            "per dimension: sort the values and number them from 1; write dim_<name> as (<name>_id, <name>); missing values get no key",
+            "per event table: rewrite the curated table chunk by chunk with each dimension column replaced by <column>_id (nullable integer) as <table>_normalized",
+            "write the PostgreSQL setup script for the normalized tables (CSV output only)",
+        ],
+        "stats": {
+            "dimensions": {
+                d: {
+                    "table": dimension_table(d),
+                    "key": key_column(d),
+                    "file": dimension_files[d],
+                    "value_count": len(dictionaries[d]),
+                }
+                for d in dimension_names()
+            },
+            "tables": table_stats,
+            "missing_tables": missing_tables,
+        },
+        "sql_setup": sql_path,
+    }
+    provenance_record["performance"] = perf.report()
+
+    with open(provenance_path, "w") as f:
+        json.dump(provenance_record, f, indent=2)
+
+    # generated from the provenance record above, so it loads exactly
+    # the tables and key columns written here
+    if sql_path is not None:
+        write_sql_setup(ctx, normalized=True, path=sql_path)
+
+    return dictionaries
+
+
+if __name__ == "__main__":
+    process_dimensions()
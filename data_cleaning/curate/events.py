@@ -0,0 +1,429 @@
+# curate/events.py
+
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from functools import partial
+
+import pandas as pd
+import yaml
+from configs.config import (
+    DEDUP,
+    DEDUP_MEMORY_BYTES,
+    EVENT_SPECS_PATH,
+    INCREMENTAL,
+    SORT_OUTPUT,
+)
+from curate.context import build_context
+from curate.csv_engines import resolve_engine
+from curate.datetimes import (
+    parse_dates,
+    parse_datetimes,
+    parse_times,
+    record_parse_report,
+)
+from curate.incremental import ingest_incremental
+from curate.ingest import ingest_files, stream_files
+from curate.output import format_info, write_table
+from curate.performance import StageTimer
+from curate.schema import get_schema
+from curate.sorting import sort_columns, sort_frame
+from curate.validation import table_rules, validation_section
+
+TIMESTAMP_UNITS = {
+    "s": "seconds",
+    "ms": "milliseconds",
+    "us": "microseconds",
+    "ns": "nanoseconds",
+}
+
+# datetimes kind -> parser of curate/datetimes.py and its provenance wording
+DATETIME_KINDS = {
+    "date": (parse_dates, "a date (m/d/Y, Y/m/d or Y-m-d)"),
+    "time": (parse_times, "'HH:MM:SS' ('8:00 PM', '1AM', '20:00', ...)"),
+    "datetime": (parse_datetimes, "a datetime"),
+}
+
+
+@dataclass(frozen=True)
+class EventSpec:
+    # one entry of configs/event_sources.yaml
+    table: str
+    label: str
+    folder: str
+    glob: str
+    schema: object = None
+    read_options: dict = field(default_factory=dict)
+    renames: dict = field(default_factory=dict)
+    timestamps: dict = field(default_factory=dict)
+    datetimes: dict = field(default_factory=dict)
+    dedup: list = field(default_factory=list)
+    dimensions: dict = field(default_factory=dict)
+    time_column: str = None
+
+    @property
+    def suffix(self):
+        # file name ending stripped to get the uid (".csv", ".txt")
+        return os.path.splitext(self.glob)[1]
+
+    def dtypes(self):
+        if isinstance(self.schema, str):
+            return get_schema(self.schema)
+        return self.schema
+
+
+_specs = {}
+
+
+def _parse_spec(table_name, entry):
+    if not isinstance(entry, dict):
+        raise ValueError(f"Event spec '{table_name}' must be a mapping")
+    fields = set(EventSpec.__dataclass_fields__) - {"table"}
+    unknown = sorted(set(entry) - fields)
+    if unknown:
+        raise ValueError(f"Event spec '{table_name}': unknown keys {unknown}")
+    for key in ("folder", "glob"):
+        if key not in entry:
+            raise ValueError(f"Event spec '{table_name}': '{key}' is required")
+
+    entry = {"label": table_name, **entry}
+    for column, unit in entry.get("timestamps", {}).items():
+        if unit not in TIMESTAMP_UNITS:
+            raise ValueError(
+                f"Event spec '{table_name}': unit '{unit}' of '{column}' must "
+                f"be one of {list(TIMESTAMP_UNITS)}"
+            )
+    if not isinstance(entry.get("dedup", []), list):
+        raise ValueError(f"Event spec '{table_name}': 'dedup' must be a list of columns")
+    if not isinstance(entry.get("dimensions", {}), dict):
+        raise ValueError(
+            f"Event spec '{table_name}': 'dimensions' must map columns to dimension names"
+        )
+    datetimes = {}
+    for column, options in entry.get("datetimes", {}).items():
+        kind = options.get("kind")
+        if kind not in DATETIME_KINDS:
+            raise ValueError(
+                f"Event spec '{table_name}': kind '{kind}' of '{column}' must "
+                f"be one of {list(DATETIME_KINDS)}"
+            )
+        datetimes[column] = {"kind": kind, "output": options.get("output", column)}
+    entry["datetimes"] = datetimes
+    return EventSpec(table=table_name, **entry)
+
+
+def load_specs(path=None):
+    # table -> EventSpec, in file order; parsed once per process and path
+    path = EVENT_SPECS_PATH if path is None else path
+    if path not in _specs:
+        with open(path) as f:
+            entries = yaml.safe_load(f) or {}
+        _specs[path] = {
+            name: _parse_spec(name, entry) for name, entry in entries.items()
+        }
+    return _specs[path]
+
+
+def get_spec(table_name):
+    specs = load_specs()
+    if table_name not in specs:
+        raise ValueError(
+            f"No event spec for '{table_name}' in {EVENT_SPECS_PATH}, "
+            f"expected one of {list(specs)}"
+        )
+    return specs[table_name]
+
+
+def dedup_keys(spec):
+    # the spec's natural key, unless deduplication is switched off (DEDUP)
+    return spec.dedup if DEDUP else []
+
+
+def normalize_events(spec, df):
+    # renames, then Unix timestamps, then text dates; each step only runs
+    # when its column exists in the file
+    renames = {k: v for k, v in spec.renames.items() if k in df.columns}
+    if renames:
+        df = df.rename(columns=renames)
+
+    for column, unit in spec.timestamps.items():
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], unit=unit, errors="coerce")
+
+    for column, options in spec.datetimes.items():
+        if column in df.columns:
+            parse, _ = DATETIME_KINDS[options["kind"]]
+            output = options["output"]
+            df[output], report = parse(df[column], source=f"{spec.table}.{column}")
+            record_parse_report(df, output, report)
+    return df
+
+
+def describe_operations(spec, streaming, chunksize=None, sort_by=None):
+    # provenance 'operations' of a table, derived from its spec
+    read = "for each file: read CSV"
+    if "names" in spec.read_options:
+        read += f" with columns {spec.read_options['names']}"
+    if spec.schema is not None:
+        read += " with explicit dtypes from the table schema"
+        read += (
+            " (curate/schema.py)" if isinstance(spec.schema, str)
+            else " (configs/event_sources.yaml)"
+        )
+    if streaming:
+        read += f" in chunks of {chunksize} rows (streaming mode)"
+
+    operations = [
+        f"discover all {spec.label} files ({spec.glob}) under BASE_PATH/{spec.folder} from the source inventory (sorted by path)",
+        "for each file: infer uid from filename suffix before reading; files of uids not in processed grades table are skipped without parsing",
+        "for skipped files: count rows without parsing (included in row_count_before_filter; data-quality rules are only checked on parsed files)",
+        read,
+        "for each file: strip whitespace from column names",
+    ]
+    for source, output in spec.renames.items():
+        operations.append(f"for each file: rename '{source}' to '{output}' (if present)")
+    for column, unit in spec.timestamps.items():
+        operations.append(
+            f"for each file: normalize '{column}' from Unix {TIMESTAMP_UNITS[unit]} to datetime (if present)"
+        )
+    for column, options in spec.datetimes.items():
+        into = "" if options["output"] == column else f" into '{options['output']}'"
+        operations.append(
+            f"for each file: parse '{column}'{into} as {DATETIME_KINDS[options['kind']][1]}, "
+            "parsing each distinct string once (if present)"
+        )
+    rules = table_rules(spec.table)
+    if rules:
+        actions = {}
+        for rule in rules:
+            actions.setdefault(rule.action, []).append(rule.name)
+        operations.append(
+            f"for each {'chunk' if streaming else 'file'}: check the data-quality rules of "
+            f"configs/quality_rules.yaml in one vectorized pass ({'; '.join(f'{a}: {n}' for a, n in actions.items())}); "
+            "rows of 'drop' rules are removed, 'fail' rules stop the curator"
+        )
+    if dedup_keys(spec):
+        operations.append(
+            f"for each file: drop repeated snapshots of the same event, keyed on {spec.dedup} "
+            "(first occurrence kept; rows with a missing key are kept); seen key hashes spill "
+            "to disk beyond DEDUP_MEMORY_BYTES"
+        )
+    operations += [
+        "for each file: infer uid from filename suffix and add as 'uid' column",
+        (
+            "append each filtered chunk to the output file in discovery order"
+            if streaming and not sort_by
+            else f"concatenate all {spec.label} files into a single event-level table in discovery order"
+        ),
+    ]
+    if sort_by:
+        operations.append(
+            f"sort rows by {sort_by} (missing times first, ties in discovery order)"
+            + (
+                "; streaming: external merge sort, buffering rows up to SORT_MEMORY_BYTES "
+                "and merging the sorted runs spilled to disk into the output"
+                if streaming
+                else ""
+            )
+        )
+    return operations
+
+
+def process_events(table_name, ctx=None, workers=None, incremental=None,
+                   full_rebuild=False, streaming=False, chunksize=None,
+                   sort_output=None, read_engine=None):
+    # the one curator behind every table of configs/event_sources.yaml:
+    # discover, read, normalize, tag uid, filter and write
+    if ctx is None:
+        ctx = build_context()
+
+    spec = get_spec(table_name)
+    source_folder = ctx.source_path(spec.folder)
+    processed_path = ctx.table_path(table_name)
+    provenance_path = ctx.provenance_file(table_name)
+
+    # stage timings, peak memory and bytes moved, for the provenance record
+    perf = StageTimer(table_name, ctx.provenance_path)
+
+    # valid uids come from the processed grades table (read once into ctx)
+    grades_path = ctx.grades_path
+    valid_uids = ctx.valid_uids
+
+    incremental = INCREMENTAL if incremental is None else incremental
+    # incremental mode rewrites whole uid partitions, so it takes precedence
+    # over a streaming request; the override is printed and recorded in the
+    # provenance 'incremental' section
+    streaming_overridden = bool(streaming and incremental)
+    if streaming_overridden:
+        print(
+            f"{table_name}: streaming=True is ignored because incremental mode "
+            "is on; reading changed uids in memory"
+        )
+    streaming = streaming and not incremental
+    # rows sorted by (uid, time column of the spec) instead of discovery order
+    sort_output = SORT_OUTPUT if sort_output is None else sort_output
+    sort_by = sort_columns(spec.time_column) if sort_output else None
+    files = ctx.discover_files(spec.folder, spec.glob)
+    perf.checkpoint("discover")
+
+    # every mode reads the files the same way
+    ingest_kwargs = {
+        "suffix": spec.suffix,
+        "normalize": partial(normalize_events, spec),
+        "read_kwargs": spec.read_options,
+        "valid_uids": valid_uids,
+        "schema": spec.dtypes(),
+        "dedup_keys": dedup_keys(spec) or None,
+        # pandas, or a parallel engine for large files (curate/csv_engines.py)
+        "read_engine": resolve_engine(read_engine),
+        # configs/quality_rules.yaml, checked on every file or chunk
+        "rules": table_rules(table_name),
+        # run-wide uid codes, shared by the uid categorical of every file
+        "uid_codes": ctx.uid_codes,
+    }
+
+    events_df = None
+    if incremental:
+        # --- incremental mode: only re-read uids whose files were added,
+        # changed or removed since the last run, and merge their partitions ---
+        ingest_report = ingest_incremental(
+            table_name,
+            files,
+            workers=workers,
+            full_rebuild=full_rebuild,
+            output_format=ctx.output_format,
+            sort_by=sort_by,
+            **ingest_kwargs,
+        )
+        perf.checkpoint("ingest")
+        output_info = format_info(ctx.output_format)
+        ingestion = {"mode": "incremental", "workers": ingest_report["workers"]}
+    elif streaming:
+        # --- streaming mode: read every file in chunks, normalize, tag uid,
+        # filter and append each chunk to the output as we go ---
+        ingest_report = stream_files(
+            files,
+            processed_path=processed_path,
+            chunksize=chunksize,
+            output_format=ctx.output_format,
+            sort_by=sort_by,
+            **ingest_kwargs,
+        )
+        perf.checkpoint("ingest")
+        output_info = format_info(ctx.output_format)
+        ingestion = {
+            "mode": "streaming",
+            "chunksize": ingest_report["chunksize"],
+            "chunk_count": ingest_report["chunk_count"],
+        }
+    else:
+        # --- build the event-level table: read, normalize, tag uid and filter
+        # every file (in parallel), then concatenate in discovery order ---
+        events_df, ingest_report = ingest_files(
+            files, workers=workers, **ingest_kwargs
+        )
+        perf.checkpoint("ingest")
+
+        if sort_by:
+            events_df = sort_frame(events_df, sort_by)
+            perf.checkpoint("sort")
+
+        output_info = write_table(events_df, processed_path, ctx.output_format)
+        perf.checkpoint("write")
+        ingestion = {"mode": "in-memory", "workers": ingest_report["workers"]}
+
+    ingestion["wall_seconds"] = ingest_report["wall_seconds"]
+    if ingest_report.get("read"):
+        ingestion["read"] = ingest_report["read"]
+    ingestion["file_timings"] = ingest_report["file_timings"]
+
+    perf.add_ingest_report(ingest_report)
+    perf.wrote(processed_path)
+
+    stats = {
+        "file_count": int(ingest_report["file_count"]),
+        "row_count_before_filter": int(ingest_report["row_count_before_filter"]),
+        "row_count_parsed": int(ingest_report["row_count_parsed"]),
+        "row_count_after_filter": int(ingest_report["row_count_after_filter"]),
+        "unique_uids_before_filter": int(ingest_report["unique_uids_before_filter"]),
+        "unique_uids_after_filter": int(ingest_report["unique_uids_after_filter"]),
+        "skipped_files": int(ingest_report["skipped_files"]),
+    }
+    # invalid timestamps are counted on the 'timestamp' column
+    if "timestamp" in spec.timestamps:
+        stats["invalid_timestamps_after_normalization"] = int(
+            ingest_report["invalid_timestamps"]
+        )
+    dedup = None
+    if dedup_keys(spec):
+        dedup = ingest_report.get("dedup", {})
+        stats["duplicates_removed"] = int(dedup.get("duplicates_removed", 0))
+
+    provenance_record = {
+        "table": table_name,
+        "source_folder": source_folder,
+        "source_inventory": ctx.inventory and ctx.inventory.summary(),
+        "processed_file": processed_path,
+        **output_info,
+        "depends_on": {
+            "grades_table": grades_path,
+        },
+        "spec": {"path": EVENT_SPECS_PATH, "table": table_name},
+        "operations": describe_operations(
+            spec, streaming, ingest_report.get("chunksize"), sort_by
+        ),
+        "stats": stats,
+        # no files, or no typed reads: nothing to report
+        "schema": ingest_report.get("schema", {}),
+        "validation": validation_section(
+            table_name, ingest_report.get("validation")
+        ),
+    }
+    if spec.datetimes:
+        provenance_record["datetime_parsing"] = ingest_report.get(
+            "datetime_parsing", {}
+        )
+    if dedup is not None:
+        provenance_record["deduplication"] = {
+            "keys": spec.dedup,
+            "scope": "per uid file",
+            "memory_bytes": DEDUP_MEMORY_BYTES,
+            **dedup,
+        }
+    if sort_by:
+        # only streaming runs sort out of core; otherwise the table (or
+        # each uid partition) is already in memory
+        sort_report = ingest_report.get(
+            "sort", {"mode": "per uid partition" if incremental else "in-memory"}
+        )
+        provenance_record["sort"] = {"keys": sort_by, **sort_report}
+    provenance_record["ingestion"] = ingestion
+
+    if incremental:
+        provenance_record["incremental"] = {
+            **ingest_report["incremental"],
+            "streaming_overridden": streaming_overridden,
+        }
+
+    provenance_record["performance"] = perf.report()
+
+    with open(provenance_path, "w") as f:
+        json.dump(provenance_record, f, indent=2)
+
+    # in streaming and incremental mode the table only lives on disk
+    return events_df
+
+
+def __getattr__(name):
+    # process_<table> for tables that only exist as a spec, so the pipeline
+    # registry can name them like any other curator
+    table_name = name[len("process_"):] if name.startswith("process_") else None
+    if table_name in load_specs():
+        return partial(process_events, table_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or list(load_specs()):
+        process_events(name)
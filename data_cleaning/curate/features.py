@@ -0,0 +1,315 @@
+# curate/features.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+from curate.activity_summary import ACTIVITY_LABELS
+from curate.context import build_context
+from curate.incremental import fingerprint_file, partitions_path, uid_set_hash
+from curate.output import read_table, write_table
+from curate.performance import StageTimer
+
+# bump when the feature definitions change, so cached rows are rebuilt
+FEATURE_VERSION = 1
+
+# curated table -> (time column, {feature: (column, aggregation)}); each
+# table is grouped by (uid, day of its time column)
+FEATURE_SOURCES = {
+    "sms": ("timestamp", {"sms_count": ("timestamp", "size")}),
+    "call_log": (
+        "CALLS_date",
+        {
+            "call_count": ("CALLS_date", "size"),
+            "call_duration_seconds": ("CALLS_duration", "sum"),
+        },
+    ),
+    "app_usage": ("timestamp", {"app_usage_count": ("timestamp", "size")}),
+    "dinning": ("DATE_TIME", {"meal_count": ("DATE_TIME", "size")}),
+    "deadlines": ("date", {"num_deadlines": ("num_deadlines", "sum")}),
+}
+
+# activity is sampled every few seconds: each sample lasts until the next
+# one of the same uid, capped so that gaps in sensing do not count
+ACTIVITY_MAX_GAP_SECONDS = 60
+ACTIVITY_FEATURES = [
+    f"activity_minutes_{label}" for label in ACTIVITY_LABELS.values()
+]
+
+FEATURE_INPUTS = list(FEATURE_SOURCES) + ["activity"]
+FEATURE_COLUMNS = [
+    feature for _, spec in FEATURE_SOURCES.values() for feature in spec
+] + ACTIVITY_FEATURES
+
+# parts of a provenance record that change on every run without the data
+# changing
+VOLATILE_PROVENANCE_KEYS = ("ingestion", "incremental", "performance")
+
+
+def manifest_path(ctx):
+    return f"{ctx.provenance_path}/features_manifest.json"
+
+
+def _hash_json(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+# --- input fingerprints ---
+
+def _input_files(table_name, ctx, provenance):
+    # curated files per uid where the table is stored partitioned by uid
+    # (parquet datasets, incremental CSV partitions); otherwise only the
+    # whole table can be fingerprinted, under the key "*"
+    if ctx.output_format == "parquet" or "incremental" in provenance:
+        root = Path(partitions_path(table_name, ctx.output_format))
+        groups = {}
+        for path in sorted(root.glob("uid=*")):
+            uid = path.name[len("uid="):].replace(".csv", "")
+            files = sorted(path.rglob("*.parquet")) if path.is_dir() else [path]
+            groups[uid] = files
+        return groups
+    return {"*": [Path(ctx.table_path(table_name))]}
+
+
+def fingerprint_input(table_name, ctx, previous_files=None):
+    # -> ({uid or "*": hash}, {path: file fingerprint}); files are only
+    # re-hashed when their size or mtime changed since the last run
+    with open(ctx.provenance_file(table_name)) as f:
+        provenance = json.load(f)
+    previous_files = previous_files or {}
+
+    record = {
+        k: v for k, v in provenance.items() if k not in VOLATILE_PROVENANCE_KEYS
+    }
+    record_hash = _hash_json(record)
+
+    files = {}
+    uids = {}
+    for uid, paths in _input_files(table_name, ctx, provenance).items():
+        hashes = []
+        for path in paths:
+            key = str(path)
+            files[key] = fingerprint_file(path, previous_files.get(key))
+            hashes.append(files[key]["sha256"])
+        # content only: parquet file names change on every write
+        uids[uid] = _hash_json(sorted(hashes))
+
+    # for whole-table fingerprints the provenance record counts as well
+    if "*" in uids:
+        uids["*"] = _hash_json([uids["*"], record_hash])
+    return uids, files
+
+
+def changed_uids(previous, current, all_uids):
+    if previous is None or "*" in previous or "*" in current:
+        return set(all_uids) if previous != current else set()
+    return {
+        uid for uid in set(previous) | set(current)
+        if previous.get(uid) != current.get(uid)
+    }
+
+
+# --- feature computation ---
+
+def _day(series):
+    return pd.to_datetime(series, errors="coerce").dt.floor("D")
+
+
+def _table_features(table_name, uids, ctx):
+    time_col, spec = FEATURE_SOURCES[table_name]
+    columns = list(dict.fromkeys([time_col] + [c for c, _ in spec.values()]))
+    df = read_table(
+        table_name, uids=uids, output_format=ctx.output_format, columns=columns
+    )
+    df["date"] = _day(df[time_col])
+    return df.groupby(["uid", "date"]).agg(**spec)
+
+
+def _activity_features(uids, ctx):
+    df = read_table(
+        "activity",
+        uids=uids,
+        output_format=ctx.output_format,
+        columns=["timestamp", "activity_inference"],
+    )
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    df = df.dropna(subset=["timestamp"]).sort_values(
+        ["uid", "timestamp"], kind="stable"
+    )
+
+    # duration of each sample: time to the next sample of the same uid
+    gap = df.groupby("uid")["timestamp"].shift(-1) - df["timestamp"]
+    seconds = gap.dt.total_seconds().clip(upper=ACTIVITY_MAX_GAP_SECONDS)
+    df["minutes"] = seconds.fillna(0) / 60
+    df["date"] = df["timestamp"].dt.floor("D")
+
+    minutes = (
+        df.groupby(["uid", "date", "activity_inference"])["minutes"]
+        .sum()
+        .unstack(fill_value=0.0)
+        .reindex(columns=list(ACTIVITY_LABELS), fill_value=0.0)
+    )
+    minutes.columns = ACTIVITY_FEATURES
+    return minutes.round(4)
+
+
+def compute_features(uids, ctx, tables=None):
+    # per (uid, day) matrix for the given uids, one vectorized groupby per
+    # curated table; days without any event in any table are not listed
+    tables = FEATURE_INPUTS if tables is None else tables
+    parts = []
+    for table_name in tables:
+        if table_name == "activity":
+            parts.append(_activity_features(uids, ctx))
+        else:
+            parts.append(_table_features(table_name, uids, ctx))
+
+    columns = ["uid", "date"] + FEATURE_COLUMNS
+    if not parts:
+        return pd.DataFrame(columns=columns)
+
+    features = pd.concat(parts, axis=1).reset_index()
+    features = features.reindex(columns=columns)
+    # a table that was read has no events on a day: count 0; a table that
+    # was not available stays missing
+    available = [
+        c for c in FEATURE_COLUMNS
+        if any(c in part.columns for part in parts)
+    ]
+    features[available] = features[available].fillna(0)
+    count_cols = [c for c in available if c not in ACTIVITY_FEATURES]
+    features[count_cols] = features[count_cols].astype("int64")
+    return features.sort_values(["uid", "date"]).reset_index(drop=True)
+
+
+def process_features(ctx=None, full_rebuild=False):
+    # shared run state (config paths, valid uids); built here when the
+    # stage runs standalone
+    if ctx is None:
+        ctx = build_context()
+
+    table_name = "features_daily"
+    processed_path = ctx.table_path(table_name)
+    provenance_path = ctx.provenance_file(table_name)
+    valid_uids = sorted(ctx.valid_uids)
+    perf = StageTimer(table_name, ctx.provenance_path)
+
+    settings = {
+        "version": FEATURE_VERSION,
+        "output_format": ctx.output_format,
+        "valid_uids_sha256": uid_set_hash(ctx.valid_uids),
+        "activity_max_gap_seconds": ACTIVITY_MAX_GAP_SECONDS,
+    }
+
+    # --- decide whether the cached matrix can be reused ---
+    previous = None
+    if os.path.exists(manifest_path(ctx)):
+        with open(manifest_path(ctx)) as f:
+            previous = json.load(f)
+
+    rebuild_reason = None
+    if full_rebuild:
+        rebuild_reason = "forced full rebuild"
+    elif previous is None:
+        rebuild_reason = "no manifest from a previous run"
+    elif previous.get("settings") != settings:
+        rebuild_reason = "feature definitions, output format or valid uid set changed"
+    elif not os.path.exists(processed_path):
+        rebuild_reason = "cached feature table missing"
+    old_inputs = {} if rebuild_reason else previous["inputs"]
+
+    # --- fingerprint the curated inputs, per uid where possible ---
+    inputs = {}
+    missing_inputs = []
+    dirty_uids = set(valid_uids) if rebuild_reason else set()
+    tables_changed = []
+    for source in FEATURE_INPUTS:
+        if not os.path.exists(ctx.provenance_file(source)):
+            missing_inputs.append(source)
+            continue
+        old = old_inputs.get(source, {})
+        uids, files = fingerprint_input(source, ctx, old.get("files"))
+        inputs[source] = {"uids": uids, "files": files}
+        changed = changed_uids(old.get("uids"), uids, valid_uids)
+        if changed:
+            tables_changed.append(source)
+        dirty_uids |= changed & set(valid_uids)
+    if not rebuild_reason and sorted(previous["inputs"]) != sorted(inputs):
+        rebuild_reason = "set of available input tables changed"
+        dirty_uids = set(valid_uids)
+
+    available = [t for t in FEATURE_INPUTS if t in inputs]
+    dirty_uids = sorted(dirty_uids)
+    perf.checkpoint("fingerprint")
+
+    # --- recompute dirty uids and merge them with the cached rows ---
+    if dirty_uids:
+        fresh = compute_features(dirty_uids, ctx, available)
+    else:
+        fresh = compute_features([], ctx, [])
+    perf.checkpoint("compute")
+    if rebuild_reason:
+        features = fresh
+    else:
+        cached = read_table(table_name, output_format=ctx.output_format)
+        cached = cached[
+            cached["uid"].isin(valid_uids) & ~cached["uid"].isin(dirty_uids)
+        ]
+        cached["date"] = pd.to_datetime(cached["date"])
+        features = pd.concat([cached, fresh], ignore_index=True)
+        features = features.sort_values(["uid", "date"]).reset_index(drop=True)
+        perf.checkpoint("merge_cached")
+
+    output_info = write_table(features, processed_path, ctx.output_format)
+    perf.checkpoint("write")
+    perf.wrote(processed_path)
+    # upper bound: parquet inputs are only read for the recomputed uids
+    if dirty_uids:
+        perf.read(*(ctx.table_path(source) for source in available))
+
+    with open(manifest_path(ctx), "w") as f:
+        json.dump({"settings": settings, "inputs": inputs}, f, indent=2)
+
+    # provenance record for the feature table
+    provenance_record = {
+        "table": table_name,
+        "processed_file": processed_path,
+        **output_info,
+        "depends_on": {
+            source: ctx.table_path(source) for source in available
+        },
+        "operations": [
+            "fingerprint curated inputs per uid (parquet uid partitions or incremental CSV partitions), else per table",
+            "recompute only uids whose inputs changed; reuse cached rows of all other uids",
+            "per curated table: read needed columns of the recomputed uids, group by (uid, day) with named aggregations",
+            f"activity: each sample lasts until the next one of the same uid (at most {ACTIVITY_MAX_GAP_SECONDS}s), minutes summed per activity class",
+            "outer-join all per-table matrices on (uid, day); missing counts are 0, features of unavailable tables stay null",
+        ],
+        "stats": {
+            "row_count": int(len(features)),
+            "unique_uids": int(features["uid"].nunique()),
+            "feature_columns": FEATURE_COLUMNS,
+            "missing_inputs": missing_inputs,
+        },
+        "cache": {
+            "manifest": manifest_path(ctx),
+            "full_rebuild": rebuild_reason is not None,
+            "rebuild_reason": rebuild_reason,
+            "tables_changed": tables_changed,
+            "uids_recomputed": dirty_uids,
+            "uids_reused": sorted(set(valid_uids) - set(dirty_uids)),
+        },
+    }
+
+    provenance_record["performance"] = perf.report()
+
+    with open(provenance_path, "w") as f:
+        json.dump(provenance_record, f, indent=2)
+
+    return features
+
+
+if __name__ == "__main__":
+    process_features()
@@ -1,7 +1,11 @@
 import os
 import json
-import pandas as pd
 from configs.config import BASE_PATH, PROCESSED_DATA_PATH, PROVENANCE_PATH
+from curate.context import parse_uid_range, shard_rows
+from curate.output import table_path, write_table
+from curate.performance import StageTimer
+from curate.schema import get_schema, read_csv_typed
+from curate.validation import table_rules, validate_frame, validation_section
 
 
 def process_grades():
@@ -11,12 +15,17 @@ def process_grades():
 
     table_name = "grades"
     source_path = f"{BASE_PATH}/education/{table_name}.csv"
-    processed_path = f"{PROCESSED_DATA_PATH}/{table_name}.csv"
+    processed_path = table_path(table_name)
     provenance_path = f"{PROVENANCE_PATH}/{table_name}_provenance.json"
+    perf = StageTimer(table_name, PROVENANCE_PATH)
 
-    grades_df = pd.read_csv(source_path)
+    grades_df, schema_report = read_csv_typed(source_path, get_schema(table_name))
+    perf.read(source_path)
+    perf.checkpoint("read_csv")
     grades_df.columns = grades_df.columns.str.strip()
     grades_df["uid"] = grades_df["uid"].str.strip()
+    # a uid-sharded run keeps the students of its shard (SHARD_UID_RANGE)
+    grades_df = shard_rows(grades_df, parse_uid_range())
 
     print(grades_df.shape)
     print(grades_df.describe())
@@ -28,35 +37,38 @@ def process_grades():
     # ensure no null values go in as it's the most important table:
     grades_df = grades_df.dropna()
 
-    # GPA validation (no GPA < 0); just validation, do not modify data
+    # GPA validation (every GPA column within 0-4, configs/quality_rules.yaml);
+    # a violation fails the table, the data is not modified
+    grades_df, validation = validate_frame(grades_df, table_rules(table_name))
     min_gpa = None
     max_gpa = None
-    invalid_gpa_rows = 0
     if "gpa" in grades_df.columns:
         min_gpa = grades_df["gpa"].min()
         max_gpa = grades_df["gpa"].max()
-        invalid_gpa_rows = int((grades_df["gpa"] < 0).sum())
-        assert invalid_gpa_rows == 0, "Found GPA < 0 in grades table after dropna()"
 
     row_count_after = len(grades_df)
     uid_nunique = grades_df["uid"].nunique()
 
     print(grades_df.shape, uid_nunique)
+    perf.checkpoint("validate")
 
     # save to processed_data
-    grades_df.to_csv(processed_path, index=False)
+    output_info = write_table(grades_df, processed_path)
+    perf.checkpoint("write")
+    perf.wrote(processed_path)
 
     # provenance record for grades table
     provenance_record = {
         "table": table_name,
         "source_file": source_path,
         "processed_file": processed_path,
+        **output_info,
         "operations": [
-            "read CSV",
+            "read CSV with explicit dtypes from the table schema (curate/schema.py)",
             "strip whitespace from column names",
             "strip whitespace from 'uid'",
             "drop rows with any null values",
-            "validate GPA column has no values < 0 (if present)",
+            "check the data-quality rules of configs/quality_rules.yaml in one pass (GPA columns within 0-4, failing the table otherwise)",
         ],
         "stats": {
             "row_count_before": row_count_before,
@@ -65,10 +77,13 @@ def process_grades():
             "uid_nunique_after": int(uid_nunique),
             "min_gpa_after": float(min_gpa) if min_gpa is not None else None,
             "max_gpa_after": float(max_gpa) if max_gpa is not None else None,
-            "invalid_gpa_rows_after": invalid_gpa_rows,
         },
+        "schema": schema_report,
+        "validation": validation_section(table_name, validation),
     }
 
+    provenance_record["performance"] = perf.report()
+
     with open(provenance_path, "w") as f:
         json.dump(provenance_record, f, indent=2)
 
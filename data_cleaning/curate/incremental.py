@@ -0,0 +1,237 @@
+# curate/incremental.py
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from configs.config import PROCESSED_DATA_PATH, PROVENANCE_PATH
+from curate.ingest import ingest_files, summarize_file_stats, uid_from_filename
+from curate.output import (
+    assemble_csv_partitions,
+    resolve_format,
+    table_path,
+    write_uid_partition,
+)
+from curate.performance import merge_stage_seconds
+from curate.sorting import sort_frame
+from curate.validation import describe_rules
+
+MANIFEST_VERSION = 2
+
+
+def manifest_path(table_name):
+    # kept next to the table's provenance JSON
+    return f"{PROVENANCE_PATH}/{table_name}_manifest.json"
+
+
+def partitions_path(table_name, output_format=None):
+    # parquet tables are already partitioned by uid; CSV tables keep one
+    # CSV per uid on the side and stitch them into <table>.csv
+    if resolve_format(output_format) == "parquet":
+        return table_path(table_name, "parquet")
+    return f"{PROCESSED_DATA_PATH}/{table_name}_partitions"
+
+
+def load_manifest(table_name):
+    path = manifest_path(table_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(table_name, manifest):
+    path = manifest_path(table_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def file_sha256(fpath, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_file(fpath, previous=None):
+    st = os.stat(fpath)
+    entry = {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+    # only re-hash when size or mtime moved since the last run
+    if (
+        previous is not None
+        and previous.get("size") == entry["size"]
+        and previous.get("mtime_ns") == entry["mtime_ns"]
+    ):
+        entry["sha256"] = previous["sha256"]
+    else:
+        entry["sha256"] = file_sha256(fpath)
+    return entry
+
+
+def uid_set_hash(valid_uids):
+    if valid_uids is None:
+        return None
+    joined = "\n".join(sorted(valid_uids)).encode()
+    return hashlib.sha256(joined).hexdigest()
+
+
+def ingest_incremental(table_name, files, suffix, normalize=None,
+                       read_kwargs=None, valid_uids=None, workers=None,
+                       full_rebuild=False, output_format=None, schema=None,
+                       dedup_keys=None, sort_by=None, read_engine=None,
+                       rules=None, uid_codes=None):
+    # re-ingest only the uids whose source files were added, changed or
+    # removed since the last run and replace their partitions in the output
+    output_format = resolve_format(output_format)
+    processed_path = table_path(table_name, output_format)
+    dataset_path = partitions_path(table_name, output_format)
+    start = time.perf_counter()
+
+    settings = {
+        "version": MANIFEST_VERSION,
+        "suffix": suffix,
+        "read_kwargs": read_kwargs or {},
+        "output_format": output_format,
+        "valid_uids_sha256": uid_set_hash(valid_uids),
+        "schema": schema,
+        "dedup_keys": dedup_keys,
+        "sort_by": sort_by,
+        # rule results are kept per file, so changed rules re-read everything
+        "quality_rules": describe_rules(table_name) if rules else None,
+    }
+
+    # --- decide whether the previous run can be reused at all ---
+    previous = load_manifest(table_name)
+    rebuild_reason = None
+    if full_rebuild:
+        rebuild_reason = "forced full rebuild"
+    elif previous is None:
+        rebuild_reason = "no manifest from a previous run"
+    elif previous.get("settings") != settings:
+        rebuild_reason = "settings or valid uid set changed"
+    elif not os.path.isdir(dataset_path):
+        rebuild_reason = "processed partitions missing"
+
+    old_entries = {} if rebuild_reason else previous["files"]
+    if rebuild_reason and os.path.isdir(dataset_path):
+        shutil.rmtree(dataset_path)
+
+    # --- compare current source files against the manifest ---
+    fingerprint_start = time.perf_counter()
+    current = {}
+    for fpath in files:
+        key = str(fpath)
+        current[key] = fingerprint_file(fpath, old_entries.get(key))
+        current[key]["uid"] = uid_from_filename(fpath, suffix)
+
+    added = [p for p in current if p not in old_entries]
+    changed = [
+        p for p in current
+        if p in old_entries and old_entries[p]["sha256"] != current[p]["sha256"]
+    ]
+    removed = [p for p in old_entries if p not in current]
+
+    dirty_uids = {current[p]["uid"] for p in added + changed}
+    dirty_uids |= {old_entries[p]["uid"] for p in removed}
+
+    # every file of a dirty uid is re-read, since its partition is rewritten
+    recompute_files = [f for f in files if current[str(f)]["uid"] in dirty_uids]
+    reused = [p for p in current if current[p]["uid"] not in dirty_uids]
+
+    fingerprint_seconds = time.perf_counter() - fingerprint_start
+
+    delta_df, delta_report = ingest_files(
+        recompute_files,
+        suffix=suffix,
+        normalize=normalize,
+        read_kwargs=read_kwargs,
+        valid_uids=valid_uids,
+        workers=workers,
+        schema=schema,
+        dedup_keys=dedup_keys,
+        read_engine=read_engine,
+        rules=rules,
+        uid_codes=uid_codes,
+    )
+
+    # --- merge the deltas into the per-uid partitions ---
+    write_start = time.perf_counter()
+    delta_by_uid = {}
+    if not delta_df.empty:
+        delta_by_uid = dict(tuple(delta_df.groupby("uid", sort=False)))
+    for uid in sorted(dirty_uids):
+        uid_df = delta_by_uid.get(uid, delta_df.iloc[0:0])
+        # partitions are assembled in uid order, so sorting each one by
+        # time sorts the whole table
+        if sort_by:
+            uid_df = sort_frame(uid_df, sort_by)
+        write_uid_partition(uid_df, dataset_path, uid, output_format)
+
+    if output_format == "csv":
+        assemble_csv_partitions(dataset_path, processed_path)
+    write_seconds = time.perf_counter() - write_start
+
+    # --- new manifest: fresh stats for recomputed files, old ones otherwise ---
+    recomputed_stats = {s["file"]: s for s in delta_report["file_stats"]}
+    entries = {}
+    for p, entry in current.items():
+        stats = recomputed_stats[p] if p in recomputed_stats else old_entries[p]
+        entry["rows_read"] = stats["rows_read"]
+        entry["rows_kept"] = stats["rows_kept"]
+        entry["invalid_timestamps"] = stats["invalid_timestamps"]
+        entry["skipped"] = stats.get("skipped", False)
+        if stats.get("validation"):
+            entry["validation"] = stats["validation"]
+        if schema is not None:
+            entry["schema"] = stats.get("schema")
+        if "datetime_parsing" in stats:
+            entry["datetime_parsing"] = stats["datetime_parsing"]
+        for key in ("duplicates_removed", "dedup_spilled_keys"):
+            if key in stats:
+                entry[key] = stats[key]
+        entries[p] = entry
+
+    save_manifest(
+        table_name,
+        {"table": table_name, "settings": settings, "files": entries},
+    )
+
+    report = summarize_file_stats(
+        [{"file": p, **entry} for p, entry in entries.items()]
+    )
+    report["workers"] = delta_report["workers"]
+    report["worker_peak_rss_mb"] = delta_report["worker_peak_rss_mb"]
+    report["wall_seconds"] = round(time.perf_counter() - start, 4)
+    report["file_timings"] = delta_report["file_timings"]
+    # only files re-read in this run count as read
+    report["bytes_read"] = delta_report["bytes_read"]
+    if "read" in delta_report:
+        report["read"] = delta_report["read"]
+    report["stages"] = merge_stage_seconds(
+        [
+            {"fingerprint": fingerprint_seconds},
+            delta_report["stages"],
+            {"write_partitions": write_seconds},
+        ]
+    )
+    report["incremental"] = {
+        "manifest": manifest_path(table_name),
+        "full_rebuild": rebuild_reason is not None,
+        "rebuild_reason": rebuild_reason,
+        "partitions_path": dataset_path,
+        "files_added": sorted(added),
+        "files_changed": sorted(changed),
+        "files_removed": sorted(removed),
+        "files_recomputed": sorted(str(f) for f in recompute_files),
+        "files_reused": sorted(reused),
+        "uids_recomputed": sorted(dirty_uids),
+    }
+    return report
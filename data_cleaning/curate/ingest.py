@@ -0,0 +1,484 @@
+# curate/ingest.py
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from configs.config import INGEST_WORKERS, STREAM_CHUNK_SIZE
+from curate.csv_engines import read_csv_engine, resolve_engine
+from curate.datetimes import merge_parse_reports, pop_parse_reports
+from curate.dedup import SeenKeys, drop_duplicate_events
+from curate.output import TableWriter
+from curate.performance import (
+    merge_stage_seconds,
+    peak_rss_mb,
+    worker_peak_rss_mb,
+)
+from curate.schema import (
+    concat_frames,
+    merge_schema_reports,
+    read_csv_typed_chunks,
+)
+from curate.sorting import ExternalSorter
+from curate.validation import merge_validation_reports, validate_frame
+
+
+def uid_from_filename(fpath, suffix):
+    # e.g. sms_u00.csv -> u00, u14.txt -> u14
+    return Path(fpath).name.split("_")[-1].replace(suffix, "").strip()
+
+
+def _normalize_frame(df, uid, normalize, schema=None, uid_codes=None):
+    df.columns = df.columns.str.strip()
+
+    # per-source normalization (timestamp conversion, renames, ...)
+    if normalize is not None:
+        df = normalize(df)
+
+    # typed tables carry the uid as a categorical, so every row stores a
+    # small code instead of its own string; with the run's uid codes
+    # (CurationContext.uid_codes) every file shares the same categories, so
+    # the files concatenate without re-coding the uid column
+    if schema is not None and uid_codes and uid in uid_codes:
+        df["uid"] = pd.Categorical.from_codes(
+            np.full(len(df), uid_codes[uid], dtype=np.int32),
+            categories=list(uid_codes),
+        )
+    elif schema is not None:
+        df["uid"] = pd.Categorical.from_codes([0] * len(df), categories=[uid])
+    else:
+        df["uid"] = uid
+    return df
+
+
+def _count_invalid_timestamps(df):
+    # timestamps the normalize step could not parse; counted whatever the
+    # table's data-quality rules are
+    if "timestamp" in df.columns:
+        return int(df["timestamp"].isna().sum())
+    return 0
+
+
+def count_csv_rows(fpath, header=True, block_size=1 << 20):
+    # row count without parsing, used for files skipped by uid pushdown;
+    # plain newline counting is exact unless the file has quoted fields
+    # (which may span lines) or blank lines, then fall back to csv.reader
+    lines = 0
+    last = b"\n"
+    needs_csv = False
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            window = last + block
+            if b'"' in block or b"\n\n" in window or b"\n\r\n" in window:
+                needs_csv = True
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+
+    if needs_csv:
+        with open(fpath, newline="") as f:
+            rows = sum(
+                1 for row in csv.reader(f) if any(v.strip() for v in row)
+            )
+    else:
+        # last line may have no trailing newline
+        rows = lines + (last != b"\n")
+
+    if header:
+        rows -= 1
+    return max(rows, 0)
+
+
+def _skip_file(fpath, uid, read_kwargs, start, schema=None):
+    # uid pushdown: files of students missing from grades are never parsed,
+    # their rows are only counted so the provenance stats stay complete
+    rows = count_csv_rows(fpath, header="names" not in read_kwargs)
+    seconds = time.perf_counter() - start
+    file_stats = {
+        "file": str(fpath),
+        "uid": uid,
+        "rows_read": int(rows),
+        "rows_kept": 0,
+        "invalid_timestamps": 0,
+        "skipped": True,
+        "seconds": round(seconds, 4),
+        "bytes_read": os.path.getsize(fpath),
+        "stages": {"uid_filter": seconds},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if schema is not None:
+        # skipped files are never parsed, so their columns are not checked
+        file_stats["schema"] = None
+    return pd.DataFrame(), file_stats
+
+
+def _ingest_file(fpath, suffix, normalize, read_kwargs, valid_uids,
+                 schema=None, dedup_keys=None, read_engine=None, rules=None,
+                 uid_codes=None):
+    start = time.perf_counter()
+
+    # the uid comes from the filename, so excluded files are skipped
+    # before any parsing happens
+    uid = uid_from_filename(fpath, suffix)
+    if valid_uids is not None and uid not in valid_uids:
+        return _skip_file(fpath, uid, read_kwargs, start, schema)
+
+    # with a schema, columns are typed by the parser; anything that does
+    # not match is kept as read and reported per file
+    # (with the block or arrow engine, large files are parsed in parallel)
+    schema_report = None
+    read_info = None
+    if schema is not None:
+        df, schema_report, read_info = read_csv_engine(
+            fpath, schema, read_kwargs, read_engine
+        )
+    else:
+        df = pd.read_csv(fpath, **read_kwargs)
+    read_end = time.perf_counter()
+    df = _normalize_frame(df, uid, normalize, schema, uid_codes)
+    parse_report = pop_parse_reports(df)
+    rows_read = len(df)
+    invalid_timestamps = _count_invalid_timestamps(df)
+    end = time.perf_counter()
+    stages = {"read_csv": read_end - start, "normalize": end - read_end}
+
+    # data-quality rules of the table (curate/validation.py), all in one
+    # pass over the file's rows
+    validation = None
+    if rules:
+        df, validation = validate_frame(df, rules)
+        stages["validate"] = time.perf_counter() - end
+        end = time.perf_counter()
+
+    # repeated snapshots of the same event within the uid's file
+    if dedup_keys:
+        with SeenKeys() as seen:
+            df, duplicates = drop_duplicate_events(df, dedup_keys, seen)
+        stages["dedup"] = time.perf_counter() - end
+        end = time.perf_counter()
+
+    file_stats = {
+        "file": str(fpath),
+        "uid": uid,
+        "rows_read": int(rows_read),
+        "rows_kept": int(len(df)),
+        "invalid_timestamps": invalid_timestamps,
+        "skipped": False,
+        "seconds": round(end - start, 4),
+        "bytes_read": os.path.getsize(fpath),
+        # read_csv covers the uid check and the typed parse
+        "stages": stages,
+        # of the process that read the file (a pool worker when workers > 1)
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if dedup_keys:
+        file_stats["duplicates_removed"] = duplicates
+        file_stats["dedup_spilled_keys"] = seen.spilled_keys
+    if schema is not None:
+        file_stats["schema"] = schema_report
+        file_stats["read"] = read_info
+    if validation is not None:
+        file_stats["validation"] = validation
+    # date/time columns parsed by the normalize step report their buckets
+    if parse_report is not None:
+        file_stats["datetime_parsing"] = parse_report
+    return df, file_stats
+
+
+def ingest_files(files, suffix, normalize=None, read_kwargs=None,
+                 valid_uids=None, workers=None, schema=None, dedup_keys=None,
+                 read_engine=None, rules=None, uid_codes=None):
+    # read, normalize, uid-tag and filter every file, in a process pool when
+    # workers > 1; results come back in input order so the concatenated
+    # table is identical to a sequential run
+    files = list(files)
+    read_kwargs = read_kwargs or {}
+    workers = INGEST_WORKERS if workers is None else workers
+    workers = max(1, min(int(workers), len(files) or 1))
+    # resolved here, so every worker uses the engine of this run
+    read_engine = resolve_engine(read_engine)
+
+    start = time.perf_counter()
+    args = (
+        files,
+        repeat(suffix),
+        repeat(normalize),
+        repeat(read_kwargs),
+        repeat(valid_uids),
+        repeat(schema),
+        repeat(dedup_keys),
+        repeat(read_engine),
+        repeat(rules),
+        repeat(uid_codes),
+    )
+    if workers == 1:
+        results = list(map(_ingest_file, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_ingest_file, *args))
+
+    kept = [df for df, _ in results if not df.empty]
+    file_stats = [s for _, s in results]
+
+    concat_start = time.perf_counter()
+    if kept:
+        df = concat_frames(kept)
+    else:
+        df = pd.DataFrame()
+    concat_seconds = time.perf_counter() - concat_start
+
+    report = summarize_file_stats(file_stats)
+    report["workers"] = workers
+    report["worker_peak_rss_mb"] = worker_peak_rss_mb(
+        (s["peak_rss_mb"] for s in file_stats), workers
+    )
+    report["bytes_read"] = sum(s["bytes_read"] for s in file_stats)
+    report["stages"] = merge_stage_seconds(
+        [s["stages"] for s in file_stats] + [{"concat": concat_seconds}]
+    )
+    report["wall_seconds"] = round(time.perf_counter() - start, 4)
+    report["file_stats"] = file_stats
+    report["file_timings"] = [
+        {k: s[k] for k in ("file", "rows_read", "seconds")}
+        for s in file_stats
+    ]
+    return df, report
+
+
+def summarize_file_stats(file_stats):
+    # table-level provenance stats from the per-file stats of _ingest_file
+    summary = {
+        "file_count": len(file_stats),
+        "row_count_before_filter": sum(s["rows_read"] for s in file_stats),
+        # rows actually parsed, i.e. of the files the uid filter let through
+        "row_count_parsed": sum(
+            s["rows_read"] for s in file_stats if not s.get("skipped")
+        ),
+        "row_count_after_filter": sum(s["rows_kept"] for s in file_stats),
+        "unique_uids_before_filter": len(
+            {s["uid"] for s in file_stats if s["rows_read"] > 0}
+        ),
+        "unique_uids_after_filter": len(
+            {s["uid"] for s in file_stats if s["rows_kept"] > 0}
+        ),
+        "invalid_timestamps": sum(s["invalid_timestamps"] for s in file_stats),
+        "skipped_files": sum(1 for s in file_stats if s.get("skipped")),
+    }
+    # rule results of the parsed files, in file order
+    if any(s.get("validation") for s in file_stats):
+        summary["validation"] = merge_validation_reports(
+            s.get("validation") for s in file_stats
+        )
+    # schema issues only exist for typed reads
+    if any("schema" in s for s in file_stats):
+        summary["schema"] = merge_schema_reports(
+            s["schema"] for s in file_stats if s.get("schema")
+        )
+    if any("datetime_parsing" in s for s in file_stats):
+        summary["datetime_parsing"] = merge_parse_reports(
+            s.get("datetime_parsing") for s in file_stats
+        )
+    # only tables with dedup keys count duplicates
+    if any("duplicates_removed" in s for s in file_stats):
+        summary["dedup"] = summarize_dedup(file_stats)
+    if any(s.get("read") for s in file_stats):
+        summary["read"] = summarize_reads(file_stats)
+    return summary
+
+
+def summarize_reads(file_stats):
+    # which engine read the files, and why some fell back to pandas
+    engines = {}
+    fallbacks = {}
+    for s in file_stats:
+        info = s.get("read")
+        if not info:
+            continue
+        engines[info["engine"]] = engines.get(info["engine"], 0) + 1
+        if info.get("reason"):
+            fallbacks[info["reason"]] = fallbacks.get(info["reason"], 0) + 1
+    return {
+        "engines": engines,
+        "blocks": sum((s.get("read") or {}).get("blocks", 0) for s in file_stats),
+        "fallbacks": fallbacks,
+    }
+
+
+def summarize_dedup(file_stats):
+    by_uid = {}
+    for s in file_stats:
+        if s.get("duplicates_removed"):
+            by_uid[s["uid"]] = by_uid.get(s["uid"], 0) + s["duplicates_removed"]
+    return {
+        "duplicates_removed": sum(by_uid.values()),
+        "spilled_keys": sum(s.get("dedup_spilled_keys", 0) for s in file_stats),
+        "duplicates_by_uid": dict(sorted(by_uid.items())),
+    }
+
+
+def stream_files(files, suffix, processed_path, normalize=None,
+                 read_kwargs=None, valid_uids=None, chunksize=None,
+                 output_format=None, schema=None, dedup_keys=None,
+                 sort_by=None, read_engine=None, rules=None, uid_codes=None):
+    # bounded-memory variant of ingest_files: every file is read in chunks
+    # that are normalized, uid-tagged, filtered and appended to
+    # processed_path straight away, so only one chunk is held in memory;
+    # with sort_by the chunks go through an external merge sort instead.
+    # Chunks are always read by pandas (read_engine is for whole files)
+    files = list(files)
+    read_kwargs = read_kwargs or {}
+    chunksize = STREAM_CHUNK_SIZE if chunksize is None else chunksize
+
+    start = time.perf_counter()
+    uids_before = set()
+    uids_after = set()
+    row_count_before = 0
+    row_count_parsed = 0
+    row_count_after = 0
+    invalid_timestamps = 0
+    chunk_count = 0
+    skipped_files = 0
+    file_timings = []
+    schema_reports = []
+    parse_reports = []
+    dedup_stats = []
+    validation_reports = []
+    bytes_read = 0
+    stages = {"uid_filter": 0.0, "read_csv": 0.0, "normalize": 0.0, "write": 0.0}
+    if dedup_keys:
+        stages["dedup"] = 0.0
+    if rules:
+        stages["validate"] = 0.0
+    sorter = ExternalSorter(sort_by) if sort_by else None
+
+    with TableWriter(processed_path, output_format) as writer:
+        for fpath in files:
+            file_start = time.perf_counter()
+            uid = uid_from_filename(fpath, suffix)
+            bytes_read += os.path.getsize(fpath)
+
+            if valid_uids is not None and uid not in valid_uids:
+                # uid pushdown: count rows, never parse
+                rows_read = count_csv_rows(
+                    fpath, header="names" not in read_kwargs
+                )
+                skipped_files += 1
+                stages["uid_filter"] += time.perf_counter() - file_start
+            else:
+                rows_read = 0
+                rows_kept = 0
+                duplicates = 0
+                # keys seen in earlier chunks of this file, within budget
+                seen = SeenKeys() if dedup_keys else None
+                if schema is not None:
+                    chunks, schema_report = read_csv_typed_chunks(
+                        fpath, schema, chunksize, read_kwargs
+                    )
+                    schema_reports.append(schema_report)
+                else:
+                    chunks = pd.read_csv(
+                        fpath, chunksize=chunksize, **read_kwargs
+                    )
+                # chunks are parsed lazily, so reading is the time spent
+                # waiting for the next chunk
+                t = time.perf_counter()
+                for chunk in chunks:
+                    t_read = time.perf_counter()
+                    stages["read_csv"] += t_read - t
+                    chunk = _normalize_frame(
+                        chunk, uid, normalize, schema, uid_codes
+                    )
+                    parse_report = pop_parse_reports(chunk)
+                    if parse_report is not None:
+                        parse_reports.append(parse_report)
+                    chunk_count += 1
+                    rows_read += len(chunk)
+                    invalid_timestamps += _count_invalid_timestamps(chunk)
+                    t_normalized = time.perf_counter()
+                    stages["normalize"] += t_normalized - t_read
+                    # the table's rules, one pass per chunk
+                    if rules:
+                        chunk, validation = validate_frame(chunk, rules)
+                        validation_reports.append(validation)
+                        t_validated = time.perf_counter()
+                        stages["validate"] += t_validated - t_normalized
+                        t_normalized = t_validated
+                    if seen is not None:
+                        chunk, removed = drop_duplicate_events(chunk, dedup_keys, seen)
+                        duplicates += removed
+                        t_deduped = time.perf_counter()
+                        stages["dedup"] += t_deduped - t_normalized
+                        t_normalized = t_deduped
+                    if sorter is not None:
+                        sorter.add(chunk)
+                    else:
+                        writer.write(chunk)
+                    rows_kept += len(chunk)
+                    t = time.perf_counter()
+                    stages["write"] += t - t_normalized
+                stages["read_csv"] += time.perf_counter() - t
+                row_count_parsed += rows_read
+                row_count_after += rows_kept
+                if rows_kept > 0:
+                    uids_after.add(uid)
+                if seen is not None:
+                    dedup_stats.append(
+                        {
+                            "uid": uid,
+                            "duplicates_removed": duplicates,
+                            "dedup_spilled_keys": seen.spilled_keys,
+                        }
+                    )
+                    seen.close()
+
+            row_count_before += rows_read
+            if rows_read > 0:
+                uids_before.add(uid)
+
+            file_timings.append(
+                {
+                    "file": str(fpath),
+                    "rows_read": int(rows_read),
+                    "seconds": round(time.perf_counter() - file_start, 4),
+                }
+            )
+
+        if sorter is not None:
+            # spilled runs are merged straight into the output
+            t = time.perf_counter()
+            with sorter:
+                sorter.write_to(writer)
+            stages["sort"] = time.perf_counter() - t
+
+    report = {
+        "file_count": len(files),
+        "row_count_before_filter": row_count_before,
+        "row_count_parsed": row_count_parsed,
+        "row_count_after_filter": row_count_after,
+        "unique_uids_before_filter": len(uids_before),
+        "unique_uids_after_filter": len(uids_after),
+        "invalid_timestamps": invalid_timestamps,
+        "skipped_files": skipped_files,
+        "chunksize": int(chunksize),
+        "chunk_count": chunk_count,
+        "wall_seconds": round(time.perf_counter() - start, 4),
+        "file_timings": file_timings,
+        "bytes_read": bytes_read,
+        "stages": merge_stage_seconds([stages]),
+    }
+    if schema is not None:
+        report["schema"] = merge_schema_reports(schema_reports)
+    if parse_reports:
+        report["datetime_parsing"] = merge_parse_reports(parse_reports)
+    if dedup_keys:
+        report["dedup"] = summarize_dedup(dedup_stats)
+    if validation_reports:
+        report["validation"] = merge_validation_reports(validation_reports)
+    if sorter is not None:
+        report["sort"] = sorter.report()
+    return report
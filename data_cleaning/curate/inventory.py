@@ -0,0 +1,299 @@
+# curate/inventory.py
+
+import argparse
+import json
+import os
+import re
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from configs.config import (
+    BASE_PATH,
+    DISCOVERY_WORKERS,
+    INVENTORY_PATH,
+    INVENTORY_VALIDATE,
+    PROVENANCE_PATH,
+)
+
+INVENTORY_VERSION = 1
+INVENTORY_FILE = "source_inventory.json"
+
+# per-uid files end in the uid: sms_u00.csv, activity_u14.csv, u14.txt
+UID_PATTERN = re.compile(r"(?:^|_)(u\d+)$")
+
+
+def inventory_path():
+    return INVENTORY_PATH or f"{PROVENANCE_PATH}/{INVENTORY_FILE}"
+
+
+def uid_from_name(name):
+    match = UID_PATTERN.search(name.split(".")[0])
+    return match.group(1) if match else None
+
+
+def _scan_dir(base_path, rel_dir):
+    # one directory: its mtime, file records and subdirectories; None when
+    # it disappeared since it was listed
+    path = os.path.join(base_path, rel_dir)
+    files, subdirs = [], []
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        with os.scandir(path) as entries:
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                # symlinked directories are not followed, as with rglob
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(rel)
+                elif entry.is_file():
+                    st = entry.stat()
+                    files.append(
+                        {
+                            "source": rel_dir,
+                            "uid": uid_from_name(entry.name),
+                            "path": rel,
+                            "size": st.st_size,
+                            "mtime_ns": st.st_mtime_ns,
+                        }
+                    )
+    except FileNotFoundError:
+        return None
+    return mtime_ns, files, subdirs
+
+
+def _scan_tree(base_path, roots, workers, known=()):
+    # breadth-first walk with one os.scandir per directory, spread over a
+    # thread pool (the calls wait on the file system, not the GIL);
+    # subdirectories in known are validated separately and not entered
+    # -> {rel_dir: (mtime_ns, [file records])}
+    scanned = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        pending = {pool.submit(_scan_dir, base_path, r): r for r in roots}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                rel_dir = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    continue
+                mtime_ns, files, subdirs = result
+                scanned[rel_dir] = (mtime_ns, files)
+                for sub in subdirs:
+                    if sub not in known:
+                        pending[pool.submit(_scan_dir, base_path, sub)] = sub
+    return scanned
+
+
+def _stat_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _stat_file(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class SourceInventory:
+    # every file under BASE_PATH as (source, uid, path, size, mtime_ns),
+    # source being its directory and path relative to BASE_PATH; curators
+    # take their file lists from here instead of walking the tree
+
+    def __init__(self, base_path, directories, files, report=None):
+        self.base_path = base_path
+        # rel_dir -> mtime_ns, the cheap check on the next run
+        self.directories = directories
+        self.files = files
+        self.report = report or {}
+        self._by_source = None
+
+    def _sources(self):
+        if self._by_source is None:
+            by_source = {}
+            for record in self.files:
+                by_source.setdefault(record["source"], []).append(record)
+            self._by_source = by_source
+        return self._by_source
+
+    def __getstate__(self):
+        # the lookup index is rebuilt where it is used
+        state = dict(self.__dict__)
+        state["_by_source"] = None
+        return state
+
+    def records(self, relative_path, pattern="*"):
+        # files matching pattern anywhere under relative_path (the
+        # semantics of Path(relative_path).rglob(pattern)), sorted by path
+        prefix = relative_path.strip("/")
+        matched = []
+        for source, records in self._sources().items():
+            if prefix and source != prefix and not source.startswith(prefix + "/"):
+                continue
+            matched.extend(
+                r for r in records
+                if fnmatchcase(r["path"].rsplit("/", 1)[-1], pattern)
+            )
+        return sorted(matched, key=lambda r: r["path"])
+
+    def discover(self, relative_path, pattern="*", base_path=None):
+        # same Path list as Path(BASE_PATH/relative_path).rglob(pattern),
+        # rooted at base_path as given (the inventory keeps it absolute)
+        base = Path(self.base_path if base_path is None else base_path)
+        return [base / r["path"] for r in self.records(relative_path, pattern)]
+
+    def exists(self, relative_path):
+        rel = os.path.normpath(relative_path).replace(os.sep, "/").strip("/")
+        source = rel.rpartition("/")[0]
+        return any(r["path"] == rel for r in self._sources().get(source, []))
+
+    def summary(self):
+        return {
+            "path": self.report.get("path"),
+            "mode": self.report.get("mode"),
+            "listed_directories": self.report.get("listed_directories"),
+            "files": len(self.files),
+            "directories": len(self.directories),
+        }
+
+    def to_json(self):
+        return {
+            "version": INVENTORY_VERSION,
+            "base_path": self.base_path,
+            "directories": self.directories,
+            "files": self.files,
+            "report": self.report,
+        }
+
+
+def _from_scan(scanned):
+    directories = {d: scanned[d][0] for d in sorted(scanned)}
+    files = sorted(
+        (r for d in directories for r in scanned[d][1]), key=lambda r: r["path"]
+    )
+    return directories, files
+
+
+def scan_inventory(base_path=None, workers=None):
+    # full walk of base_path
+    base_path = os.path.abspath(BASE_PATH if base_path is None else base_path)
+    workers = DISCOVERY_WORKERS if workers is None else workers
+    directories, files = _from_scan(_scan_tree(base_path, [""], workers))
+    return SourceInventory(base_path, directories, files)
+
+
+def validate_inventory(inventory, workers=None, validate=None):
+    # cheap check of a persisted inventory: one stat per directory, since
+    # adding, removing or renaming a file changes its directory's mtime.
+    # Only changed directories (and new subdirectories) are listed again.
+    # validate="files" also re-stats every listed file, which catches
+    # files rewritten in place; -> (inventory, rescanned directories)
+    workers = DISCOVERY_WORKERS if workers is None else workers
+    validate = INVENTORY_VALIDATE if validate is None else validate
+    base_path = inventory.base_path
+    known = list(inventory.directories)
+
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        mtimes = dict(
+            zip(known, pool.map(_stat_mtime, (os.path.join(base_path, d) for d in known)))
+        )
+    changed = [d for d in known if mtimes[d] is not None and mtimes[d] != inventory.directories[d]]
+    kept = {d for d in known if mtimes[d] is not None and d not in changed}
+
+    scanned = {d: (inventory.directories[d], []) for d in kept}
+    for record in inventory.files:
+        if record["source"] in kept:
+            scanned[record["source"]][1].append(record)
+    scanned.update(_scan_tree(base_path, changed, workers, known=set(known)))
+
+    if validate == "files":
+        unchanged = [r for d in kept for r in scanned[d][1]]
+        with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+            stats = pool.map(
+                _stat_file, (os.path.join(base_path, r["path"]) for r in unchanged)
+            )
+            for record, st in zip(unchanged, stats):
+                if st is not None:
+                    record["size"], record["mtime_ns"] = st
+
+    directories, files = _from_scan(scanned)
+    return SourceInventory(base_path, directories, files), changed
+
+
+def save_inventory(inventory, path=None):
+    path = inventory_path() if path is None else path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # written aside and renamed, so a concurrent reader never sees half a
+    # file (shard workers on several hosts may share the inventory)
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(inventory.to_json(), f)
+    os.replace(tmp_path, path)
+
+
+def _read_inventory(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != INVENTORY_VERSION:
+        return None
+    return SourceInventory(data["base_path"], data["directories"], data["files"])
+
+
+def load_inventory(base_path=None, path=None, workers=None, refresh=False):
+    # the inventory of base_path: the persisted one when it is still valid
+    # (changed directories re-listed), a full scan otherwise; the result
+    # is saved again for the next run
+    start = time.perf_counter()
+    base_path = os.path.abspath(BASE_PATH if base_path is None else base_path)
+    path = inventory_path() if path is None else path
+
+    inventory = None if refresh else _read_inventory(path)
+    if inventory is not None and inventory.base_path == base_path:
+        inventory, changed = validate_inventory(inventory, workers)
+        report = {"mode": "validated", "listed_directories": len(changed)}
+    else:
+        inventory = scan_inventory(base_path, workers)
+        report = {"mode": "scan", "listed_directories": len(inventory.directories)}
+
+    inventory.report = {
+        "path": path,
+        **report,
+        "seconds": round(time.perf_counter() - start, 4),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    save_inventory(inventory, path)
+    return inventory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scan BASE_PATH and persist the source file inventory"
+    )
+    parser.add_argument(
+        "--refresh", action="store_true",
+        help="ignore the persisted inventory and walk the whole tree",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+    inventory = load_inventory(workers=args.workers, refresh=args.refresh)
+    report = inventory.report
+    print(
+        f"{len(inventory.files)} files in {len(inventory.directories)} "
+        f"directories ({report['mode']}, {report['listed_directories']} "
+        f"listed, {report['seconds']:.2f}s) -> {report['path']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
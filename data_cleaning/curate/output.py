@@ -0,0 +1,244 @@
+# curate/output.py
+
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+from configs.config import OUTPUT_FORMAT, PROCESSED_DATA_PATH
+
+OUTPUT_FORMATS = ("csv", "parquet")
+
+# every curated table carries a uid column; parquet datasets are split into
+# one uid=<uid>/ directory per student so single-student reads stay cheap
+PARTITION_COLS = ["uid"]
+
+
+def resolve_format(output_format=None):
+    output_format = OUTPUT_FORMAT if output_format is None else output_format
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unknown output format '{output_format}', "
+            f"expected one of {OUTPUT_FORMATS}"
+        )
+    if output_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "Parquet output requires pyarrow (pip install pyarrow)"
+            ) from e
+    return output_format
+
+
+def table_path(table_name, output_format=None):
+    if resolve_format(output_format) == "parquet":
+        # directory holding the hive-partitioned dataset
+        return f"{PROCESSED_DATA_PATH}/{table_name}.parquet"
+    return f"{PROCESSED_DATA_PATH}/{table_name}.csv"
+
+
+def format_info(output_format=None):
+    # what gets recorded in provenance about the written table
+    output_format = resolve_format(output_format)
+    info = {"output_format": output_format}
+    if output_format == "parquet":
+        info["partition_cols"] = list(PARTITION_COLS)
+    return info
+
+
+def _reset_dataset(processed_path):
+    # parquet writes add files to existing partitions, so always start from
+    # an empty dataset directory to avoid mixing in rows from older runs
+    if os.path.isdir(processed_path):
+        shutil.rmtree(processed_path)
+    os.makedirs(processed_path)
+
+
+def write_table(df, processed_path, output_format=None):
+    output_format = resolve_format(output_format)
+
+    if output_format == "csv":
+        df.to_csv(processed_path, index=False)
+    else:
+        _reset_dataset(processed_path)
+        if not df.empty:
+            df.to_parquet(
+                processed_path, partition_cols=PARTITION_COLS, index=False
+            )
+
+    return format_info(output_format)
+
+
+def uid_partition_path(dataset_path, uid, output_format=None):
+    if resolve_format(output_format) == "parquet":
+        return f"{dataset_path}/uid={uid}"
+    return f"{dataset_path}/uid={uid}.csv"
+
+
+def write_uid_partition(df, dataset_path, uid, output_format=None):
+    # replace everything stored for one uid; an empty frame just removes it
+    output_format = resolve_format(output_format)
+    partition_path = uid_partition_path(dataset_path, uid, output_format)
+
+    if os.path.isdir(partition_path):
+        shutil.rmtree(partition_path)
+    elif os.path.exists(partition_path):
+        os.remove(partition_path)
+
+    if df.empty:
+        return
+
+    os.makedirs(dataset_path, exist_ok=True)
+    if output_format == "csv":
+        df.to_csv(partition_path, index=False)
+    else:
+        df.to_parquet(dataset_path, partition_cols=PARTITION_COLS, index=False)
+
+
+def concat_csv_files(parts, processed_path):
+    # stitch CSV files with a header row each (in the given order) into
+    # one table; files without columns add nothing
+    headers = {}
+    for part in parts:
+        with open(part, "rb") as f:
+            header = f.readline()
+        if header.strip() not in (b"", b'""'):
+            headers[part] = header
+    parts = [part for part in parts if part in headers]
+    if not parts:
+        pd.DataFrame().to_csv(processed_path, index=False)
+        return
+
+    if len(set(headers.values())) > 1:
+        # columns differ between files, let pandas align them (values are
+        # kept as the text that was written)
+        pd.concat(
+            [pd.read_csv(part, dtype=str, keep_default_na=False) for part in parts],
+            ignore_index=True,
+        ).to_csv(processed_path, index=False)
+        return
+
+    # identical headers: plain byte copy, no re-parsing
+    with open(processed_path, "wb") as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                shutil.copyfileobj(f, out)
+
+
+def assemble_csv_partitions(dataset_path, processed_path):
+    # stitch per-uid CSV partitions (in uid order) into the final table
+    concat_csv_files(sorted(Path(dataset_path).glob("uid=*.csv")), processed_path)
+
+
+def concat_parquet_datasets(parts, processed_path):
+    # union of partitioned datasets over disjoint uids: their uid=<uid>/
+    # directories are copied side by side, without reading a row
+    _reset_dataset(processed_path)
+    for part in parts:
+        shutil.copytree(part, processed_path, dirs_exist_ok=True)
+
+
+class TableWriter:
+    # incremental writer for streaming curators: CSV chunks are appended
+    # under a single header, parquet chunks become one more file in each
+    # uid partition they touch
+
+    def __init__(self, processed_path, output_format=None):
+        self.processed_path = processed_path
+        self.output_format = resolve_format(output_format)
+        self.columns = None
+        self.chunk_index = 0
+
+        if self.output_format == "csv":
+            self._out = open(processed_path, "w", newline="")
+        else:
+            self._out = None
+            _reset_dataset(processed_path)
+
+    def write(self, df):
+        if df.empty:
+            return
+
+        # the first written chunk fixes the output columns
+        if self.columns is None:
+            self.columns = list(df.columns)
+            header = True
+        else:
+            df = df.reindex(columns=self.columns)
+            header = False
+
+        if self.output_format == "csv":
+            df.to_csv(self._out, header=header, index=False)
+        else:
+            df.to_parquet(
+                self.processed_path,
+                partition_cols=PARTITION_COLS,
+                index=False,
+                basename_template=f"part-{self.chunk_index:06d}-{{i}}.parquet",
+            )
+        self.chunk_index += 1
+
+    def close(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_table_chunks(table_name, chunksize, columns=None, output_format=None):
+    # a curated table in chunks of rows; CSV values are kept as the text
+    # that was written, so they can be written back unchanged
+    output_format = resolve_format(output_format)
+    processed_path = table_path(table_name, output_format)
+
+    if output_format == "csv":
+        try:
+            yield from pd.read_csv(
+                processed_path,
+                chunksize=chunksize,
+                usecols=columns,
+                dtype=str,
+                keep_default_na=False,
+            )
+        except pd.errors.EmptyDataError:
+            # no rows were written (e.g. every uid filtered out)
+            return
+        return
+
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(processed_path, format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+        yield batch.to_pandas()
+
+
+def read_table(table_name, uids=None, output_format=None, columns=None):
+    # columns: optional projection; uid is always returned
+    output_format = resolve_format(output_format)
+    processed_path = table_path(table_name, output_format)
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ["uid"]))
+
+    if output_format == "csv":
+        df = pd.read_csv(processed_path, usecols=columns)
+        df["uid"] = df["uid"].astype(str).str.strip()
+        if uids is not None:
+            df = df[df["uid"].isin(set(uids))].reset_index(drop=True)
+        return df
+
+    # partition pruning: only the uid=<uid>/ directories asked for are read
+    filters = None
+    if uids is not None:
+        filters = [("uid", "in", sorted(set(uids)))]
+    df = pd.read_parquet(processed_path, columns=columns, filters=filters)
+    df["uid"] = df["uid"].astype(str)
+    return df
@@ -0,0 +1,209 @@
+# curate/performance.py
+
+import os
+import sys
+import time
+from pathlib import Path
+
+from configs.config import PROFILE, PROFILER
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILERS = ("cprofile", "pyinstrument")
+
+# set by the pipeline (--profile) inside the process that runs a table
+_profiling = None
+
+
+def enable_profiling(enabled=True):
+    global _profiling
+    _profiling = enabled
+
+
+def _proc_status_kb(field):
+    # Linux only: current (VmRSS) and peak (VmHWM) resident set size
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # on Linux the high-water mark can be reset, so a table run in a reused
+    # pool worker does not inherit the peak of the table before it
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    # high-water mark of this process only: ingestion pool workers report
+    # their own (returned with their results, see worker_peak_rss_mb)
+    peak_kb = _proc_status_kb("VmHWM")
+    if peak_kb is None:
+        if resource is None:
+            return None
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_kb /= 1024
+    return round(peak_kb / 1024, 2)
+
+
+def worker_peak_rss_mb(peaks, workers):
+    # largest peak_rss_mb() returned by the pool workers of one table; None
+    # when the work ran in this process (workers == 1)
+    if workers <= 1:
+        return None
+    return max((p for p in peaks if p is not None), default=None)
+
+
+def path_size(path):
+    # bytes of a file, or of every file under a directory (parquet datasets)
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    if path.exists():
+        return path.stat().st_size
+    return 0
+
+
+def merge_stage_seconds(stage_dicts):
+    # sum {stage: seconds} dicts, e.g. the per-file stages of ingestion
+    merged = {}
+    for stages in stage_dicts:
+        for name, seconds in (stages or {}).items():
+            merged[name] = merged.get(name, 0.0) + seconds
+    return {name: round(seconds, 4) for name, seconds in merged.items()}
+
+
+class StageTimer:
+    # per-table cost record for the 'performance' section of provenance:
+    # checkpoint(name) closes a stage that started at the previous
+    # checkpoint, so curators only mark where each step ends
+
+    def __init__(self, table_name, profile_dir, profile=None):
+        self.table_name = table_name
+        self.stages = {}
+        self.file_stages = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.worker_peak = None
+        self.peak_reset = reset_peak_rss()
+
+        if profile is None:
+            profile = PROFILE if _profiling is None else _profiling
+        self.profile_path = None
+        self._profiler = None
+        if profile:
+            self._start_profiler(profile_dir)
+
+        self.start = time.perf_counter()
+        self._last = self.start
+        self._last_peak = peak_rss_mb()
+        self.start_peak = self._last_peak
+
+    def _start_profiler(self, profile_dir):
+        if PROFILER not in PROFILERS:
+            raise ValueError(
+                f"Unknown profiler '{PROFILER}', expected one of {PROFILERS}"
+            )
+        os.makedirs(profile_dir, exist_ok=True)
+        if PROFILER == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError as e:
+                raise ImportError(
+                    "PROFILER = 'pyinstrument' requires pyinstrument "
+                    "(pip install pyinstrument)"
+                ) from e
+            self.profile_path = f"{profile_dir}/{self.table_name}_profile.html"
+            self._profiler = Profiler()
+            self._profiler.start()
+        else:
+            import cProfile
+
+            self.profile_path = f"{profile_dir}/{self.table_name}_profile.prof"
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _stop_profiler(self):
+        if self._profiler is None:
+            return
+        if PROFILER == "pyinstrument":
+            self._profiler.stop()
+            with open(self.profile_path, "w") as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+        self._profiler = None
+
+    def checkpoint(self, name):
+        now = time.perf_counter()
+        peak = peak_rss_mb()
+        stage = self.stages.setdefault(
+            name, {"seconds": 0.0, "calls": 0, "peak_rss_mb": None}
+        )
+        stage["seconds"] = round(stage["seconds"] + now - self._last, 4)
+        stage["calls"] += 1
+        stage["peak_rss_mb"] = peak
+        # how much this stage raised the table's memory high-water mark
+        if peak is not None and self._last_peak is not None:
+            stage["peak_rss_increase_mb"] = round(
+                stage.get("peak_rss_increase_mb", 0.0)
+                + max(0.0, peak - self._last_peak),
+                2,
+            )
+        self._last = now
+        self._last_peak = peak
+
+    def read(self, *paths):
+        for path in paths:
+            self.bytes_read += path_size(path)
+
+    def wrote(self, *paths):
+        for path in paths:
+            self.bytes_written += path_size(path)
+
+    def add_ingest_report(self, ingest_report):
+        # per-file stages run inside the ingestion workers: their seconds
+        # are summed over files, so with several workers they exceed the
+        # wall time of the enclosing stage
+        self.bytes_read += ingest_report.get("bytes_read", 0)
+        self.file_stages = merge_stage_seconds(
+            [self.file_stages, ingest_report.get("stages")]
+        )
+        # the workers parse in their own processes, so their memory is not
+        # in this process's high-water mark
+        peaks = [self.worker_peak, ingest_report.get("worker_peak_rss_mb")]
+        self.worker_peak = max((p for p in peaks if p is not None), default=None)
+
+    def report(self):
+        self._stop_profiler()
+        peaks = [p for p in (self._last_peak, self.worker_peak) if p is not None]
+        return {
+            "wall_seconds": round(time.perf_counter() - self.start, 4),
+            # the largest process of the table: the curator itself or one of
+            # its ingestion workers (stage peaks are the curator's own)
+            "peak_rss_mb": max(peaks, default=None),
+            "curator_peak_rss_mb": self._last_peak,
+            "worker_peak_rss_mb": self.worker_peak,
+            # False: the peak may predate this table (not Linux)
+            "peak_rss_reset": self.peak_reset,
+            "bytes_read": int(self.bytes_read),
+            "bytes_written": int(self.bytes_written),
+            "stages": self.stages,
+            "file_stages_seconds": self.file_stages,
+            "profile": self.profile_path,
+        }
@@ -1,23 +1,32 @@
 # curate/piazza.py
 
-import os
 import json
 import pandas as pd
-from configs.config import BASE_PATH, PROCESSED_DATA_PATH, PROVENANCE_PATH
+from curate.context import build_context
+from curate.output import write_table
+from curate.performance import StageTimer
+from curate.schema import get_schema, read_csv_typed
+from curate.validation import table_rules, validate_frame, validation_section
 
 
-def process_piazza():
-    # ensure output dirs exist
-    os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
-    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+def process_piazza(ctx=None):
+    # shared run state (config paths, valid uids); built here when the
+    # curator runs standalone
+    if ctx is None:
+        ctx = build_context()
 
     table_name = "piazza"
-    source_path = f"{BASE_PATH}/education/{table_name}.csv"
-    processed_path = f"{PROCESSED_DATA_PATH}/{table_name}.csv"
-    provenance_path = f"{PROVENANCE_PATH}/{table_name}_provenance.json"
+    source_path = ctx.source_path(f"education/{table_name}.csv")
+    processed_path = ctx.table_path(table_name)
+    provenance_path = ctx.provenance_file(table_name)
 
     # --- load source piazza table ---
-    piazza_df = pd.read_csv(source_path)
+    # metrics are read as nullable integers; a column that does not parse
+    # is reported under 'schema' and coerced below
+    perf = StageTimer(table_name, ctx.provenance_path)
+    piazza_df, schema_report = read_csv_typed(source_path, get_schema(table_name))
+    perf.read(source_path)
+    perf.checkpoint("read_csv")
 
     # standardize column names
     piazza_df.columns = piazza_df.columns.str.strip()
@@ -25,6 +34,7 @@ def process_piazza():
         raise ValueError("Expected 'uid' column in piazza table")
 
     piazza_df["uid"] = piazza_df["uid"].astype(str).str.strip()
+    piazza_df = ctx.shard_rows(piazza_df)
 
     # columns we expect to be numeric
     numeric_cols = [
@@ -42,19 +52,22 @@ def process_piazza():
     row_count_before = len(piazza_df)
     null_rows_before = int(piazza_df.isna().any(axis=1).sum())
 
-    # --- validate / enforce numeric dtypes ---
-    for col in numeric_cols:
-        piazza_df[col] = pd.to_numeric(piazza_df[col], errors="coerce")
+    # --- validate (configs/quality_rules.yaml), all rules in one pass ---
+    # rows with a metric that is not a number or with a missing value in any
+    # column are dropped (as dropna did), negative counts are reported
+    piazza_df, validation = validate_frame(piazza_df, table_rules(table_name))
 
-    # drop any rows with nulls (after coercion)
-    piazza_df = piazza_df.dropna()
+    # every remaining metric parses, so the columns can be made numeric
+    for col in numeric_cols:
+        piazza_df[col] = pd.to_numeric(piazza_df[col])
     row_count_after_dropna = len(piazza_df)
     null_rows_after = int(piazza_df.isna().any(axis=1).sum())
+    perf.checkpoint("clean")
 
     # --- merge/filter with grades table (keep only uids in grades) ---
-    grades_path = f"{PROCESSED_DATA_PATH}/grades.csv"
-    grades_df = pd.read_csv(grades_path)
-    grades_df["uid"] = grades_df["uid"].astype(str).str.strip()
+    grades_path = ctx.grades_path
+    # (typed, so a shard without valid uids still merges on strings)
+    grades_df = pd.DataFrame({"uid": pd.Series(sorted(ctx.valid_uids), dtype=str)})
 
     unique_uids_before_merge = piazza_df["uid"].nunique()
 
@@ -66,24 +79,28 @@ def process_piazza():
 
     row_count_after_merge = len(merged_df)
     unique_uids_after_merge = merged_df["uid"].nunique()
+    perf.checkpoint("uid_filter")
 
     # save processed piazza table
-    merged_df.to_csv(processed_path, index=False)
+    output_info = write_table(merged_df, processed_path, ctx.output_format)
+    perf.checkpoint("write")
+    perf.wrote(processed_path)
 
     # provenance record
     provenance_record = {
         "table": table_name,
         "source_file": source_path,
         "processed_file": processed_path,
+        **output_info,
         "depends_on": {
             "grades_table": grades_path,
         },
         "operations": [
-            "read CSV",
+            "read CSV with explicit dtypes from the table schema (curate/schema.py)",
             "strip whitespace from column names",
             "standardize 'uid' formatting (string, stripped)",
-            "coerce piazza metric columns to numeric (errors='coerce')",
-            "drop rows with any null values after type coercion",
+            "check the data-quality rules of configs/quality_rules.yaml in one pass: drop rows whose metrics are not numbers or that have a missing value in any column, report negative counts",
+            "convert piazza metric columns to numeric",
             "inner-join with processed grades table on 'uid' to keep only valid students",
         ],
         "stats": {
@@ -95,8 +112,12 @@ def process_piazza():
             "row_count_after_merge": int(row_count_after_merge),
             "unique_uids_after_merge": int(unique_uids_after_merge),
         },
+        "schema": schema_report,
+        "validation": validation_section(table_name, validation),
     }
 
+    provenance_record["performance"] = perf.report()
+
     with open(provenance_path, "w") as f:
         json.dump(provenance_record, f, indent=2)
 
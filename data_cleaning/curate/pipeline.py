@@ -0,0 +1,367 @@
+# curate/pipeline.py
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from configs.config import (
+    NORMALIZED_OUTPUT,
+    PIPELINE_JOBS,
+    PROVENANCE_PATH,
+    SHARD_UID_RANGE,
+    STEP_CACHE,
+)
+from curate.context import build_context
+from curate.csv_engines import READ_ENGINES
+from curate.events import load_specs
+from curate.output import table_path
+from curate.performance import enable_profiling
+from curate.step_cache import StepCache, is_cacheable
+
+# table -> (module, function, upstream tables, run options it accepts)
+# every table is filtered against the processed grades table, so grades
+# must finish first and the curators can run concurrently after it; the
+# daily feature stage waits for the event tables it reads
+EVENT_OPTIONS = (
+    "workers", "incremental", "full_rebuild", "sort_output", "read_engine",
+)
+TABLES = {
+    "grades": ("curate.grades", "process_grades", [], ()),
+    "calendar": ("curate.calendar", "process_calendar", ["grades"], EVENT_OPTIONS),
+    "dinning": ("curate.dining", "process_dinning", ["grades"], EVENT_OPTIONS),
+    "sms": ("curate.sms", "process_sms", ["grades"], EVENT_OPTIONS),
+    "call_log": ("curate.calls", "process_call_log", ["grades"], EVENT_OPTIONS),
+    "app_usage": ("curate.app_usage", "process_app_usage", ["grades"], EVENT_OPTIONS),
+    "piazza": ("curate.piazza", "process_piazza", ["grades"], ()),
+    "class": ("curate.classes", "process_classes", ["grades"], ()),
+    "deadlines": ("curate.deadlines", "process_deadlines", ["grades"], ()),
+    "activity": ("curate.activity", "process_activity", ["grades"], EVENT_OPTIONS),
+    "survey": ("curate.survey", "process_survey", ["grades"], ("workers",)),
+    "activity_summary": (
+        "curate.activity_summary",
+        "process_activity_summary",
+        ["grades"],
+        ("workers",),
+    ),
+    # per-uid daily features over the curated event tables
+    "features_daily": (
+        "curate.features",
+        "process_features",
+        ["sms", "call_log", "app_usage", "dinning", "deadlines", "activity"],
+        ("full_rebuild",),
+    ),
+}
+
+# event tables that only exist as a spec in configs/event_sources.yaml
+# (phonelock, conversation, wifi, ...) run through the generic engine
+for _name in load_specs():
+    TABLES.setdefault(
+        _name, ("curate.events", f"process_{_name}", ["grades"], EVENT_OPTIONS)
+    )
+
+# normalized output: dimension tables and <table>_normalized, built from the
+# curated event tables that declare dimensions; only run with
+# NORMALIZED_OUTPUT (or --normalized, or when asked for by --only)
+TABLES["dimensions"] = (
+    "curate.dimensions",
+    "process_dimensions",
+    [name for name, spec in load_specs().items() if spec.dimensions],
+    (),
+)
+OPTIONAL_TABLES = {"dimensions"}
+
+# module names are accepted for --only as well
+ALIASES = {
+    "dining": "dinning",
+    "calls": "call_log",
+    "classes": "class",
+    "activity_summary_all": "activity_summary",
+    "survey_scores": "survey",
+    "normalized": "dimensions",
+    "features": "features_daily",
+}
+
+
+def resolve_tables(only=None, normalized=None):
+    if not only:
+        normalized = NORMALIZED_OUTPUT if normalized is None else normalized
+        # the dimension ids of a uid-sharded run are assigned once, over the
+        # merged tables (python -m curate.shards merge)
+        if SHARD_UID_RANGE:
+            normalized = False
+        return [
+            name for name in TABLES
+            if name not in OPTIONAL_TABLES or normalized
+        ]
+
+    requested = set()
+    for name in only:
+        name = ALIASES.get(name.strip(), name.strip())
+        if name not in TABLES:
+            raise ValueError(
+                f"Unknown table '{name}', expected one of {list(TABLES)}"
+            )
+        requested.add(name)
+
+    # keep the registry order so runs are reproducible
+    return [name for name in TABLES if name in requested]
+
+
+def _run_table(name, kwargs, profile=None, step_cache=False):
+    module_name, func_name, upstream, _ = TABLES[name]
+    # set in the worker itself, so it holds whatever the start method
+    if profile is not None:
+        enable_profiling(profile)
+    start = time.time()
+
+    # an unchanged step is restored instead of re-run; a forced full
+    # rebuild always runs (and refreshes the cache)
+    step = None
+    if step_cache and is_cacheable(name):
+        step = StepCache(name, module_name, upstream, kwargs)
+    cached = (
+        step is not None and not kwargs.get("full_rebuild") and step.restore()
+    )
+
+    result = None
+    if not cached:
+        func = getattr(importlib.import_module(module_name), func_name)
+        result = func(**kwargs)
+        if step is not None:
+            step.store()
+
+    # the shared context is built from the grades frame right here, so no
+    # other table has to read grades again
+    ctx = None
+    if name == "grades":
+        ctx = build_context(grades_df=result) if result is not None else build_context()
+    return {"start": start, "end": time.time(), "ctx": ctx, "cached": cached}
+
+
+def critical_path(timings):
+    # longest chain of table durations through the dependency graph
+    finish = {}
+    previous = {}
+    for name in TABLES:
+        if name not in timings:
+            continue
+        upstream = [d for d in TABLES[name][2] if d in finish]
+        best = max(upstream, key=lambda d: finish[d], default=None)
+        finish[name] = timings[name]["seconds"] + (finish[best] if best else 0.0)
+        previous[name] = best
+
+    if not finish:
+        return [], 0.0
+
+    last = max(finish, key=finish.get)
+    path = [last]
+    while previous[path[-1]] is not None:
+        path.append(previous[path[-1]])
+    return path[::-1], finish[last]
+
+
+def print_report(results, wall_seconds):
+    timings = {n: r for n, r in results.items() if r["status"] == "ok"}
+    path, path_seconds = critical_path(timings)
+    busy_seconds = sum(r["seconds"] for r in timings.values())
+
+    print("=== Pipeline report ===")
+    print(f"{'table':<18}{'status':<10}{'start':>9}{'end':>9}{'seconds':>10}")
+    for name, r in results.items():
+        if r["status"] == "ok":
+            status = "cached" if r.get("cached") else r["status"]
+            print(
+                f"{name:<18}{status:<10}"
+                f"{r['start_offset']:>9.2f}{r['end_offset']:>9.2f}"
+                f"{r['seconds']:>10.2f}"
+            )
+        else:
+            print(f"{name:<18}{r['status']:<10}")
+
+    print(f"critical path: {' -> '.join(path) or '-'} ({path_seconds:.2f}s)")
+    print(
+        f"wall clock: {wall_seconds:.2f}s | sum of table times: "
+        f"{busy_seconds:.2f}s | parallelism: "
+        f"{busy_seconds / wall_seconds if wall_seconds else 0.0:.2f}x"
+    )
+    return path, path_seconds
+
+
+def run_pipeline(only=None, jobs=None, ingest_workers=None,
+                 incremental=None, full_rebuild=False, profile=None,
+                 step_cache=None, sort_output=None, normalized=None,
+                 read_engine=None):
+    selected = resolve_tables(only, normalized)
+    jobs = PIPELINE_JOBS if jobs is None else jobs
+    jobs = max(1, min(int(jobs), len(selected)))
+    step_cache = STEP_CACHE if step_cache is None else step_cache
+
+    # tables outside the selection must already have been curated
+    for name in selected:
+        for dep in TABLES[name][2]:
+            if dep not in selected and not os.path.exists(table_path(dep)):
+                raise FileNotFoundError(
+                    f"'{name}' depends on '{dep}', which is not selected "
+                    f"and has no output at {table_path(dep)}"
+                )
+
+    # with several tables in flight, default to one ingestion process per
+    # table so the machine is not oversubscribed
+    if ingest_workers is None and jobs > 1:
+        ingest_workers = 1
+
+    # without grades in this run, build the shared context from its output
+    ctx = None if "grades" in selected else build_context()
+
+    def table_kwargs(name):
+        if name == "grades":
+            return {}
+        kwargs = {"ctx": ctx}
+        options = TABLES[name][3]
+        if "workers" in options:
+            kwargs["workers"] = ingest_workers
+        if "incremental" in options and incremental is not None:
+            kwargs["incremental"] = incremental
+        if "full_rebuild" in options and full_rebuild:
+            kwargs["full_rebuild"] = True
+        if "sort_output" in options and sort_output is not None:
+            kwargs["sort_output"] = sort_output
+        if "read_engine" in options and read_engine is not None:
+            kwargs["read_engine"] = read_engine
+        return kwargs
+
+    pipeline_start = time.time()
+    pending = list(selected)
+    running = {}
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # submit every table whose upstream tables are done
+            for name in list(pending):
+                deps = [d for d in TABLES[name][2] if d in selected]
+                dep_status = [results.get(d, {}).get("status") for d in deps]
+                if any(s in ("failed", "skipped") for s in dep_status):
+                    results[name] = {"status": "skipped"}
+                    pending.remove(name)
+                elif all(s == "ok" for s in dep_status):
+                    print(f"=== Curating {name} ===")
+                    future = pool.submit(
+                        _run_table, name, table_kwargs(name), profile,
+                        step_cache,
+                    )
+                    running[future] = name
+                    pending.remove(name)
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    t = future.result()
+                except Exception as e:
+                    print(f"!!! {name} failed: {e!r}", file=sys.stderr)
+                    results[name] = {"status": "failed", "error": repr(e)}
+                    continue
+                if t["ctx"] is not None:
+                    ctx = t["ctx"]
+                results[name] = {
+                    "status": "ok",
+                    "start_offset": round(t["start"] - pipeline_start, 4),
+                    "end_offset": round(t["end"] - pipeline_start, 4),
+                    "seconds": round(t["end"] - t["start"], 4),
+                    "cached": t["cached"],
+                }
+
+    wall_seconds = time.time() - pipeline_start
+    results = {name: results[name] for name in selected}
+    path, path_seconds = print_report(results, wall_seconds)
+
+    # run record next to the per-table provenance files
+    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+    with open(f"{PROVENANCE_PATH}/pipeline_run.json", "w") as f:
+        json.dump(
+            {
+                "tables": results,
+                "jobs": jobs,
+                "step_cache": step_cache,
+                "wall_seconds": round(wall_seconds, 4),
+                "critical_path": path,
+                "critical_path_seconds": round(path_seconds, 4),
+            },
+            f,
+            indent=2,
+        )
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the curation pipeline")
+    parser.add_argument(
+        "--only",
+        help="comma-separated tables to run, e.g. sms,activity",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=None,
+        help="number of tables curated concurrently (default: PIPELINE_JOBS)",
+    )
+    parser.add_argument(
+        "--ingest-workers", type=int, default=None,
+        help="ingestion processes per event table (default: 1 when jobs > 1)",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true", default=None,
+        help="only re-process source files changed since the last run",
+    )
+    parser.add_argument(
+        "--full-rebuild", action="store_true",
+        help="ignore manifests and caches from previous runs",
+    )
+    parser.add_argument(
+        "--sort-output", action="store_true", default=None,
+        help="write event tables sorted by (uid, time) (default: SORT_OUTPUT)",
+    )
+    parser.add_argument(
+        "--read-engine", choices=READ_ENGINES, default=None,
+        help="how event curators parse whole files (default: READ_ENGINE)",
+    )
+    parser.add_argument(
+        "--normalized", action="store_true", default=None,
+        help="also write dimension tables and normalized event tables (default: NORMALIZED_OUTPUT)",
+    )
+    parser.add_argument(
+        "--step-cache", action="store_true", default=None,
+        help="restore unchanged tables from the step cache instead of re-running them",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", default=None,
+        help="dump a profile of every table next to its provenance file",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_pipeline(
+        only=args.only.split(",") if args.only else None,
+        jobs=args.jobs,
+        ingest_workers=args.ingest_workers,
+        incremental=args.incremental,
+        full_rebuild=args.full_rebuild,
+        profile=args.profile,
+        step_cache=args.step_cache,
+        sort_output=args.sort_output,
+        normalized=args.normalized,
+        read_engine=args.read_engine,
+    )
+    if any(r["status"] != "ok" for r in results.values()):
+        sys.exit(1)
+    print("=== All curation jobs completed successfully ===")
+
+
+if __name__ == "__main__":
+    main()
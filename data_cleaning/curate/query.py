@@ -0,0 +1,259 @@
+# curate/query.py
+
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+from curate.events import load_specs
+from curate.output import read_table, resolve_format, table_path
+
+# curated table -> time column range queries are answered on: the event
+# tables' time_column in configs/event_sources.yaml, plus the tables that
+# are not curated from an event spec
+TIME_COLUMNS = {
+    name: spec.time_column
+    for name, spec in load_specs().items()
+    if spec.time_column is not None
+}
+TIME_COLUMNS.update(
+    {
+        "deadlines": "date",
+        "features_daily": "date",
+    }
+)
+
+INDEX_VERSION = 1
+
+# rows without a valid time sort first and never match a time range
+_NAT = np.iinfo(np.int64).min
+
+
+def index_path(table_name):
+    return f"{table_path(table_name, 'csv')}.idx.npz"
+
+
+# --- index building (CSV tables) ---
+
+def _row_starts(path, block_size=1 << 24):
+    # byte offset of every row start (header included); a newline inside a
+    # quoted field (odd number of quotes before it) does not end a row
+    starts = [np.zeros(1, dtype=np.int64)]
+    pos = 0
+    quotes = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            buf = np.frombuffer(block, dtype=np.uint8)
+            newlines = np.flatnonzero(buf == ord("\n"))
+            quote_pos = np.flatnonzero(buf == ord('"'))
+            if len(quote_pos):
+                parity = (np.searchsorted(quote_pos, newlines) + quotes) % 2
+                newlines = newlines[parity == 0]
+            quotes += len(quote_pos)
+            starts.append(newlines.astype(np.int64) + pos + 1)
+            pos += len(block)
+
+    starts = np.concatenate(starts)
+    # no row starts at the very end of the file
+    return starts[starts < pos], pos
+
+
+def build_index(table_name):
+    # sorted (uid, time) -> (byte offset, length) of each row of the CSV
+    path = table_path(table_name, "csv")
+    time_col = TIME_COLUMNS[table_name]
+    st = os.stat(path)
+
+    starts, size = _row_starts(path)
+    ends = np.append(starts[1:], size)
+    with open(path, "rb") as f:
+        header = f.read(int(ends[0]))
+
+    keys = pd.read_csv(path, usecols=["uid", time_col])
+    if len(keys) != len(starts) - 1:
+        raise ValueError(
+            f"Cannot index {path}: found {len(starts) - 1} rows by byte "
+            f"scan but {len(keys)} rows by parsing"
+        )
+
+    uids = keys["uid"].astype(str).str.strip().to_numpy()
+    times = pd.to_datetime(keys[time_col], errors="coerce")
+    times = times.astype("datetime64[ns]").to_numpy().view(np.int64)
+
+    order = np.lexsort((times, uids))
+    sorted_uids = uids[order]
+    uid_values, uid_starts = np.unique(sorted_uids, return_index=True)
+
+    index = {
+        "version": np.array(INDEX_VERSION),
+        "source_size": np.array(st.st_size),
+        "source_mtime_ns": np.array(st.st_mtime_ns),
+        "header": np.frombuffer(header, dtype=np.uint8),
+        "uids": uid_values.astype(str),
+        "uid_bounds": np.append(uid_starts, len(order)).astype(np.int64),
+        "times": times[order],
+        "offsets": starts[1:][order],
+        "lengths": (ends[1:] - starts[1:])[order],
+    }
+    np.savez(index_path(table_name), **index)
+    return index
+
+
+def load_index(table_name):
+    # rebuilt whenever the CSV changed since the index was written
+    path = index_path(table_name)
+    if os.path.exists(path):
+        st = os.stat(table_path(table_name, "csv"))
+        with np.load(path) as stored:
+            index = dict(stored)
+        if (
+            int(index["version"]) == INDEX_VERSION
+            and int(index["source_size"]) == st.st_size
+            and int(index["source_mtime_ns"]) == st.st_mtime_ns
+        ):
+            return index
+    return build_index(table_name)
+
+
+# --- queries ---
+
+def _to_ns(value):
+    if value is None:
+        return None
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+def _select_rows(index, uids, start, end):
+    # positions into the sorted index arrays: one binary search per uid
+    start_ns, end_ns = _to_ns(start), _to_ns(end)
+    uid_values = index["uids"]
+    wanted = uid_values if uids is None else sorted(set(uids))
+    selected = []
+    for uid in wanted:
+        k = np.searchsorted(uid_values, uid)
+        if k == len(uid_values) or uid_values[k] != uid:
+            continue
+        first = index["uid_bounds"][k]
+        times = index["times"][first:index["uid_bounds"][k + 1]]
+
+        lo, hi = 0, len(times)
+        if start_ns is not None:
+            lo = np.searchsorted(times, start_ns, side="left")
+        elif end_ns is not None:
+            # rows without a valid time never match a time range
+            lo = np.searchsorted(times, _NAT, side="right")
+        if end_ns is not None:
+            hi = np.searchsorted(times, end_ns, side="left")
+        if lo < hi:
+            selected.append(np.arange(first + lo, first + hi))
+    if not selected:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(selected)
+
+
+def _read_rows(path, offsets, lengths):
+    # read rows in file order, merging adjacent rows into one read
+    chunks = []
+    with open(path, "rb") as f:
+        run_start, run_end = None, None
+        for offset, length in zip(offsets.tolist(), lengths.tolist()):
+            if run_end == offset:
+                run_end += length
+                continue
+            if run_start is not None:
+                f.seek(run_start)
+                chunks.append(f.read(run_end - run_start))
+            run_start, run_end = offset, offset + length
+        if run_start is not None:
+            f.seek(run_start)
+            chunks.append(f.read(run_end - run_start))
+    return b"".join(chunks)
+
+
+def _load_csv(table_name, uids, start, end, columns):
+    index = load_index(table_name)
+    rows = _select_rows(index, uids, start, end)
+
+    # fetch in file order, return in (uid, time) order
+    file_order = np.argsort(index["offsets"][rows], kind="stable")
+    body = _read_rows(
+        table_path(table_name, "csv"),
+        index["offsets"][rows][file_order],
+        index["lengths"][rows][file_order],
+    )
+    df = pd.read_csv(
+        io.BytesIO(index["header"].tobytes() + body), usecols=columns
+    )
+    df = df.iloc[np.argsort(file_order, kind="stable")].reset_index(drop=True)
+    df["uid"] = df["uid"].astype(str).str.strip()
+    return df
+
+
+def _load_parquet(table_name, uids, start, end, columns):
+    # uid partitions are pruned, the time range is pushed into the reader
+    time_col = TIME_COLUMNS[table_name]
+    filters = []
+    if uids is not None:
+        filters.append(("uid", "in", sorted(set(uids))))
+    if start is not None:
+        filters.append((time_col, ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append((time_col, "<", pd.Timestamp(end)))
+    df = pd.read_parquet(
+        table_path(table_name, "parquet"),
+        columns=columns,
+        filters=filters or None,
+    )
+    df["uid"] = df["uid"].astype(str)
+    return df.sort_values(["uid", time_col], kind="stable").reset_index(drop=True)
+
+
+def load_table(table_name, uids=None, start=None, end=None, columns=None,
+               output_format=None):
+    # rows of a curated table for the given uids with start <= time < end
+    # (either bound optional), sorted by (uid, time); columns projects the
+    # result (uid and the time column are always included). Tables without
+    # a time column are read whole through curate.output.read_table
+    output_format = resolve_format(output_format)
+    if table_name not in TIME_COLUMNS:
+        if start is not None or end is not None:
+            raise ValueError(f"Table '{table_name}' has no time column")
+        return read_table(table_name, uids, output_format, columns)
+
+    time_col = TIME_COLUMNS[table_name]
+    if columns is not None:
+        columns = list(dict.fromkeys(["uid", time_col] + list(columns)))
+
+    if output_format == "csv":
+        df = _load_csv(table_name, uids, start, end, columns)
+    else:
+        df = _load_parquet(table_name, uids, start, end, columns)
+    df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
+    return df if columns is None else df[columns]
+
+
+def load_tables(table_names, **kwargs):
+    # e.g. load_tables(["call_log", "sms"], uids=["u14"], start=..., end=...)
+    return {name: load_table(name, **kwargs) for name in table_names}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the (uid, time) indexes of the curated CSV tables"
+    )
+    parser.add_argument(
+        "--only", help="comma-separated tables to index (default: all)"
+    )
+    args = parser.parse_args(argv)
+    names = args.only.split(",") if args.only else list(TIME_COLUMNS)
+    for name in names:
+        if not os.path.exists(table_path(name, "csv")):
+            print(f"skipping {name}: no curated CSV")
+            continue
+        index = build_index(name)
+        print(f"indexed {name}: {len(index['offsets'])} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+# curate/schema.py
+
+import numpy as np
+import pandas as pd
+
+# raw source columns -> pandas dtype applied at read time, aligned with
+# metadata/data_dictionary.csv. Unix timestamps are read as integers and
+# turned into datetimes by each curator's normalize step; "*" gives the
+# dtype of every column not listed (used by the wide deadlines table).
+SCHEMAS = {
+    "grades": {
+        "uid": "string",
+        "gpa all": "float64",
+        "gpa 13s": "float64",
+        "cs 65": "float64",
+    },
+    "piazza": {
+        "uid": "string",
+        "days online": "Int16",
+        "views": "Int32",
+        "contributions": "Int32",
+        "questions": "Int32",
+        "notes": "Int32",
+        "answers": "Int32",
+    },
+    "deadlines": {
+        "uid": "string",
+        "*": "Int8",
+    },
+    "class": {
+        "uid": "string",
+        "course_index": "Int8",
+        "course_raw": "category",
+    },
+    "calendar": {
+        "id": "string",
+        "device": "category",
+        "timestamp": "Int64",
+        "ACCOUNT_LABEL": "category",
+        "DATE": "string",
+        "TIME": "category",
+    },
+    "dinning": {
+        "DATE": "string",
+        "RESTAURANT": "category",
+        "TYPE": "category",
+    },
+    "sms": {
+        "id": "string",
+        "device": "category",
+        "timestamp": "Int64",
+        "MESSAGES_address": "string",
+        "MESSAGES_body": "string",
+        "MESSAGES_date": "Int64",
+        "MESSAGES_locked": "boolean",
+        "MESSAGES_person": "string",
+        "MESSAGES_protocol": "Int8",
+        "MESSAGES_read": "boolean",
+        "MESSAGES_reply_path_present": "boolean",
+        "MESSAGES_service_center": "category",
+        "MESSAGES_status": "Int16",
+        "MESSAGES_subject": "string",
+        "MESSAGES_thread_id": "Int32",
+        "MESSAGES_type": "Int8",
+    },
+    "call_log": {
+        "id": "string",
+        "device": "category",
+        "timestamp": "Int64",
+        "CALLS__id": "Int64",
+        "CALLS_date": "Int64",
+        "CALLS_duration": "Int32",
+        "CALLS_name": "string",
+        "CALLS_number": "string",
+        "CALLS_numberlabel": "category",
+        "CALLS_numbertype": "category",
+        "CALLS_type": "Int8",
+    },
+    "app_usage": {
+        "id": "string",
+        "device": "category",
+        "timestamp": "Int64",
+        "RUNNING_TASKS_baseActivity_mClass": "category",
+        "RUNNING_TASKS_baseActivity_mPackage": "category",
+        "RUNNING_TASKS_id": "Int64",
+        "RUNNING_TASKS_numActivities": "Int16",
+        "RUNNING_TASKS_numRunning": "Int16",
+        "RUNNING_TASKS_topActivity_mClass": "category",
+        "RUNNING_TASKS_topActivity_mPackage": "category",
+    },
+    "activity": {
+        "timestamp": "Int64",
+        "activity inference": "Int8",
+    },
+    # survey instruments: answers are Likert text, numbers or free text,
+    # so every column is read as a string and scored by curate/survey.py
+    "survey": {
+        "uid": "string",
+        "type": "string",
+        "*": "string",
+    },
+}
+
+BOOLEAN_VALUES = {
+    "1": True, "1.0": True, "true": True,
+    "0": False, "0.0": False, "false": False,
+}
+
+
+def get_schema(table_name):
+    return SCHEMAS[table_name]
+
+
+def column_dtype(schema, column):
+    return schema.get(column.strip(), schema.get("*"))
+
+
+def _is_int(dtype):
+    return isinstance(dtype, str) and dtype.startswith("Int")
+
+
+def _parse_dtype(dtype):
+    # narrow integer types are parsed as Int64 and narrowed afterwards,
+    # because the CSV parser silently wraps values that overflow them
+    return "Int64" if _is_int(dtype) else dtype
+
+
+def _narrow_int(series, dtype):
+    if dtype == "Int64" or series.isna().all():
+        return series.astype(dtype)
+    info = np.iinfo(dtype.lower())
+    if series.min() < info.min or series.max() > info.max:
+        raise OverflowError(f"values out of range for {dtype}")
+    return series.astype(dtype)
+
+
+def convert_column(series, dtype):
+    # strict conversion of one column: raises instead of coercing
+    if dtype in ("string", "category"):
+        return series.astype(dtype)
+    if dtype == "boolean":
+        lowered = series.astype("string").str.strip().str.lower()
+        mapped = lowered.map(BOOLEAN_VALUES)
+        if (mapped.isna() & lowered.notna()).any():
+            raise ValueError("non-boolean values")
+        return mapped.astype("boolean")
+    if _is_int(dtype):
+        return _narrow_int(pd.to_numeric(series).astype("Int64"), dtype)
+    return pd.to_numeric(series).astype(dtype)
+
+
+def new_schema_report():
+    return {
+        "missing_columns": [],
+        "unexpected_columns": [],
+        "mismatched_columns": {},
+    }
+
+
+def check_columns(columns, schema, report):
+    stripped = [c.strip() for c in columns]
+    report["missing_columns"] = [
+        c for c in schema if c != "*" and c not in stripped
+    ]
+    if "*" not in schema:
+        report["unexpected_columns"] = [c for c in stripped if c not in schema]
+
+
+def apply_schema(df, schema, report):
+    # cast an already-loaded frame column by column; columns whose values do
+    # not fit their declared dtype are left untouched and reported
+    for col in df.columns:
+        dtype = column_dtype(schema, col)
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        try:
+            df[col] = convert_column(df[col], dtype)
+        except (ValueError, TypeError, OverflowError) as e:
+            report["mismatched_columns"][col.strip()] = (
+                f"expected {dtype}: {e}"
+            )
+    return df
+
+
+def header_columns(fpath, read_kwargs):
+    # column names as the parser will see them (duplicates mangled)
+    if "names" in read_kwargs:
+        return list(read_kwargs["names"])
+    return list(pd.read_csv(fpath, nrows=0, **read_kwargs).columns)
+
+
+def parse_dtypes(columns, schema):
+    # dtypes handed to the parser for the columns the schema covers
+    return {
+        col: _parse_dtype(column_dtype(schema, col))
+        for col in columns
+        if column_dtype(schema, col) is not None
+    }
+
+
+def read_csv_typed(fpath, schema, read_kwargs=None):
+    # typed read: the C parser gets explicit dtypes, and only when some
+    # column does not fit is the file re-read untyped and cast column by
+    # column, so that the offending columns can be reported
+    read_kwargs = read_kwargs or {}
+    report = new_schema_report()
+
+    columns = header_columns(fpath, read_kwargs)
+    check_columns(columns, schema, report)
+    dtypes = parse_dtypes(columns, schema)
+    try:
+        df = pd.read_csv(fpath, dtype=dtypes, **read_kwargs)
+    except (ValueError, TypeError, OverflowError):
+        df = pd.read_csv(
+            fpath, dtype={col: "string" for col in dtypes}, **read_kwargs
+        )
+    return apply_schema(df, schema, report), report
+
+
+def read_csv_typed_chunks(fpath, schema, chunksize, read_kwargs=None):
+    # streaming variant: chunks are parsed with the schema dtypes until one
+    # does not fit; a typed reader cannot be resumed, so the rest of the
+    # file is then re-read as strings (dropping the rows already yielded)
+    # and cast column by column
+    read_kwargs = read_kwargs or {}
+    report = new_schema_report()
+
+    columns = header_columns(fpath, read_kwargs)
+    check_columns(columns, schema, report)
+    dtypes = parse_dtypes(columns, schema)
+
+    def chunks():
+        done = 0
+        try:
+            for chunk in pd.read_csv(
+                fpath, dtype=dtypes, chunksize=chunksize, **read_kwargs
+            ):
+                chunk = apply_schema(chunk, schema, report)
+                done += len(chunk)
+                yield chunk
+            return
+        except (ValueError, TypeError, OverflowError):
+            pass
+
+        for chunk in pd.read_csv(
+            fpath,
+            dtype={col: "string" for col in dtypes},
+            chunksize=chunksize,
+            **read_kwargs,
+        ):
+            if done >= len(chunk):
+                done -= len(chunk)
+                continue
+            chunk, done = chunk.iloc[done:], 0
+            yield apply_schema(chunk, schema, report)
+
+    return chunks(), report
+
+
+def merge_schema_reports(file_reports):
+    # table-level view: in how many files each column was missing,
+    # unexpected or did not match its dtype
+    merged = {
+        "missing_columns": {},
+        "unexpected_columns": {},
+        "mismatched_columns": {},
+    }
+    for report in file_reports:
+        for key in ("missing_columns", "unexpected_columns", "mismatched_columns"):
+            for col in report.get(key, []):
+                merged[key][col] = merged[key].get(col, 0) + 1
+    return merged
+
+
+def concat_frames(frames):
+    # pd.concat turns categoricals with different categories into plain
+    # strings, so union the categories first to keep the compact dtype
+    frames = list(frames)
+    if len(frames) > 1:
+        for col in frames[0].columns:
+            if not all(
+                col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype)
+                for f in frames
+            ):
+                continue
+            # all-null columns have empty object categories; leave them out
+            # so the union keeps the string dtype of the others
+            parts = [f[col].cat.categories for f in frames]
+            parts = [c for c in parts if len(c)] or parts[:1]
+            categories = parts[0].append(parts[1:]).unique()
+            for f in frames:
+                f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,573 @@
+# curate/shards.py
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from configs.config import PROCESSED_DATA_PATH, PROVENANCE_PATH, QUALITY_SAMPLE_ROWS
+from curate.context import build_context
+from curate.inventory import INVENTORY_FILE, load_inventory
+from curate.output import (
+    concat_csv_files,
+    concat_parquet_datasets,
+    resolve_format,
+    table_path,
+)
+from curate.pipeline import OPTIONAL_TABLES, TABLES
+from curate.step_cache import output_tables
+
+# uid-sharded execution: the students are split into contiguous uid ranges
+# (shards), every shard is curated by a full pipeline run restricted to its
+# uids (SHARD_UID_RANGE) and the shard outputs are merged into the same
+# tables a single run writes. Workers only share a directory:
+#
+#   <shared>/plan.json                  uid ranges, written by 'plan'
+#   <shared>/source_inventory.json      source listing shared by the workers
+#   <shared>/claims/<id>.json           created exclusively by the worker
+#                                       that takes the shard
+#   <shared>/shards/<id>/processed_data, provenance, pipeline.log
+#   <shared>/done/<id>.json, failed/<id>.json
+#
+# so workers can run on any machine that mounts it (and BASE_PATH)
+
+PLAN_VERSION = 1
+PLAN_FILE = "plan.json"
+
+# the pipeline runs as 'python -m curate.pipeline' from the package root
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# stats that are not counts over the shard's rows, and how the shard values
+# combine into the value of a single run; otherwise integers are summed,
+# dicts merged key by key, lists united in order and anything else
+# (floats, strings, settings) must be the same in every shard
+STATS_MERGE = {
+    "grades": {"min_gpa_after": "min", "max_gpa_after": "max"},
+    # every shard reads all the instrument files
+    "survey": {"file_count": "same"},
+    "deadlines": {"num_date_columns": "same"},
+}
+
+
+# --- plan ---
+
+def _write_json(path, data):
+    # written aside and renamed, so other workers never see half a file
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def uid_weights(inventory):
+    # bytes of the per-uid source files of every uid
+    weights = {}
+    for record in inventory.files:
+        if record["uid"] is not None:
+            weights[record["uid"]] = weights.get(record["uid"], 0) + record["size"]
+    return weights
+
+
+def split_uids(weights, shards):
+    # contiguous groups of the sorted uids with about the same bytes each
+    # -> [[uid, ...], ...], at most `shards` groups
+    uids = sorted(weights)
+    shards = max(1, min(int(shards), len(uids)))
+    total = sum(max(w, 1) for w in weights.values())
+    groups = [[]]
+    done = 0
+    for i, uid in enumerate(uids):
+        # a new group starts once the current one has its share of the
+        # bytes, as long as each remaining group can still get a uid
+        if (
+            groups[-1]
+            and len(groups) < shards
+            and (done >= total * len(groups) / shards
+                 or len(uids) - i <= shards - len(groups))
+        ):
+            groups.append([])
+        groups[-1].append(uid)
+        done += max(weights[uid], 1)
+    return [g for g in groups if g]
+
+
+def shard_ranges(groups):
+    # [lo, hi) of every group: the first range is open below and the last
+    # open above, so any uid (even one without source files) is in
+    # exactly one shard
+    firsts = [g[0] for g in groups]
+    return [
+        (None if i == 0 else first, firsts[i + 1] if i + 1 < len(firsts) else None)
+        for i, first in enumerate(firsts)
+    ] or [(None, None)]
+
+
+def plan_shards(shared_dir, shards, force=False):
+    shared_dir = os.path.abspath(shared_dir)
+    plan_path = os.path.join(shared_dir, PLAN_FILE)
+    if os.path.exists(plan_path):
+        if not force:
+            raise FileExistsError(
+                f"{plan_path} exists; merge it or re-plan with --force"
+            )
+        # a new plan starts from scratch
+        for sub in ("claims", "done", "failed", "shards"):
+            shutil.rmtree(os.path.join(shared_dir, sub), ignore_errors=True)
+    for sub in ("claims", "done", "failed", "shards"):
+        os.makedirs(os.path.join(shared_dir, sub), exist_ok=True)
+
+    # the workers validate this inventory instead of each listing the tree
+    inventory = load_inventory(path=os.path.join(shared_dir, INVENTORY_FILE))
+    weights = uid_weights(inventory)
+    groups = split_uids(weights, shards)
+    ranges = shard_ranges(groups)
+    groups = groups or [[]]
+
+    plan = {
+        "version": PLAN_VERSION,
+        "base_path": inventory.base_path,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "shards": [
+            {
+                "id": f"{i:03d}",
+                "uid_range": list(uid_range),
+                "uids": group,
+                "bytes": sum(weights[uid] for uid in group),
+            }
+            for i, (uid_range, group) in enumerate(zip(ranges, groups))
+        ],
+    }
+    _write_json(plan_path, plan)
+    return plan
+
+
+def load_plan(shared_dir):
+    plan_path = os.path.join(shared_dir, PLAN_FILE)
+    if not os.path.exists(plan_path):
+        raise FileNotFoundError(f"No shard plan at {plan_path} (run 'plan' first)")
+    plan = _read_json(plan_path)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"{plan_path} was written by another version")
+    return plan
+
+
+# --- work ---
+
+def shard_dir(shared_dir, shard_id):
+    return os.path.join(shared_dir, "shards", shard_id)
+
+
+def _marker(shared_dir, kind, shard_id):
+    return os.path.join(shared_dir, kind, f"{shard_id}.json")
+
+
+def claim_shard(shared_dir, shard_id):
+    # O_EXCL creation is atomic, also on NFS v3+, so exactly one worker
+    # wins a shard
+    path = _marker(shared_dir, "claims", shard_id)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w") as f:
+        json.dump(
+            {
+                "host": socket.gethostname(),
+                "pid": os.getpid(),
+                "claimed": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            f,
+        )
+    return True
+
+
+def release_failed(shared_dir, plan):
+    # failed shards can be claimed again
+    released = []
+    for shard in plan["shards"]:
+        failed = _marker(shared_dir, "failed", shard["id"])
+        if os.path.exists(failed):
+            os.remove(failed)
+            claim = _marker(shared_dir, "claims", shard["id"])
+            if os.path.exists(claim):
+                os.remove(claim)
+            released.append(shard["id"])
+    return released
+
+
+def shard_env(shared_dir, shard):
+    lo, hi = shard["uid_range"]
+    out = shard_dir(shared_dir, shard["id"])
+    return {
+        "CURATE_SHARD_UID_RANGE": f"{lo or ''}:{hi or ''}",
+        "CURATE_PROCESSED_DATA_PATH": os.path.join(out, "processed_data"),
+        "CURATE_PROVENANCE_PATH": os.path.join(out, "provenance"),
+        "CURATE_INVENTORY_PATH": os.path.join(shared_dir, INVENTORY_FILE),
+    }
+
+
+def run_shard(shared_dir, shard, pipeline_args=()):
+    # one pipeline run in a fresh interpreter, so the shard's paths and
+    # uid range (read by configs/config.py at import) apply everywhere,
+    # pool workers included
+    out = shard_dir(shared_dir, shard["id"])
+    os.makedirs(out, exist_ok=True)
+    start = time.time()
+    with open(os.path.join(out, "pipeline.log"), "w") as log:
+        returncode = subprocess.run(
+            [sys.executable, "-m", "curate.pipeline", *pipeline_args],
+            cwd=PACKAGE_DIR,
+            env={**os.environ, **shard_env(shared_dir, shard)},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        ).returncode
+    record = {
+        "id": shard["id"],
+        "uid_range": shard["uid_range"],
+        "host": socket.gethostname(),
+        "pipeline_args": list(pipeline_args),
+        "returncode": returncode,
+        "seconds": round(time.time() - start, 4),
+        "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    kind = "done" if returncode == 0 else "failed"
+    _write_json(_marker(shared_dir, kind, shard["id"]), record)
+    return record
+
+
+def work(shared_dir, pipeline_args=(), max_shards=None, retry_failed=False):
+    # claim and curate shards of the plan until none is left (or
+    # max_shards were run); -> records of the shards run here
+    shared_dir = os.path.abspath(shared_dir)
+    if "--normalized" in pipeline_args:
+        raise ValueError("--normalized applies to the merge, not to the shard runs")
+    plan = load_plan(shared_dir)
+    if retry_failed:
+        release_failed(shared_dir, plan)
+
+    records = []
+    for shard in plan["shards"]:
+        if max_shards is not None and len(records) >= max_shards:
+            break
+        if not claim_shard(shared_dir, shard["id"]):
+            continue
+        print(f"=== Shard {shard['id']} {shard['uid_range']} ===")
+        record = run_shard(shared_dir, shard, pipeline_args)
+        status = "ok" if record["returncode"] == 0 else "failed"
+        print(f"shard {shard['id']}: {status} ({record['seconds']:.2f}s)")
+        records.append(record)
+    return records
+
+
+# --- merge ---
+
+def merge_stat(values, rule=None, key="", conflicts=None):
+    # the value of a single run from the values of every shard
+    present = [v for v in values if v is not None]
+    if not present:
+        return None
+    first = present[0]
+    if rule is None:
+        if isinstance(first, dict):
+            keys = list(dict.fromkeys(k for v in present for k in v))
+            return {
+                k: merge_stat([v.get(k) for v in present], None, f"{key}.{k}", conflicts)
+                for k in keys
+            }
+        if isinstance(first, list):
+            rule = "union"
+        elif isinstance(first, int) and not isinstance(first, bool):
+            rule = "sum"
+        else:
+            rule = "same"
+
+    if rule == "sum":
+        return sum(present)
+    if rule == "min":
+        return min(present)
+    if rule == "max":
+        return max(present)
+    if rule == "union":
+        merged = []
+        for value in present:
+            merged.extend(x for x in value if x not in merged)
+        return merged
+    if any(v != first for v in present) and conflicts is not None:
+        conflicts.append(key)
+    return first
+
+
+def merge_stats(table_name, shard_stats, conflicts=None):
+    rules = STATS_MERGE.get(table_name, {})
+    keys = list(dict.fromkeys(k for stats in shard_stats for k in stats))
+    return {
+        k: merge_stat(
+            [stats.get(k) for stats in shard_stats],
+            rules.get(k),
+            f"{table_name}.{k}",
+            conflicts,
+        )
+        for k in keys
+    }
+
+
+def merge_validation(table_name, sections, conflicts=None):
+    # row and violation counts add up, rule definitions must agree across
+    # shards and the offending-row samples keep the first QUALITY_SAMPLE_ROWS
+    sections = [s for s in sections if s]
+    if not sections:
+        return None
+    counts = {"rows_checked", "rows_dropped", "violations"}
+    key = f"{table_name}.validation"
+    merged = {
+        k: merge_stat(
+            [s.get(k) for s in sections],
+            "sum" if k in counts else "same",
+            f"{key}.{k}",
+            conflicts,
+        )
+        for k in dict.fromkeys(k for s in sections for k in s)
+        if k != "rules"
+    }
+    merged["rules"] = {}
+    for name in dict.fromkeys(n for s in sections for n in s.get("rules", {})):
+        entries = [s["rules"].get(name) for s in sections if name in s.get("rules", {})]
+        entry = {}
+        for k in dict.fromkeys(k for e in entries for k in e):
+            values = [e.get(k) for e in entries]
+            if k in counts:
+                entry[k] = merge_stat(values, "sum")
+            elif k in ("missing_columns", "samples"):
+                entry[k] = merge_stat(values, "union")
+            else:
+                entry[k] = merge_stat(values, "same", f"{key}.{name}.{k}", conflicts)
+        entry["samples"] = (entry.get("samples") or [])[:QUALITY_SAMPLE_ROWS]
+        merged["rules"][name] = entry
+    return merged
+
+
+def _rewrite_paths(value, replacements):
+    # shard output paths in a provenance record -> the merged output paths
+    if isinstance(value, dict):
+        return {k: _rewrite_paths(v, replacements) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rewrite_paths(v, replacements) for v in value]
+    if isinstance(value, str):
+        for old, new in replacements:
+            if value.startswith(old):
+                return new + value[len(old):]
+    return value
+
+
+def merge_table(table, shards, shared_dir, output_format):
+    # the shard tables in plan (= uid) order; -> merged path, or None when
+    # no shard wrote the table
+    name = os.path.basename(table_path(table, output_format))
+    parts = [
+        os.path.join(shard_dir(shared_dir, s["id"]), "processed_data", name)
+        for s in shards
+    ]
+    parts = [p for p in parts if os.path.exists(p)]
+    if not parts:
+        return None
+    processed_path = table_path(table, output_format)
+    if output_format == "csv":
+        concat_csv_files(parts, processed_path)
+    else:
+        concat_parquet_datasets(parts, processed_path)
+    return processed_path
+
+
+def merge_provenance(table_name, shards, shared_dir, conflicts):
+    records = []
+    for shard in shards:
+        path = os.path.join(
+            shard_dir(shared_dir, shard["id"]), "provenance",
+            f"{table_name}_provenance.json",
+        )
+        if os.path.exists(path):
+            records.append((shard, path, _read_json(path)))
+    if not records:
+        return None
+
+    shard, _, base = records[0]
+    env = shard_env(shared_dir, shard)
+    replacements = [
+        (env["CURATE_PROCESSED_DATA_PATH"], PROCESSED_DATA_PATH),
+        (env["CURATE_PROVENANCE_PATH"], PROVENANCE_PATH),
+    ]
+    # ingestion and timing details stay in the shard records
+    merged = {
+        k: _rewrite_paths(v, replacements)
+        for k, v in base.items()
+        if k not in ("stats", "validation", "ingestion", "performance")
+    }
+    merged["operations"] = list(base.get("operations", [])) + [
+        f"curated in {len(shards)} uid shards (python -m curate.shards), each restricted to the source files and rows of its uid range; shard tables concatenated in uid order and stats combined",
+    ]
+    merged["stats"] = merge_stats(
+        table_name, [r.get("stats", {}) for _, _, r in records], conflicts
+    )
+    if any("validation" in r for _, _, r in records):
+        merged["validation"] = merge_validation(
+            table_name, [r.get("validation") for _, _, r in records], conflicts
+        )
+    merged["shards"] = [
+        {
+            "id": s["id"],
+            "uid_range": s["uid_range"],
+            "provenance": path,
+            "wall_seconds": r.get("performance", {}).get("wall_seconds"),
+        }
+        for s, path, r in records
+    ]
+    with open(f"{PROVENANCE_PATH}/{table_name}_provenance.json", "w") as f:
+        json.dump(merged, f, indent=2)
+    return merged
+
+
+def merge_shards(shared_dir, output_format=None, normalized=False):
+    start = time.time()
+    shared_dir = os.path.abspath(shared_dir)
+    output_format = resolve_format(output_format)
+    plan = load_plan(shared_dir)
+    shards = plan["shards"]
+
+    missing = [
+        s["id"] for s in shards
+        if not os.path.exists(_marker(shared_dir, "done", s["id"]))
+    ]
+    if missing:
+        raise RuntimeError(f"Shards not done yet: {missing}")
+
+    os.makedirs(PROCESSED_DATA_PATH, exist_ok=True)
+    os.makedirs(PROVENANCE_PATH, exist_ok=True)
+
+    merged = {}
+    conflicts = []
+    for name in TABLES:
+        if name in OPTIONAL_TABLES:
+            continue
+        record = merge_provenance(name, shards, shared_dir, conflicts)
+        if record is None:
+            continue
+        tables = [
+            t for t in output_tables(name)
+            if merge_table(t, shards, shared_dir, output_format) is not None
+        ]
+        merged[name] = tables
+        print(f"merged {name}: {', '.join(tables) or '-'}")
+
+    # dimension keys are numbered over the values of all shards
+    if normalized:
+        from curate.dimensions import process_dimensions
+
+        inventory = load_inventory(path=os.path.join(shared_dir, INVENTORY_FILE))
+        process_dimensions(build_context(inventory=inventory))
+        merged["dimensions"] = output_tables("dimensions")
+        print("merged dimensions")
+
+    record = {
+        "shared_dir": shared_dir,
+        "plan": {"created": plan["created"], "shards": len(shards)},
+        "shards": [_read_json(_marker(shared_dir, "done", s["id"])) for s in shards],
+        "tables": merged,
+        "stat_conflicts": conflicts,
+        "seconds": round(time.time() - start, 4),
+    }
+    with open(f"{PROVENANCE_PATH}/shards_merge.json", "w") as f:
+        json.dump(record, f, indent=2)
+    return record
+
+
+def run_local(shared_dir, shards, workers, pipeline_args=(), normalized=False,
+              output_format=None):
+    # plan, `workers` concurrent workers on this machine, merge
+    plan_shards(shared_dir, shards, force=True)
+    workers = max(1, int(workers))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(
+            pool.map(lambda _: work(shared_dir, pipeline_args), range(workers))
+        )
+    failed = [r["id"] for records in results for r in records if r["returncode"]]
+    if failed:
+        raise RuntimeError(
+            f"Shards failed: {failed} (logs in {shared_dir}/shards/<id>/pipeline.log)"
+        )
+    return merge_shards(shared_dir, output_format, normalized)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Curate the dataset in uid shards that share a directory"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("plan", help="split the uids into shards")
+    p.add_argument("--shared-dir", required=True)
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--force", action="store_true", help="replace an existing plan")
+
+    p = sub.add_parser(
+        "work",
+        help="claim and curate shards; other options go to curate.pipeline",
+    )
+    p.add_argument("--shared-dir", required=True)
+    p.add_argument("--max-shards", type=int, default=None)
+    p.add_argument(
+        "--retry-failed", action="store_true",
+        help="claim the shards of failed runs again",
+    )
+
+    p = sub.add_parser("merge", help="combine the shard outputs and provenance")
+    p.add_argument("--shared-dir", required=True)
+    p.add_argument("--normalized", action="store_true")
+
+    p = sub.add_parser(
+        "run",
+        help="plan, run the workers on this machine and merge; other options go to curate.pipeline",
+    )
+    p.add_argument("--shared-dir", required=True)
+    p.add_argument("--shards", type=int, required=True)
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--normalized", action="store_true")
+
+    args, pipeline_args = parser.parse_known_args(argv)
+    if pipeline_args and args.command not in ("work", "run"):
+        parser.error(f"unrecognized arguments: {' '.join(pipeline_args)}")
+
+    if args.command == "plan":
+        plan = plan_shards(args.shared_dir, args.shards, args.force)
+        for shard in plan["shards"]:
+            print(
+                f"shard {shard['id']}: {shard['uid_range']} "
+                f"{len(shard['uids'])} uids, {shard['bytes']} bytes"
+            )
+    elif args.command == "work":
+        records = work(
+            args.shared_dir, pipeline_args, args.max_shards, args.retry_failed
+        )
+        if any(r["returncode"] for r in records):
+            sys.exit(1)
+    elif args.command == "merge":
+        merge_shards(args.shared_dir, normalized=args.normalized)
+    else:
+        run_local(
+            args.shared_dir, args.shards, args.workers, pipeline_args,
+            args.normalized,
+        )
+    print("=== Done ===")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# curate/sorting.py
+
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from configs.config import SORT_MEMORY_BYTES, SORT_SPILL_PATH
+from curate.schema import concat_frames
+
+# runs merged at once; more runs are merged in several passes, so the
+# blocks held during a merge stay within the memory cap
+MERGE_FAN_IN = 16
+
+
+def sort_columns(time_column):
+    # (uid, time) when the table has a time column, uid alone otherwise
+    return ["uid", time_column] if time_column else ["uid"]
+
+
+def _key_values(series):
+    # comparable numpy array for one sort column: missing times and
+    # numbers sort first (as in the range index of curate/query.py),
+    # everything else (uid, categories, text) sorts as strings
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.to_numpy(dtype="datetime64[ns]").view("int64")
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype="float64", na_value=-np.inf)
+    return series.astype("string").fillna("").to_numpy(dtype=str)
+
+
+def sort_keys(df, columns, seq):
+    # key arrays, most significant first; seq (the input position) breaks
+    # ties, so equal keys keep discovery order and the sort is total
+    keys = [
+        _key_values(df[c]) if c in df.columns else np.zeros(len(df))
+        for c in columns
+    ]
+    return keys + [np.asarray(seq, dtype=np.int64)]
+
+
+def _order(keys):
+    # np.lexsort sorts by its last key first
+    return np.lexsort(keys[::-1])
+
+
+def sort_frame(df, columns):
+    # in-memory sort by columns, stable with respect to the input order
+    if df.empty:
+        return df
+    order = _order(sort_keys(df, columns, np.arange(len(df))))
+    return df.take(order).reset_index(drop=True)
+
+
+class _Block:
+    # slice of a sorted run: the rows and their key arrays
+
+    def __init__(self, df, keys):
+        self.df = df
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.df)
+
+    def last(self):
+        return [k[-1] for k in self.keys]
+
+    def count_le(self, bound):
+        # rows <= bound; blocks are sorted, so they form a prefix
+        le = np.zeros(len(self), dtype=bool)
+        eq = np.ones(len(self), dtype=bool)
+        for k, b in zip(self.keys, bound):
+            le |= eq & (k < b)
+            eq &= k == b
+        return int((le | eq).sum())
+
+    def slice(self, start, end=None):
+        return _Block(self.df.iloc[start:end], [k[start:end] for k in self.keys])
+
+
+def _concat_blocks(blocks):
+    df = concat_frames([b.df for b in blocks])
+    keys = [np.concatenate(parts) for parts in zip(*(b.keys for b in blocks))]
+    order = _order(keys)
+    return _Block(df.take(order).reset_index(drop=True), [k[order] for k in keys])
+
+
+class _RunWriter:
+    # a run is a file of pickled sorted blocks, read back one at a time
+
+    def __init__(self, path, block_rows):
+        self.path = path
+        self.block_rows = block_rows
+        self._f = open(path, "wb")
+
+    def write(self, block):
+        for start in range(0, len(block), self.block_rows):
+            part = block.slice(start, start + self.block_rows)
+            pickle.dump(
+                (part.df, part.keys), self._f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+
+    def close(self):
+        self._f.close()
+
+
+def _read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                df, keys = pickle.load(f)
+            except EOFError:
+                return
+            yield _Block(df, keys)
+
+
+def _merge(runs, emit):
+    # k-way merge in batches: every round takes from each run the rows up
+    # to the smallest "last key" of the blocks in memory, which are
+    # exactly the rows that can be placed now, and sorts only those
+    readers = [_read_run(path) for path in runs]
+    heads = [next(r, None) for r in readers]
+    while True:
+        active = [i for i, b in enumerate(heads) if b is not None]
+        if not active:
+            return
+        bound = min((heads[i].last() for i in active), key=tuple)
+        taken = []
+        for i in active:
+            n = heads[i].count_le(bound)
+            if n == 0:
+                continue
+            taken.append(heads[i].slice(0, n))
+            heads[i] = heads[i].slice(n)
+            if len(heads[i]) == 0:
+                heads[i] = next(readers[i], None)
+        emit(_concat_blocks(taken))
+
+
+class ExternalSorter:
+    # out-of-core sort of a stream of frames by columns: frames are
+    # buffered up to memory_bytes, then sorted and spilled as a run to
+    # spill_path; write_to merges the runs into a TableWriter. Without a
+    # spill the buffer is just sorted in memory
+
+    def __init__(self, columns, memory_bytes=None, spill_path=None):
+        self.columns = columns
+        self.memory_bytes = SORT_MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.spill_path = SORT_SPILL_PATH if spill_path is None else spill_path
+        self.block_rows = None
+        self.rows = 0
+        self.merge_passes = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._runs = []
+        self._spill_dir = None
+        self._run_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+
+    def add(self, df):
+        if df.empty:
+            return
+        keys = sort_keys(df, self.columns, np.arange(self.rows, self.rows + len(df)))
+        self.rows += len(df)
+        self._buffer.append(_Block(df.reset_index(drop=True), keys))
+        self._buffer_bytes += int(df.memory_usage(deep=True).sum())
+        if self._buffer_bytes > self.memory_bytes:
+            self._spill()
+
+    def _new_run(self):
+        if self._spill_dir is None:
+            if self.spill_path is not None:
+                os.makedirs(self.spill_path, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="sort-", dir=self.spill_path)
+        path = os.path.join(self._spill_dir, f"run-{self._run_count:05d}.pkl")
+        self._run_count += 1
+        return path
+
+    def _spill(self):
+        block = _concat_blocks(self._buffer)
+        if self.block_rows is None:
+            # blocks small enough that MERGE_FAN_IN of them fit the budget
+            row_bytes = max(1, self._buffer_bytes // max(1, len(block)))
+            self.block_rows = max(1, self.memory_bytes // (2 * MERGE_FAN_IN * row_bytes))
+        run = _RunWriter(self._new_run(), self.block_rows)
+        run.write(block)
+        run.close()
+        self._runs.append(run.path)
+        self._buffer = []
+        self._buffer_bytes = 0
+
+    def write_to(self, writer):
+        if not self._runs:
+            if self._buffer:
+                writer.write(_concat_blocks(self._buffer).df)
+            self._buffer = []
+            return
+        if self._buffer:
+            self._spill()
+
+        # merge passes until one final merge into the writer is left
+        runs = self._runs
+        while len(runs) > MERGE_FAN_IN:
+            merged = []
+            for i in range(0, len(runs), MERGE_FAN_IN):
+                group = runs[i:i + MERGE_FAN_IN]
+                out = _RunWriter(self._new_run(), self.block_rows)
+                _merge(group, out.write)
+                out.close()
+                for path in group:
+                    os.remove(path)
+                merged.append(out.path)
+            runs = merged
+            self.merge_passes += 1
+        # merged batches can be small; they are collected up to half the
+        # budget, so the writer does not get one tiny chunk per round
+        pending = []
+
+        def emit(block):
+            pending.append(block.df)
+            if sum(len(df) for df in pending) >= self.block_rows * MERGE_FAN_IN:
+                writer.write(concat_frames(pending))
+                pending.clear()
+
+        _merge(runs, emit)
+        if pending:
+            writer.write(concat_frames(pending))
+        self.merge_passes += 1
+        self._runs = []
+
+    def report(self):
+        return {
+            "keys": self.columns,
+            "rows": int(self.rows),
+            "memory_bytes": int(self.memory_bytes),
+            "runs": int(self._run_count),
+            "merge_passes": int(self.merge_passes),
+            "mode": "external merge" if self._run_count else "in-memory",
+        }
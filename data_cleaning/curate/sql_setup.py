@@ -0,0 +1,214 @@
+# curate/sql_setup.py
+
+import argparse
+import csv
+import json
+import os
+import re
+
+from configs.config import NORMALIZED_OUTPUT
+from curate.context import build_context
+from curate.events import load_specs
+from curate.output import read_table, table_path
+
+SQL_SETUP_FILE = "postgreSQL_setup.sql"
+SQL_SETUP_NORMALIZED_FILE = "postgreSQL_setup_normalized.sql"
+
+# curated table -> SQL table, where they differ
+SQL_TABLE_NAMES = {
+    "dinning": "dining",
+    "activity_summary_all": "activity_summary",
+}
+
+# SQL types of the tables not defined in configs/event_sources.yaml, by
+# output column ("*": every other column except uid), as in
+# Setup_inspection/postgreSQL_setup.sql
+TABLE_COLUMNS = {
+    "grades": {"*": "FLOAT"},
+    "class": {"course_index": "INT", "course_raw": "VARCHAR(20)"},
+    "activity_summary_all": {"*": "INT"},
+    "piazza": {"*": "INT"},
+    "deadlines": {"date": "DATE", "num_deadlines": "INT"},
+    "survey": {
+        "type": "VARCHAR(10)",
+        "bedtime": "VARCHAR(50)",
+        "time to fall sleep": "FLOAT",
+        "wake up time": "VARCHAR(50)",
+        "hour sleep": "FLOAT",
+        "sleep quality score": "INT",
+    },
+    "survey_scores": {"*": "FLOAT"},
+    "features_daily": {"date": "DATE", "*": "FLOAT"},
+}
+
+# event tables: schema dtype -> SQL type; timestamps are TIMESTAMP and
+# parsed text dates follow their kind
+DTYPE_SQL = {
+    "string": "TEXT",
+    "category": "TEXT",
+    "boolean": "BOOLEAN",
+    "Int8": "SMALLINT",
+    "Int16": "SMALLINT",
+    "Int32": "INT",
+    "Int64": "BIGINT",
+    "Float64": "DOUBLE PRECISION",
+    "float64": "DOUBLE PRECISION",
+}
+DATETIME_SQL = {"date": "DATE", "time": "TIME", "datetime": "TIMESTAMP"}
+
+UID_SQL = "VARCHAR(10) REFERENCES participants(uid)"
+
+# column names that must be quoted in PostgreSQL
+RESERVED_WORDS = {
+    "all", "check", "column", "default", "end", "from", "group", "limit",
+    "offset", "order", "primary", "references", "select", "table", "user",
+    "where",
+}
+
+
+def sql_name(column):
+    # 'gpa all' -> gpa_all, 'CALLS__id' -> calls_id
+    name = re.sub(r"[^0-9a-z]+", "_", column.lower()).strip("_")
+    return f'"{name}"' if name in RESERVED_WORDS else name
+
+
+def event_column_types(spec):
+    # output column -> SQL type, following the steps of normalize_events
+    types = {}
+    for column, dtype in (spec.dtypes() or {}).items():
+        if column != "*":
+            types[spec.renames.get(column, column)] = DTYPE_SQL.get(dtype, "TEXT")
+    for column in spec.timestamps:
+        types[column] = "TIMESTAMP"
+    for options in spec.datetimes.values():
+        types[options["output"]] = DATETIME_SQL[options["kind"]]
+    return types
+
+
+def read_header(path):
+    # columns of a curated CSV in file order; None when it has no rows
+    if not os.path.exists(path):
+        return None
+    with open(path, newline="") as f:
+        header = next(csv.reader(f), None)
+    return header or None
+
+
+def column_sql(column, types, keys):
+    if column == "uid":
+        return UID_SQL
+    if column in keys:
+        dim_table, dim_key = keys[column]
+        return f"INT REFERENCES {dim_table}({dim_key})"
+    return types.get(column, types.get("*", "TEXT"))
+
+
+def load_dimensions(ctx):
+    # layout written by curate/dimensions.py: which event columns became
+    # keys into which dimension table
+    path = ctx.provenance_file("dimensions")
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Normalized SQL setup needs the dimension tables; run "
+            f"python -m curate.dimensions first (no {path})"
+        )
+    with open(path) as f:
+        return json.load(f)["stats"]
+
+
+def sql_setup_path(ctx, normalized):
+    name = SQL_SETUP_NORMALIZED_FILE if normalized else SQL_SETUP_FILE
+    return f"{ctx.processed_data_path}/{name}"
+
+
+def write_sql_setup(ctx=None, normalized=None, path=None):
+    # PostgreSQL script that creates and loads every curated CSV table;
+    # column lists follow the headers of the written files, types the
+    # schemas and specs. Normalized: dimension tables first, and event
+    # tables loaded from <table>_normalized with integer foreign keys
+    if ctx is None:
+        ctx = build_context()
+    if ctx.output_format != "csv":
+        raise ValueError("The SQL setup loads CSV output (OUTPUT_FORMAT = 'csv')")
+    normalized = NORMALIZED_OUTPUT if normalized is None else normalized
+    path = sql_setup_path(ctx, normalized) if path is None else path
+
+    uids = sorted(set(read_table("grades", output_format="csv")["uid"]))
+    processed_dir = os.path.abspath(ctx.processed_data_path).replace(os.sep, "/")
+
+    statements = []
+
+    def add(comment, sql):
+        statements.append(f"-- {len(statements) + 1}. {comment}\n{sql}")
+
+    def add_table(sql_table, file_path, columns):
+        # columns: [(output column, SQL type)]
+        variable = f"{sql_table}_file"
+        body = ",\n".join(f"    {sql_name(c)} {t}" for c, t in columns)
+        add(f"Create {sql_table} table", f"CREATE TABLE {sql_table} (\n{body}\n);\n")
+        add(
+            f"Import {os.path.basename(file_path)}",
+            f"\\set {variable} :processed_data_path '/{os.path.basename(file_path)}'\n"
+            f"\\COPY {sql_table}({', '.join(sql_name(c) for c, _ in columns)})\n"
+            f"FROM :'{variable}' CSV HEADER;\n",
+        )
+
+    values = ",".join(f"('{uid}')" for uid in uids)
+    add("Create participants table", "CREATE TABLE participants (\n    uid VARCHAR(10) PRIMARY KEY\n);\n")
+    add("Insert all uids", f"INSERT INTO participants(uid) VALUES\n{values};\n")
+
+    layout = load_dimensions(ctx) if normalized else {"dimensions": {}, "tables": {}}
+    for dimension, info in layout["dimensions"].items():
+        columns = [(info["key"], "INT PRIMARY KEY"), (dimension, "TEXT")]
+        add_table(info["table"], info["file"], columns)
+
+    specs = load_specs()
+    for table_name in [*TABLE_COLUMNS, *specs]:
+        file_path = table_path(table_name, "csv")
+        types = TABLE_COLUMNS.get(table_name)
+        keys = {}
+        if table_name in specs:
+            types = event_column_types(specs[table_name])
+            normalized_info = layout["tables"].get(table_name)
+            if normalized_info is not None:
+                file_path = normalized_info["processed_file"]
+                for info in normalized_info["columns"].values():
+                    dim = layout["dimensions"][info["dimension"]]
+                    keys[info["key"]] = (dim["table"], dim["key"])
+        header = read_header(file_path)
+        if header is None:
+            continue
+        columns = [(c, column_sql(c, types, keys)) for c in header]
+        add_table(SQL_TABLE_NAMES.get(table_name, table_name), file_path, columns)
+
+    title = "CS598 Dataset: Full Database Setup Script"
+    if normalized:
+        title += " (normalized)"
+    script = (
+        "-- ==========================================\n"
+        f"-- {title}\n"
+        "-- generated by python -m curate.sql_setup from the curated tables\n"
+        "-- ==========================================\n\n"
+        f"\\set processed_data_path '{processed_dir}'\n\n\n"
+        + "\n".join(statements)
+    )
+    with open(path, "w") as f:
+        f.write(script)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write the PostgreSQL setup script for the curated tables"
+    )
+    parser.add_argument(
+        "--normalized", action="store_true", default=None,
+        help="load the dimension tables and <table>_normalized event tables (default: NORMALIZED_OUTPUT)",
+    )
+    parser.add_argument("--output", default=None, help="script path")
+    args = parser.parse_args(argv)
+    print(write_sql_setup(normalized=args.normalized, path=args.output))
+
+
+if __name__ == "__main__":
+    main()
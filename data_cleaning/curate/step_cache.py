@@ -0,0 +1,372 @@
+# curate/step_cache.py
+
+import ast
+import hashlib
+import json
+import os
+import shutil
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import configs.config as config
+from curate.events import load_specs
+from curate.incremental import fingerprint_file
+from curate.output import table_path
+from curate.validation import describe_rules
+
+STEP_CACHE_VERSION = 1
+
+# table -> (source path under BASE_PATH, glob pattern for folders); tables
+# not listed here are never cached
+STEP_SOURCES = {
+    "grades": ("education/grades.csv", None),
+    "piazza": ("education/piazza.csv", None),
+    "class": ("education/class.csv", None),
+    "deadlines": ("education/deadlines.csv", None),
+    "calendar": ("calendar/", "*.csv"),
+    "dinning": ("dinning/", "*.txt"),
+    "sms": ("sms/", "*.csv"),
+    "call_log": ("call_log/", "*.csv"),
+    "app_usage": ("app_usage/", "*.csv"),
+    "activity": ("sensing/activity/", "*.csv"),
+    "activity_summary": ("sensing/activity/", "*.csv"),
+    "survey": ("survey/", "*.csv"),
+    # built from curated tables only (their upstream outputs)
+    "features_daily": (None, None),
+    "dimensions": (None, None),
+}
+
+# event tables defined only in configs/event_sources.yaml
+for _name, _spec in load_specs().items():
+    STEP_SOURCES.setdefault(_name, (_spec.folder, _spec.glob))
+
+# curated tables written by a step, when not just the table itself
+STEP_OUTPUTS = {
+    "activity_summary": ["activity_summary_all", "activity_hourly", "activity_daily"],
+    "survey": ["survey", "survey_scores"],
+}
+
+# normalized event tables of the 'dimensions' step
+STEP_OUTPUTS["dimensions"] = [
+    f"{name}_normalized" for name, spec in load_specs().items() if spec.dimensions
+]
+
+# state next to the provenance file that must match the restored output
+STEP_STATE_FILES = {
+    "features_daily": ["features_manifest.json"],
+}
+
+# other files in PROCESSED_DATA_PATH written by a step (dimension tables
+# are CSV in every output format)
+STEP_DATA_FILES = {
+    "dimensions": [
+        *dict.fromkeys(
+            f"dim_{d}.csv"
+            for spec in load_specs().values()
+            for d in spec.dimensions.values()
+        ),
+        "postgreSQL_setup_normalized.sql",
+    ],
+}
+
+# config values that change how a run is executed, not what it produces
+STEP_CACHE_IGNORED_CONFIG = {
+    "DEDUP_MEMORY_BYTES",
+    "DEDUP_SPILL_PATH",
+    "DISCOVERY_WORKERS",
+    "INGEST_WORKERS",
+    "INVENTORY_PATH",
+    "INVENTORY_VALIDATE",
+    "PIPELINE_JOBS",
+    "PROFILE",
+    "PROFILER",
+    "READ_BLOCK_BYTES",
+    "READ_ENGINE",
+    "READ_THREADS",
+    "SORT_MEMORY_BYTES",
+    "SORT_SPILL_PATH",
+    "STEP_CACHE",
+    "STEP_CACHE_PATH",
+    "STEP_CACHE_MAX_BYTES",
+}
+
+# run options that do not change the output
+STEP_CACHE_IGNORED_KWARGS = {"ctx", "workers", "read_engine"}
+
+
+def is_cacheable(table_name):
+    return table_name in STEP_SOURCES
+
+
+def _hash_json(obj):
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+# --- fingerprint parts ---
+
+def _module_file(module_name):
+    # curate.sms -> <data_cleaning>/curate/sms.py
+    root = Path(__file__).resolve().parent.parent
+    return root.joinpath(*module_name.split(".")).with_suffix(".py")
+
+
+def code_hashes(module_name):
+    # the curator's module and every curate module it imports, transitively
+    hashes = {}
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in hashes:
+            continue
+        path = _module_file(name)
+        source = path.read_bytes()
+        hashes[name] = hashlib.sha256(source).hexdigest()
+        for node in ast.walk(ast.parse(source)):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                imported = [node.module]
+            elif isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            else:
+                continue
+            pending.extend(
+                m for m in imported
+                if m.startswith("curate.") and _module_file(m).exists()
+            )
+    return dict(sorted(hashes.items()))
+
+
+def config_values():
+    return {
+        k: v for k, v in sorted(vars(config).items())
+        if k.isupper() and k not in STEP_CACHE_IGNORED_CONFIG
+    }
+
+
+def _fingerprint_paths(paths, stat_cache):
+    # {path: sha256}; files are only re-hashed when size or mtime changed
+    hashes = {}
+    for path in paths:
+        path = Path(path)
+        files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+        for f in files:
+            if not f.exists():
+                hashes[str(f)] = None
+                continue
+            key = str(f)
+            stat_cache[key] = fingerprint_file(f, stat_cache.get(key))
+            hashes[key] = stat_cache[key]["sha256"]
+    return hashes
+
+
+def event_spec(table_name):
+    spec = load_specs().get(table_name)
+    return None if spec is None else asdict(spec)
+
+
+def source_paths(table_name, ctx=None):
+    relative, pattern = STEP_SOURCES[table_name]
+    if relative is None:
+        return []
+    source = Path(f"{config.BASE_PATH}/{relative}")
+    if pattern is None:
+        return [source]
+    # the run's source inventory when there is one (grades runs before it)
+    if ctx is not None and ctx.inventory is not None:
+        return ctx.inventory.discover(relative, pattern, config.BASE_PATH)
+    return sorted(source.rglob(pattern))
+
+
+def output_tables(table_name):
+    return STEP_OUTPUTS.get(table_name, [table_name])
+
+
+def output_files(table_name):
+    # (kind, name) of everything a step leaves behind
+    files = [("table", name) for name in output_tables(table_name)]
+    files.append(("provenance", f"{table_name}_provenance.json"))
+    files.extend(("provenance", name) for name in STEP_STATE_FILES.get(table_name, []))
+    files.extend(("data", name) for name in STEP_DATA_FILES.get(table_name, []))
+    return files
+
+
+def _destination(kind, name):
+    if kind == "table":
+        return table_path(name)
+    if kind == "data":
+        return f"{config.PROCESSED_DATA_PATH}/{name}"
+    return f"{config.PROVENANCE_PATH}/{name}"
+
+
+def _path_size(path):
+    path = Path(path)
+    if path.is_dir():
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+    return path.stat().st_size
+
+
+# --- the cache ---
+
+class StepCache:
+    # content-addressed snapshot of one pipeline step: the key covers the
+    # curator's code, the config, the run options, the source files and
+    # the outputs of its upstream tables, so a changed grades table
+    # invalidates every table that depends on it
+
+    def __init__(self, table_name, module_name, upstream, kwargs):
+        self.table_name = table_name
+        self.cache_path = config.STEP_CACHE_PATH
+        self.stat_cache_path = f"{self.cache_path}/hashes/{table_name}.json"
+
+        stat_cache = {}
+        if os.path.exists(self.stat_cache_path):
+            with open(self.stat_cache_path) as f:
+                stat_cache = json.load(f)
+
+        # every curator filters on the valid uids taken from grades
+        if table_name != "grades" and "grades" not in upstream:
+            upstream = ["grades", *upstream]
+        upstream_paths = [
+            table_path(t) for dep in upstream for t in output_tables(dep)
+        ]
+        self.parts = {
+            "version": STEP_CACHE_VERSION,
+            "table": table_name,
+            "code": code_hashes(module_name),
+            "config": config_values(),
+            "options": {
+                k: v for k, v in sorted(kwargs.items())
+                if k not in STEP_CACHE_IGNORED_KWARGS
+            },
+            # the table's entry of configs/event_sources.yaml, if any
+            "event_spec": event_spec(table_name),
+            # its rules of configs/quality_rules.yaml
+            "quality_rules": describe_rules(table_name),
+            "sources": _fingerprint_paths(
+                source_paths(table_name, kwargs.get("ctx")), stat_cache
+            ),
+            "upstream": _fingerprint_paths(upstream_paths, stat_cache),
+        }
+        self.key = _hash_json(self.parts)
+        self.entry_path = f"{self.cache_path}/{table_name}-{self.key[:24]}"
+
+        os.makedirs(os.path.dirname(self.stat_cache_path), exist_ok=True)
+        with open(self.stat_cache_path, "w") as f:
+            json.dump(stat_cache, f)
+
+    def _load_entry(self):
+        path = f"{self.entry_path}/entry.json"
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            entry = json.load(f)
+        return entry if entry.get("key") == self.key else None
+
+    def restore(self):
+        # -> True when the step's outputs were put back from the cache
+        entry = self._load_entry()
+        if entry is None:
+            return False
+
+        for item in entry["files"]:
+            stored = f"{self.entry_path}/{item['stored']}"
+            dest = _destination(item["kind"], item["name"])
+            # identical files are left alone, so their mtime does not move
+            if os.path.isfile(dest) and os.path.isfile(stored):
+                if fingerprint_file(dest)["sha256"] == item["sha256"]:
+                    continue
+            if os.path.isdir(dest):
+                shutil.rmtree(dest)
+            elif os.path.exists(dest):
+                os.remove(dest)
+            os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+            if os.path.isdir(stored):
+                shutil.copytree(stored, dest)
+            else:
+                shutil.copyfile(stored, dest)
+
+        entry["last_used"] = time.time()
+        entry["hits"] = entry.get("hits", 0) + 1
+        with open(f"{self.entry_path}/entry.json", "w") as f:
+            json.dump(entry, f, indent=2)
+        return True
+
+    def store(self):
+        if self._load_entry() is not None:
+            return
+
+        tmp_path = f"{self.entry_path}.tmp-{os.getpid()}"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+
+        files = []
+        for i, (kind, name) in enumerate(output_files(self.table_name)):
+            src = _destination(kind, name)
+            if not os.path.exists(src):
+                # optional outputs (e.g. rollups that were not enabled)
+                continue
+            stored = f"{i:02d}-{os.path.basename(src)}"
+            if os.path.isdir(src):
+                shutil.copytree(src, f"{tmp_path}/{stored}")
+                sha256 = None
+            else:
+                shutil.copyfile(src, f"{tmp_path}/{stored}")
+                sha256 = fingerprint_file(src)["sha256"]
+            files.append(
+                {"kind": kind, "name": name, "stored": stored, "sha256": sha256}
+            )
+
+        size = _path_size(tmp_path)
+        if size > config.STEP_CACHE_MAX_BYTES:
+            # would evict everything else and still not fit
+            shutil.rmtree(tmp_path)
+            return
+
+        now = time.time()
+        entry = {
+            "key": self.key,
+            "table": self.table_name,
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+            "bytes": size,
+            "files": files,
+            "fingerprint": self.parts,
+        }
+        with open(f"{tmp_path}/entry.json", "w") as f:
+            json.dump(entry, f, indent=2)
+        try:
+            os.replace(tmp_path, self.entry_path)
+        except OSError:
+            # stored concurrently by another run
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+
+        evict(self.cache_path, config.STEP_CACHE_MAX_BYTES, keep=self.entry_path)
+
+
+def evict(cache_path, max_bytes, keep=None):
+    # least recently used entries go first until the cache fits max_bytes
+    entries = []
+    for path in Path(cache_path).glob("*/entry.json"):
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        entries.append((entry["last_used"], entry["bytes"], str(path.parent)))
+
+    total = sum(size for _, size, _ in entries)
+    evicted = []
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted.append(path)
+    return evicted
@@ -0,0 +1,605 @@
+# curate/survey.py
+
+import json
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+from configs.config import INGEST_WORKERS, SURVEY_MIN_ANSWERED
+from curate.context import build_context, shard_rows
+from curate.datetimes import parse_times
+from curate.output import write_table
+from curate.performance import (
+    StageTimer,
+    merge_stage_seconds,
+    peak_rss_mb,
+    worker_peak_rss_mb,
+)
+from curate.schema import get_schema, read_csv_typed
+from curate.validation import table_rules, validate_frame, validation_section
+
+SURVEY_FOLDER = "survey"
+SURVEY_TYPES = ["pre", "post"]
+
+# Likert text -> item score; responses are matched lower-cased and stripped
+RESPONSES = {
+    "agreement": {
+        "disagree strongly": 1,
+        "disagree a little": 2,
+        "neither agree nor disagree": 3,
+        "agree a little": 4,
+        "agree strongly": 5,
+    },
+    # the last PHQ-9 question (how difficult the problems made things) is
+    # scored as well, but is not part of the total
+    "phq9": {
+        "not at all": 0,
+        "several days": 1,
+        "more than half the days": 2,
+        "nearly every day": 3,
+        "not difficult at all": 0,
+        "somewhat difficult": 1,
+        "very difficult": 2,
+        "extremely difficult": 3,
+    },
+    "pss": {
+        "never": 0,
+        "almost never": 1,
+        "sometime": 2,
+        "sometimes": 2,
+        "fairly often": 3,
+        "very often": 4,
+    },
+    "loneliness": {
+        "never": 1,
+        "rarely": 2,
+        "sometimes": 3,
+        "often": 4,
+        "always": 4,
+    },
+    # frequency, sleep quality and "problem" answers of the PSQI items
+    "psqi": {
+        "not during the past month": 0,
+        "less than once a week": 1,
+        "once or twice a week": 2,
+        "three or more times a week": 3,
+        "very good": 0,
+        "fairly good": 1,
+        "fairly bad": 2,
+        "very bad": 3,
+        "no problem at all": 0,
+        "only a very slight problem": 1,
+        "somewhat of a problem": 2,
+        "a very big problem": 3,
+    },
+}
+
+# instrument -> (file under BASE_PATH/survey/, response set); None: the
+# items are answered with numbers
+INSTRUMENTS = {
+    "bigfive": ("BigFive.csv", "agreement"),
+    "phq9": ("PHQ-9.csv", "phq9"),
+    "psqi": ("psqi.csv", "psqi"),
+    "flourishing": ("FlourishingScale.csv", None),
+    "pss": ("PerceivedStressScale.csv", "pss"),
+    "vr12": ("vr_12.csv", None),
+    "loneliness": ("LonelinessScale.csv", "loneliness"),
+    "panas": ("panas.csv", None),
+}
+
+# scale -> (instrument, items, reverse-scored items); items are 1-based
+# positions among the question columns (everything but uid and type) or
+# header names. VR-12 has no entry: its PCS/MCS summaries need the published
+# regression weights, so it is only ingested and counted
+SCALES = {
+    "bigfive_extraversion": (
+        "bigfive", [1, 6, 11, 16, 21, 26, 31, 36], [6, 21, 31],
+    ),
+    "bigfive_agreeableness": (
+        "bigfive", [2, 7, 12, 17, 22, 27, 32, 37, 42], [2, 12, 27, 37],
+    ),
+    "bigfive_conscientiousness": (
+        "bigfive", [3, 8, 13, 18, 23, 28, 33, 38, 43], [8, 18, 23, 43],
+    ),
+    "bigfive_neuroticism": (
+        "bigfive", [4, 9, 14, 19, 24, 29, 34, 39], [9, 24, 34],
+    ),
+    "bigfive_openness": (
+        "bigfive", [5, 10, 15, 20, 25, 30, 35, 40, 41, 44], [35, 41],
+    ),
+    "phq9": ("phq9", list(range(1, 10)), []),
+    "flourishing": ("flourishing", list(range(1, 9)), []),
+    "pss": ("pss", list(range(1, 11)), [4, 5, 7, 8]),
+    "loneliness": (
+        "loneliness", list(range(1, 21)), [1, 5, 6, 9, 10, 15, 16, 19, 20],
+    ),
+    "panas_positive": (
+        "panas",
+        ["Interested", "Strong", "Enthusiastic", "Proud", "Alert",
+         "Inspired", "Determined", "Attentive", "Active"],
+        [],
+    ),
+    "panas_negative": (
+        "panas",
+        ["Distressed", "Upset", "Guilty", "Scared", "Hostile", "Irritable",
+         "Nervous", "Jittery", "Afraid"],
+        [],
+    ),
+    # global score (0-21) from the seven PSQI components, see _psqi
+    "psqi": ("psqi", None, []),
+}
+
+# PSQI question -> keyword of its header (matched case-insensitively); the
+# disturbance items 5b-5j are found by their "b." ... "j." prefix
+PSQI_QUESTIONS = {
+    "bedtime": "gone to bed",
+    "latency_minutes": "to fall asleep",
+    "wake_time": "gotten up",
+    "sleep_hours": "hours of actual sleep",
+    "cannot_sleep_30min": "within 30 minutes",
+    "quality": "sleep quality",
+    "medication": "medicine",
+    "staying_awake": "staying awake",
+    "enthusiasm": "enthusiasm",
+}
+PSQI_DISTURBANCE_PATTERN = re.compile(r"^[b-j]\.\s")
+# answered in free text; parsed by _psqi instead of the response lookup
+PSQI_FREE_TEXT = ["bedtime", "latency_minutes", "wake_time", "sleep_hours"]
+
+# the sleep questionnaire table loaded into the `survey` SQL table
+SLEEP_COLUMNS = [
+    "uid",
+    "type",
+    "bedtime",
+    "time to fall sleep",
+    "wake up time",
+    "hour sleep",
+    "sleep quality score",
+]
+
+# distinct unmapped responses listed per instrument in provenance
+MAX_UNMAPPED_EXAMPLES = 20
+
+
+def score_responses(df, columns, responses):
+    # every answer cell of the instrument is factorized at once, so each
+    # distinct response string is looked up once and its score broadcast
+    # back to a (rows x items) float matrix; unknown answers become NaN
+    cells = df[columns].to_numpy(dtype=object).ravel()
+    codes, uniques = pd.factorize(cells)
+    text = pd.Series(uniques, dtype="string").str.strip()
+    if responses is None:
+        values = pd.to_numeric(text, errors="coerce")
+    else:
+        values = text.str.lower().map(responses)
+    values = values.to_numpy(dtype=float, na_value=np.nan)
+
+    scores = np.full(len(cells), np.nan)
+    answered = codes >= 0
+    scores[answered] = values[codes[answered]]
+    scores = scores.reshape(len(df), len(columns))
+
+    # rows per unique answer, to report what could not be scored
+    rows_per_value = np.bincount(codes[answered], minlength=len(uniques))
+    blank = (text == "").to_numpy(dtype=bool, na_value=True)
+    unmapped = np.isnan(values) & ~blank
+    report = {
+        "cells": int(len(cells)),
+        "missing_cells": int((~answered).sum() + rows_per_value[blank].sum()),
+        "unmapped_cells": int(rows_per_value[unmapped].sum()),
+        "unmapped_responses": {
+            str(text[i]): int(rows_per_value[i])
+            for i in np.flatnonzero(unmapped)[
+                np.argsort(-rows_per_value[unmapped], kind="stable")
+            ][:MAX_UNMAPPED_EXAMPLES]
+        },
+    }
+    return scores, report
+
+
+def scale_total(items, reverse, low, high, min_answered=None):
+    # sum of the item scores; reverse-scored items are flipped within the
+    # response range and missing items are prorated from the answered ones,
+    # as long as at least min_answered of them were answered
+    min_answered = SURVEY_MIN_ANSWERED if min_answered is None else min_answered
+    items = items.copy()
+    if reverse.any():
+        items[:, reverse] = low + high - items[:, reverse]
+    n = items.shape[1]
+    answered = (~np.isnan(items)).sum(axis=1)
+    total = np.nansum(items, axis=1) * n / np.maximum(answered, 1)
+    return np.where(answered >= math.ceil(min_answered * n), total, np.nan)
+
+
+def _item_columns(questions, items):
+    # -> (columns, items not found in this file)
+    by_name = {q.strip().lower(): q for q in questions}
+    columns, missing = [], []
+    for item in items:
+        if isinstance(item, int):
+            column = questions[item - 1] if item <= len(questions) else None
+        else:
+            column = by_name.get(item.strip().lower())
+        if column is None:
+            missing.append(item)
+        else:
+            columns.append(column)
+    return columns, missing
+
+
+def _find_question(questions, keyword):
+    for q in questions:
+        if keyword in q.lower():
+            return q
+    return None
+
+
+def parse_amount(series, unit):
+    # free-text durations ("10 mins", "about 7-8hours", "6:00") -> minutes
+    # or hours: the first number, or the midpoint of a range, converted when
+    # the answer names the other unit
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype="string").str.lower()
+    numbers = text.str.extract(
+        r"(\d+(?:\.\d+)?)(?:\s*(?:-|to)\s*(\d+(?:\.\d+)?))?"
+    ).astype(float)
+    amount = numbers[0].where(numbers[1].isna(), (numbers[0] + numbers[1]) / 2)
+    if unit == "minutes":
+        amount = amount.where(~text.str.contains("hour", na=False), amount * 60)
+    else:
+        in_minutes = text.str.contains("min", na=False) & ~text.str.contains(
+            "hour", na=False
+        )
+        amount = amount.where(~in_minutes, amount / 60)
+    values = amount.to_numpy(dtype=float, na_value=np.nan)
+    return pd.Series(
+        np.where(codes >= 0, values[codes], np.nan), index=series.index
+    )
+
+
+def clock_text(series):
+    # the clock time inside a free-text answer ("around 1 am" -> "1AM"),
+    # in a form the TIME_FORMATS of curate/datetimes.py parse
+    clock = series.str.lower().str.extract(
+        r"(\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?)", expand=False
+    )
+    return clock.str.replace(r"[\s.]", "", regex=True).str.upper()
+
+
+def _clock_hours(times):
+    # "HH:MM:SS" strings from parse_times -> hours after midnight
+    return pd.to_timedelta(times).dt.total_seconds() / 3600
+
+
+def _banded(values, edges):
+    # component score 0-3: the number of band edges the value exceeds
+    banded = np.searchsorted(edges, values, side="left").astype(float)
+    return np.where(np.isnan(values), np.nan, banded)
+
+
+def _psqi(df, questions, scores, position):
+    # -> (global PSQI score per row, sleep table, report); the global score
+    # is the sum of the seven component scores (Buysse et al., 1989) and is
+    # missing when any component is
+    found = {
+        key: _find_question(questions, keyword)
+        for key, keyword in PSQI_QUESTIONS.items()
+    }
+    disturbances = [q for q in questions if PSQI_DISTURBANCE_PATTERN.match(q)]
+    missing = sorted(k for k, q in found.items() if q is None)
+
+    def item(key):
+        if found[key] is None:
+            return np.full(len(df), np.nan)
+        return scores[:, position[found[key]]]
+
+    def text(key):
+        if found[key] is None:
+            return pd.Series(pd.NA, index=df.index, dtype="string")
+        return df[found[key]].str.strip()
+
+    latency = parse_amount(text("latency_minutes"), "minutes").to_numpy()
+    hours = parse_amount(text("sleep_hours"), "hours").to_numpy()
+
+    # time in bed from the two clock times; answers without AM/PM (bed at
+    # "11:30") are read on the 12-hour clock that gives a night under 12h
+    bedtime, bed_report = parse_times(
+        clock_text(text("bedtime")), source="survey.bedtime"
+    )
+    wake, wake_report = parse_times(
+        clock_text(text("wake_time")), source="survey.wake_time"
+    )
+    in_bed = ((_clock_hours(wake) - _clock_hours(bedtime)) % 24).to_numpy(
+        dtype=float, na_value=np.nan
+    )
+    in_bed = np.where(in_bed > 12, in_bed - 12, in_bed)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efficiency = np.where(in_bed > 0, hours / in_bed * 100, np.nan)
+
+    # unanswered disturbance items count as "not during the past month"
+    disturbance_sum = np.full(len(df), np.nan)
+    if disturbances:
+        answers = scores[:, [position[q] for q in disturbances]]
+        answered = (~np.isnan(answers)).any(axis=1)
+        disturbance_sum[answered] = np.nansum(answers[answered], axis=1)
+
+    components = np.column_stack(
+        [
+            item("quality"),
+            _banded(_banded(latency, [15, 30, 60]) + item("cannot_sleep_30min"),
+                    [0, 2, 4]),
+            np.select(
+                [hours > 7, hours >= 6, hours >= 5, hours < 5],
+                [0, 1, 2, 3],
+                np.nan,
+            ),
+            np.select(
+                [efficiency >= 85, efficiency >= 75, efficiency >= 65,
+                 efficiency < 65],
+                [0, 1, 2, 3],
+                np.nan,
+            ),
+            _banded(disturbance_sum, [0, 9, 18]),
+            item("medication"),
+            _banded(item("staying_awake") + item("enthusiasm"), [0, 2, 4]),
+        ]
+    )
+    total = components.sum(axis=1)
+
+    sleep_df = pd.DataFrame(
+        {
+            "uid": df["uid"].to_numpy(),
+            "type": df["type"].to_numpy(),
+            "bedtime": text("bedtime").to_numpy(),
+            "time to fall sleep": latency,
+            "wake up time": text("wake_time").to_numpy(),
+            "hour sleep": hours,
+            # 1 = very bad ... 4 = very good
+            "sleep quality score": pd.array(4 - item("quality"), dtype="Int8"),
+        }
+    )
+    report = {
+        "missing_questions": missing,
+        "disturbance_items": len(disturbances),
+        "incomplete_global_scores": int(np.isnan(total).sum()),
+        "datetime_parsing": {"bedtime": bed_report, "wake_time": wake_report},
+    }
+    return total, sleep_df, report
+
+
+def _score_instrument(name, fpath, min_answered, uid_range=None):
+    start = time.perf_counter()
+    _, response_set = INSTRUMENTS[name]
+
+    df, schema_report = read_csv_typed(fpath, get_schema("survey"))
+    read_end = time.perf_counter()
+    df.columns = df.columns.str.strip()
+    df["uid"] = df["uid"].str.strip()
+    df["type"] = df["type"].str.strip().str.lower()
+    # a uid-sharded run scores the answers of its shard
+    df = shard_rows(df, uid_range)
+
+    # one answer per (uid, pre/post)
+    rows_read = len(df)
+    valid_type = df["type"].isin(SURVEY_TYPES).to_numpy(dtype=bool, na_value=False)
+    df = df[valid_type & df["uid"].notna().to_numpy()]
+    duplicated = df.duplicated(["uid", "type"], keep="first")
+    df = df[~duplicated].reset_index(drop=True)
+
+    questions = [c for c in df.columns if c not in ("uid", "type")]
+    free_text = []
+    if name == "psqi":
+        free_text = [
+            _find_question(questions, PSQI_QUESTIONS[key]) for key in PSQI_FREE_TEXT
+        ]
+    scored = [q for q in questions if q not in free_text]
+    # instruments without a scale (VR-12) are only counted
+    if not any(instrument == name for instrument, _, _ in SCALES.values()):
+        scored = []
+    responses = RESPONSES[response_set] if response_set is not None else None
+    scores, response_report = score_responses(df, scored, responses)
+    # response range, for reverse-scored items
+    low = high = None
+    if responses is not None:
+        low, high = min(responses.values()), max(responses.values())
+
+    totals = pd.DataFrame({"uid": df["uid"], "type": df["type"]})
+    missing_items = {}
+    sleep_df = None
+    psqi_report = None
+    position = {q: i for i, q in enumerate(scored)}
+    for scale, (instrument, items, reverse) in SCALES.items():
+        if instrument != name:
+            continue
+        if items is None:
+            totals[scale], sleep_df, psqi_report = _psqi(
+                df, questions, scores, position
+            )
+            continue
+        columns, missing = _item_columns(scored, items)
+        if missing:
+            missing_items[scale] = missing
+            totals[scale] = np.nan
+            continue
+        idx = [position[c] for c in columns]
+        flip = np.isin(items, reverse)
+        totals[scale] = scale_total(
+            scores[:, idx], flip, low, high, min_answered
+        ).round(2)
+    end = time.perf_counter()
+
+    stats = {
+        "instrument": name,
+        "file": str(fpath),
+        "rows_read": int(rows_read),
+        "rows_kept": int(len(df)),
+        "invalid_type_rows": int((~valid_type).sum()),
+        "duplicate_rows": int(duplicated.sum()),
+        "questions": len(questions),
+        "scales": [s for s in totals.columns if s not in ("uid", "type")],
+        "missing_items": missing_items,
+        "responses": response_report,
+        "seconds": round(end - start, 4),
+        "bytes_read": os.path.getsize(fpath),
+        "stages": {"read_csv": read_end - start, "score": end - read_end},
+        "schema": schema_report,
+    }
+    if psqi_report is not None:
+        stats["psqi"] = psqi_report
+    return {
+        "totals": totals,
+        "sleep": sleep_df,
+        "stats": stats,
+        # of the process that scored the file (a pool worker when workers > 1)
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def process_survey(ctx=None, workers=None):
+    # shared run state (config paths, valid uids); built here when the
+    # curator runs standalone
+    if ctx is None:
+        ctx = build_context()
+
+    table_name = "survey"
+    source_folder = ctx.source_path(SURVEY_FOLDER)
+    processed_path = ctx.table_path(table_name)
+    scores_path = ctx.table_path("survey_scores")
+    provenance_path = ctx.provenance_file(table_name)
+
+    perf = StageTimer(table_name, ctx.provenance_path)
+
+    # --- discover instrument files ---
+    files = {
+        name: f"{source_folder}/{fname}" for name, (fname, _) in INSTRUMENTS.items()
+    }
+    missing_files = sorted(
+        n for n, (fname, _) in INSTRUMENTS.items()
+        if not ctx.source_exists(f"{SURVEY_FOLDER}/{fname}")
+    )
+    files = {n: p for n, p in files.items() if n not in missing_files}
+    if not files:
+        raise FileNotFoundError(f"No survey instruments found in {source_folder}")
+    perf.checkpoint("discover")
+
+    # --- read and score every instrument, in a process pool ---
+    workers = INGEST_WORKERS if workers is None else workers
+    workers = max(1, min(int(workers), len(files)))
+    args = (
+        list(files), list(files.values()), repeat(SURVEY_MIN_ANSWERED),
+        repeat(ctx.uid_range),
+    )
+    if workers == 1:
+        results = list(map(_score_instrument, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_score_instrument, *args))
+    file_stats = [r["stats"] for r in results]
+    perf.add_ingest_report(
+        {
+            "bytes_read": sum(s["bytes_read"] for s in file_stats),
+            "stages": merge_stage_seconds(s["stages"] for s in file_stats),
+            "worker_peak_rss_mb": worker_peak_rss_mb(
+                (r["peak_rss_mb"] for r in results), workers
+            ),
+        }
+    )
+    perf.checkpoint("ingest")
+
+    # --- one row per uid: <scale>_pre / <scale>_post ---
+    combined = pd.concat(
+        [r["totals"].set_index(["uid", "type"]) for r in results], axis=1
+    )
+    wide = combined.unstack("type")
+    columns = [
+        (scale, t) for scale in SCALES if scale in combined.columns
+        for t in SURVEY_TYPES
+    ]
+    wide = wide.reindex(columns=pd.MultiIndex.from_tuples(columns))
+    wide.columns = [f"{scale}_{t}" for scale, t in columns]
+    wide = wide.reset_index()
+
+    # survey answers do not depend on grades: every participant is kept,
+    # as in the survey table loaded by postgreSQL_setup.sql
+    scores_df = wide.sort_values("uid")
+
+    # --- sleep questionnaire table (psqi answers) ---
+    sleep = [r["sleep"] for r in results if r["sleep"] is not None]
+    if sleep:
+        sleep_df = sleep[0]
+    else:
+        sleep_df = pd.DataFrame(columns=SLEEP_COLUMNS)
+    # plausible sleep answers (configs/quality_rules.yaml), one pass
+    sleep_df, validation = validate_frame(sleep_df, table_rules(table_name))
+    perf.checkpoint("merge")
+
+    output_info = write_table(sleep_df, processed_path, ctx.output_format)
+    write_table(scores_df, scores_path, ctx.output_format)
+    outputs = {"survey": processed_path, "survey_scores": scores_path}
+    perf.checkpoint("write")
+    perf.wrote(*outputs.values())
+
+    # provenance record for survey tables
+    provenance_record = {
+        "table": table_name,
+        "source_folder": source_folder,
+        "source_inventory": ctx.inventory and ctx.inventory.summary(),
+        "processed_file": processed_path,
+        "outputs": outputs,
+        **output_info,
+        "operations": [
+            f"read the survey instruments {[f for f, _ in INSTRUMENTS.values()]} in parallel (one process per file), all answers as strings",
+            "strip whitespace from column names, 'uid' and 'type'; keep rows with type pre/post, first row per (uid, type)",
+            "map answers to item scores with one vectorized lookup per instrument (distinct responses are scored once); unknown answers are missing",
+            f"scale totals: sum of item scores with reverse-scored items flipped; missing items prorated when at least {SURVEY_MIN_ANSWERED:.0%} of the items were answered",
+            "PSQI global score from its seven components; free-text minutes/hours parsed from the first number or the midpoint of a range, bedtime/wake-up time parsed with curate/datetimes.py",
+            "VR-12 is ingested but not scored (PCS/MCS need the published regression weights)",
+            "pivot totals to one row per uid with <scale>_pre and <scale>_post columns (survey_scores)",
+            "write the PSQI sleep answers as the survey table (uid, type, bedtime, time to fall sleep, wake up time, hour sleep, sleep quality score)",
+            "keep every participant, graded or not (no filter on the processed grades table)",
+            "check the data-quality rules of configs/quality_rules.yaml on the survey table in one pass (minutes to fall asleep >= 0, hours of sleep within 0-24)",
+        ],
+        "stats": {
+            "file_count": len(files),
+            "missing_files": [INSTRUMENTS[n][0] for n in missing_files],
+            "row_count": sum(s["rows_read"] for s in file_stats),
+            "unique_uids": int(scores_df["uid"].nunique()),
+            "survey_row_count": len(sleep_df),
+            "survey_scores_row_count": len(scores_df),
+            "incomplete_scale_totals": {
+                col: int(scores_df[col].isna().sum())
+                for col in scores_df.columns if col != "uid"
+            },
+            "min_answered_fraction": SURVEY_MIN_ANSWERED,
+        },
+        "validation": validation_section(table_name, validation),
+        "instruments": {
+            s["instrument"]: {
+                k: v for k, v in s.items() if k not in ("instrument", "stages")
+            }
+            for s in file_stats
+        },
+        "ingestion": {
+            "workers": workers,
+            "file_timings": [
+                {k: s[k] for k in ("file", "rows_read", "seconds")}
+                for s in file_stats
+            ],
+        },
+    }
+
+    provenance_record["performance"] = perf.report()
+
+    with open(provenance_path, "w") as f:
+        json.dump(provenance_record, f, indent=2)
+
+    return scores_df
+
+
+if __name__ == "__main__":
+    process_survey()
@@ -0,0 +1,255 @@
+# curate/validation.py
+
+import json
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+import pandas as pd
+import yaml
+from configs.config import (
+    QUALITY_ACTIONS,
+    QUALITY_RULES_PATH,
+    QUALITY_SAMPLE_ROWS,
+    STUDY_TERM,
+)
+
+CHECKS = ("not_null", "numeric", "range", "in", "study_term")
+ACTIONS = ("warn", "drop", "fail")
+
+
+class DataQualityError(ValueError):
+    # a rule with action 'fail' found offending rows
+    pass
+
+
+@dataclass(frozen=True)
+class Rule:
+    # one entry of configs/quality_rules.yaml
+    table: str
+    name: str
+    columns: list
+    check: str
+    action: str = "warn"
+    min: float = None
+    max: float = None
+    values: list = field(default_factory=list)
+
+    def describe(self):
+        info = {"check": self.check, "columns": list(self.columns), "action": self.action}
+        if self.check == "range":
+            info.update(min=self.min, max=self.max)
+        elif self.check == "in":
+            info["values"] = list(self.values)
+        elif self.check == "study_term":
+            info["term"] = list(STUDY_TERM)
+        return info
+
+
+_rules = {}
+
+
+def _parse_rule(table_name, entry):
+    if not isinstance(entry, dict) or "name" not in entry:
+        raise ValueError(f"Quality rules of '{table_name}' must be mappings with a name")
+    name = entry["name"]
+    where = f"Quality rule '{table_name}.{name}'"
+    fields = set(Rule.__dataclass_fields__) - {"table"}
+    unknown = sorted(set(entry) - fields)
+    if unknown:
+        raise ValueError(f"{where}: unknown keys {unknown}")
+    if entry.get("check") not in CHECKS:
+        raise ValueError(f"{where}: check must be one of {list(CHECKS)}")
+    if not entry.get("columns"):
+        raise ValueError(f"{where}: 'columns' is required")
+    if entry["check"] == "range" and entry.get("min") is None and entry.get("max") is None:
+        raise ValueError(f"{where}: a range needs min or max")
+    if entry["check"] == "in" and not entry.get("values"):
+        raise ValueError(f"{where}: 'in' needs values")
+
+    entry = dict(entry)
+    # QUALITY_ACTIONS overrides the action written in the file
+    entry["action"] = QUALITY_ACTIONS.get(
+        f"{table_name}.{name}", entry.get("action", "warn")
+    )
+    if entry["action"] not in ACTIONS:
+        raise ValueError(f"{where}: action must be one of {list(ACTIONS)}")
+    entry["columns"] = list(entry["columns"])
+    return Rule(table=table_name, **entry)
+
+
+def load_rules(path=None):
+    # table -> [Rule], in file order; parsed once per process and path
+    path = QUALITY_RULES_PATH if path is None else path
+    if path not in _rules:
+        with open(path) as f:
+            entries = yaml.safe_load(f) or {}
+        rules = {}
+        for table_name, table_entries in entries.items():
+            rules[table_name] = [_parse_rule(table_name, e) for e in table_entries or []]
+            names = [r.name for r in rules[table_name]]
+            if len(set(names)) != len(names):
+                raise ValueError(f"Quality rules of '{table_name}': duplicate names")
+        _rules[path] = rules
+    return _rules[path]
+
+
+def table_rules(table_name):
+    return load_rules().get(table_name, [])
+
+
+def describe_rules(table_name):
+    # what the step cache and incremental manifests compare
+    return [asdict(rule) for rule in table_rules(table_name)] + [
+        {"study_term": list(STUDY_TERM), "sample_rows": QUALITY_SAMPLE_ROWS}
+    ]
+
+
+# --- evaluation ---
+
+def _numeric(series):
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series
+    return pd.to_numeric(series.astype("string"), errors="coerce")
+
+
+def _times(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series.astype("string"), errors="coerce", format="mixed")
+
+
+def _column_violations(rule, series, converted):
+    # -> boolean Series of the values the rule rejects; numbers and times
+    # are converted once per column and shared by the rules that need them
+    if rule.check == "not_null":
+        return series.isna()
+    if rule.check == "in":
+        return series.notna() & ~series.isin(rule.values)
+
+    key = ("time" if rule.check == "study_term" else "number", series.name)
+    if key not in converted:
+        converted[key] = _times(series) if key[0] == "time" else _numeric(series)
+    values = converted[key]
+    if rule.check == "numeric":
+        return values.isna() & series.notna()
+    if rule.check == "range":
+        low = values < rule.min if rule.min is not None else False
+        high = values > rule.max if rule.max is not None else False
+        return low | high
+    start, end = (pd.Timestamp(t) for t in STUDY_TERM)
+    return (values < start) | (values >= end)
+
+
+def _rule_columns(rule, df):
+    # "*" stands for every column of the frame (as in curate/schema.py)
+    if "*" in rule.columns:
+        return list(df.columns)
+    return rule.columns
+
+
+def _samples(df, mask, rule, limit):
+    # the first offending rows, as JSON values (dates as ISO strings)
+    if limit <= 0:
+        return []
+    columns = [c for c in ["uid", *_rule_columns(rule, df)] if c in df.columns]
+    columns = list(dict.fromkeys(columns))
+    rows = df.loc[mask, columns].head(limit)
+    return json.loads(rows.to_json(orient="records", date_format="iso"))
+
+
+def new_validation_report(rules):
+    return {
+        "rows_checked": 0,
+        "rows_dropped": 0,
+        "rules": {
+            r.name: {"violations": 0, "missing_columns": [], "samples": []}
+            for r in rules
+        },
+    }
+
+
+def validate_frame(df, rules, table_name=None, sample_rows=None):
+    # all rules over df in one pass: one mask per rule (columns converted
+    # once), the drop rules' masks combined and applied with a single
+    # selection. -> (kept rows, report); raises DataQualityError when a
+    # 'fail' rule matched any row
+    sample_rows = QUALITY_SAMPLE_ROWS if sample_rows is None else sample_rows
+    report = new_validation_report(rules)
+    if not rules or df.empty:
+        report["rows_checked"] = len(df)
+        return df, report
+
+    converted = {}
+    drop = np.zeros(len(df), dtype=bool)
+    failed = []
+    for rule in rules:
+        entry = report["rules"][rule.name]
+        mask = np.zeros(len(df), dtype=bool)
+        for column in _rule_columns(rule, df):
+            if column not in df.columns:
+                entry["missing_columns"].append(column)
+                continue
+            bad = _column_violations(rule, df[column], converted)
+            # missing values compare as <NA>, which is no violation
+            mask |= bad.to_numpy(dtype=bool, na_value=False)
+        entry["violations"] = int(mask.sum())
+        if entry["violations"]:
+            entry["samples"] = _samples(df, mask, rule, sample_rows)
+            if rule.action == "drop":
+                drop |= mask
+            elif rule.action == "fail":
+                failed.append(rule)
+
+    report["rows_checked"] = len(df)
+    report["rows_dropped"] = int(drop.sum())
+    if failed:
+        table_name = table_name or failed[0].table
+        details = "; ".join(
+            f"{r.name} ({r.check} on {r.columns}): {report['rules'][r.name]['violations']} rows, "
+            f"e.g. {report['rules'][r.name]['samples'][:1]}"
+            for r in failed
+        )
+        raise DataQualityError(f"{table_name}: data-quality rules failed: {details}")
+    if report["rows_dropped"]:
+        df = df[~drop]
+    return df, report
+
+
+def merge_validation_reports(reports, sample_rows=None):
+    # reports of the files or chunks of one table, in table order
+    sample_rows = QUALITY_SAMPLE_ROWS if sample_rows is None else sample_rows
+    merged = {"rows_checked": 0, "rows_dropped": 0, "rules": {}}
+    for report in reports:
+        if not report:
+            continue
+        merged["rows_checked"] += report["rows_checked"]
+        merged["rows_dropped"] += report["rows_dropped"]
+        for name, entry in report["rules"].items():
+            total = merged["rules"].setdefault(
+                name, {"violations": 0, "missing_columns": [], "samples": []}
+            )
+            total["violations"] += entry["violations"]
+            total["missing_columns"].extend(
+                c for c in entry["missing_columns"] if c not in total["missing_columns"]
+            )
+            room = sample_rows - len(total["samples"])
+            if room > 0:
+                total["samples"].extend(entry["samples"][:room])
+    return merged
+
+
+def validation_section(table_name, report):
+    # provenance 'validation': every rule with its definition and results
+    report = report or new_validation_report([])
+    rules = {}
+    for rule in table_rules(table_name):
+        entry = report["rules"].get(
+            rule.name, {"violations": 0, "missing_columns": [], "samples": []}
+        )
+        rules[rule.name] = {**rule.describe(), **entry}
+    return {
+        "rules_path": QUALITY_RULES_PATH,
+        "rows_checked": report["rows_checked"],
+        "rows_dropped": report["rows_dropped"],
+        "rules": rules,
+    }